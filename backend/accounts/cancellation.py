@@ -0,0 +1,95 @@
+"""
+Флаг остановки задач инвайта и рассылки.
+
+Вьюха ставит Redis-ключ (request_stop), задача раз в N элементов или M секунд
+проверяет его через StopToken — без запроса к TelegramAccount на каждого
+пользователя. Задача выходит сама, через свой finally, и успевает вернуть
+арендованные строки в очередь (RowClaim.release).
+
+    stop = StopToken(account_id, "invite")
+    for user in users:
+        if stop.requested():
+            return run.finish("stopped", ...)
+        ...
+        stop.wait(interval)  # сон, прерываемый остановкой
+
+В корутинах — arequested() / asleep().
+"""
+import asyncio
+import time
+
+import redis
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from accounts.leases import get_redis
+
+STOP_KEY = "tm:stop:{}:{}"
+# дольше самой длинной задачи: флаг не должен истечь, пока она ждёт аренду
+STOP_TTL = 24 * 3600
+
+
+def request_stop(account_id, kind: str):
+    get_redis().set(STOP_KEY.format(kind, int(account_id)), "1", ex=STOP_TTL)
+
+
+def clear_stop(account_id, kind: str):
+    """Перед новым запуском: старый флаг не должен остановить свежую задачу."""
+    get_redis().delete(STOP_KEY.format(kind, int(account_id)))
+
+
+class StopToken:
+    def __init__(self, account_id, kind: str, every: int | None = None, interval: float | None = None):
+        self.key = STOP_KEY.format(kind, int(account_id))
+        self.every = int(every or settings.STOP_CHECK_EVERY)
+        self.interval = float(interval or settings.STOP_CHECK_SECONDS)
+        self._calls = 0
+        self._checked = None
+        self._stopped = False
+
+    def _poll(self) -> bool:
+        self._calls, self._checked = 0, time.monotonic()
+        try:
+            self._stopped = bool(get_redis().exists(self.key))
+        except redis.RedisError:
+            pass  # без Redis задачу остановит только revoke/time_limit — работаем дальше
+        return self._stopped
+
+    def _due(self) -> bool:
+        self._calls += 1
+        return (self._checked is None or self._calls >= self.every
+                or time.monotonic() - self._checked >= self.interval)
+
+    def requested(self) -> bool:
+        """Дешёвая проверка для цикла: в Redis ходит не чаще раза в every вызовов или interval секунд."""
+        if self._stopped:
+            return True
+        return self._poll() if self._due() else False
+
+    def wait(self, seconds) -> bool:
+        """time.sleep, который просыпается по остановке (проверка раз в interval). True — остановлено."""
+        left = max(0.0, float(seconds or 0))
+        while left > 0 and not self._stopped:
+            step = min(left, self.interval)
+            time.sleep(step)
+            left -= step
+            self._poll()
+        return self._stopped
+
+    # --- async (tasks.invite_all_users / send_direct_messages на async-воркере) ---
+    async def _apoll(self) -> bool:
+        return await sync_to_async(self._poll, thread_sensitive=False)()
+
+    async def arequested(self) -> bool:
+        if self._stopped:
+            return True
+        return await self._apoll() if self._due() else False
+
+    async def asleep(self, seconds) -> bool:
+        left = max(0.0, float(seconds or 0))
+        while left > 0 and not self._stopped:
+            step = min(left, self.interval)
+            await asyncio.sleep(step)
+            left -= step
+            await self._apoll()
+        return self._stopped
@@ -15,14 +15,17 @@ os.environ.setdefault("DJANGO_SETTINGS_MODULE", "telemanager_django.settings")
 django.setup()
 
 from accounts.models import TelegramAccount
+from accounts.leases import AccountLease
+from accounts.events import TaskRunLog, flush
 
 SESSIONS_DIR = os.path.join(os.path.dirname(__file__), "..", "sessions")
 
-async def check_account(account: TelegramAccount):
+async def check_account(account: TelegramAccount, run: TaskRunLog):
     session_path = os.path.join(SESSIONS_DIR, f"{account.phone}.session")
 
     if not os.path.exists(session_path):
-        print(f"[{account.phone}] Session not found")
+        run.warning("check.no_session", account_id=account.id)
+        run.count("NO_SESSION")
         account.status = "мёртвый"
         await sync_to_async(account.save)()
         return
@@ -44,7 +47,8 @@ async def check_account(account: TelegramAccount):
         api_hash = account.api_hash
 
         if not api_id or not api_hash:
-            print(f"[{account.phone}] Пропущен: отсутствует api_id или api_hash")
+            run.warning("check.no_keys", account_id=account.id)
+            run.count("NO_KEYS")
             account.status = "нет ключей"
             await sync_to_async(account.save)()
             return
@@ -54,31 +58,50 @@ async def check_account(account: TelegramAccount):
         await client.connect()
 
         if not await client.is_user_authorized():
-            print(f"[{account.phone}] Unauthorized")
+            run.warning("check.unauthorized", account_id=account.id)
+            run.count("UNAUTHORIZED")
             account.status = "мёртвый"
         else:
             me = await client.get_me()
-            print(f"[{account.phone}] ✅ Активен как {me.first_name}")
+            run.event("check.alive", account_id=account.id, tg_user_id=me.id)
+            run.count()
             account.status = "активен"
 
         await client.disconnect()
     except RPCError as e:
-        print(f"[{account.phone}] RPC Error: {e}")
+        run.warning("check.rpc_error", account_id=account.id, error=str(e))
+        run.count("RPC_ERROR")
         account.status = "мёртвый"
     except Exception as e:
-        print(f"[{account.phone}] Ошибка: {e}")
+        run.warning("check.failed", account_id=account.id, error=str(e))
+        run.count("UNKNOWN")
         account.status = "мёртвый"
     finally:
         await sync_to_async(account.save)()
 
 
-async def main():
+async def check_account_leased(account: TelegramAccount, run: TaskRunLog):
+    # Аккаунт сейчас работает (инвайт/рассылка/обучение) — значит жив; сессию не трогаем
+    lease = AccountLease(account.id, "check")
+    if not lease.try_acquire():
+        run.event("check.skipped_busy", account_id=account.id)
+        return
+    try:
+        await check_account(account, run)
+    finally:
+        lease.release()
+
+
+async def main(task_id=None):
     accounts = await sync_to_async(list)(
         TelegramAccount.objects.select_related('proxy').all()
     )
+    run = await sync_to_async(TaskRunLog)("check", task_id=task_id, accounts=len(accounts))
 
-    tasks = [check_account(acc) for acc in accounts]
+    tasks = [check_account_leased(acc, run) for acc in accounts]
     await asyncio.gather(*tasks)
+    await run.afinish("done")
 
 if __name__ == "__main__":
     asyncio.run(main())
+    flush()
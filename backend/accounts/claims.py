@@ -0,0 +1,110 @@
+"""
+Аренда строк очереди TelegramUser задачами инвайта и рассылки.
+
+Задача забирает пачку pending-строк: статус -> "processing", в
+<queue>_claimed_by — её id, в <queue>_lease_expires_at — срок аренды.
+Пока задача жива, она продлевает срок (renew), а в конце возвращает в pending
+всё, что не успела обработать (release). Если задачу сняли revoke(terminate=True)
+или упал воркер, строки вернёт reap_expired по истечении аренды.
+
+    claim = RowClaim("invite", account_id, task_id=self.request.id)
+    try:
+        users = claim.claim(TelegramUser.objects.filter(...).order_by("id"), 500)
+        for user in users:
+            claim.renew(extra=interval)
+            ...
+    finally:
+        claim.release()
+"""
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from users.models import TelegramUser
+
+QUEUES = ("invite", "message")
+
+
+class RowClaim:
+    def __init__(self, queue: str, account_id, task_id: str | None = None, ttl: int | None = None):
+        if queue not in QUEUES:
+            raise ValueError(f"Неизвестная очередь: {queue}")
+        self.queue = queue
+        self.account_id = account_id
+        # без Celery (бенчмарк, прямой вызов) — свой уникальный токен
+        self.token = task_id or f"local-{uuid.uuid4().hex}"
+        self.ttl = int(ttl or settings.CLAIM_LEASE_SECONDS)
+        self._renewed = 0.0
+
+    def _expires(self, extra=0):
+        return timezone.now() + timedelta(seconds=self.ttl + extra)
+
+    def _mine(self):
+        return TelegramUser.objects.filter(**{
+            f"{self.queue}_claimed_by": self.token,
+            f"{self.queue}_status": "processing",
+        })
+
+    def claim(self, queryset, limit: int) -> list:
+        """
+        queryset — ждущие строки в нужном порядке (без среза). Возвращает
+        арендованные объекты, уже в "processing"; пишет их одним UPDATE.
+        """
+        now = timezone.now()
+        fields = {
+            f"{self.queue}_status": "processing",
+            f"{self.queue}_error_code": None,
+            f"{self.queue}_changed_at": now,
+            f"{self.queue}_claimed_by": self.token,
+            f"{self.queue}_lease_expires_at": self._expires(),
+            "processed_by_id": self.account_id,
+        }
+        with transaction.atomic():
+            users = list(queryset.select_for_update(skip_locked=True, of=("self",))[:limit])
+            if users:
+                TelegramUser.objects.filter(pk__in=[u.pk for u in users]).update(**fields)
+        for user in users:
+            for name, value in fields.items():
+                setattr(user, name, value)
+        self._renewed = time.monotonic()
+        return users
+
+    def renew(self, extra: int = 0) -> int:
+        """
+        Продлевает аренду ещё не обработанных строк, не чаще раза в треть срока.
+        extra — предстоящий сон (интервал, FloodWait): если он длиннее трети
+        срока, продлеваем сразу и с запасом на него.
+        """
+        extra = max(0, int(extra or 0))
+        if extra <= self.ttl / 3 and time.monotonic() - self._renewed < self.ttl / 3:
+            return 0
+        self._renewed = time.monotonic()
+        return self._mine().update(**{f"{self.queue}_lease_expires_at": self._expires(extra)})
+
+    def release(self) -> int:
+        """Необработанные строки — обратно в pending. Вызывать в finally."""
+        return self._mine().update(**{
+            f"{self.queue}_status": "pending",
+            f"{self.queue}_claimed_by": None,
+            f"{self.queue}_lease_expires_at": None,
+        })
+
+
+def reap_expired(now=None) -> dict:
+    """Строки с истёкшей арендой — обратно в pending, одним UPDATE на очередь."""
+    now = now or timezone.now()
+    return {
+        queue: TelegramUser.objects.filter(**{
+            f"{queue}_status": "processing",
+            f"{queue}_lease_expires_at__lt": now,
+        }).update(**{
+            f"{queue}_status": "pending",
+            f"{queue}_claimed_by": None,
+            f"{queue}_lease_expires_at": None,
+        })
+        for queue in QUEUES
+    }
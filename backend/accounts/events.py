@@ -0,0 +1,170 @@
+"""
+Структурный журнал задач вместо print().
+
+Каждое событие — одна JSON-строка с task_id, account_id, kind и event.
+Запись идёт через QueueHandler: цикл отправки только кладёт запись в очередь,
+форматирование и вывод делает фоновый поток QueueListener.
+В конце прогона в TaskRun сохраняется компактная сводка (ok / failed / коды ошибок),
+а по ходу — прогресс в Redis pub/sub (accounts.progress) для живого UI; его
+публикует тот же QueueListener, так что цикл не ждёт Redis ни на одном элементе.
+"""
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+import time
+
+from django.utils import timezone
+
+logger = logging.getLogger("telemanager.events")
+
+_listener = None
+_setup_lock = threading.Lock()
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        data = {
+            "ts": round(record.created, 3),
+            "level": record.levelname.lower(),
+        }
+        data.update(getattr(record, "fields", None) or {"msg": record.getMessage()})
+        if record.exc_info:
+            data["exc"] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+def _ensure_listener():
+    global _listener
+    if _listener is not None:
+        return
+    with _setup_lock:
+        if _listener is not None:
+            return
+        from accounts.progress import RedisProgressHandler, is_progress
+
+        q = queue.SimpleQueue()
+        stream = logging.StreamHandler(sys.stdout)
+        stream.setFormatter(JsonFormatter())
+        stream.addFilter(lambda record: not is_progress(record))
+        _listener = logging.handlers.QueueListener(q, stream, RedisProgressHandler(), respect_handler_level=False)
+        _listener.start()
+        logger.addHandler(logging.handlers.QueueHandler(q))
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+
+
+def flush():
+    """Дописать всё из очереди (перед выходом из скрипта)."""
+    if _listener is not None:
+        _listener.stop()
+        _listener.start()
+
+
+class TaskRunLog:
+    """
+    run = TaskRunLog("invite", account_id=..., task_id=self.request.id)
+    run.event("invite.sent", users=[...])
+    run.count(n=len(batch))               # успех
+    run.count("FLOOD_WAIT", n=len(batch)) # неудача с кодом
+    run.finish("done", result="Готово")
+    """
+
+    def __init__(self, kind, account_id=None, task_id=None, persist=True, **params):
+        _ensure_listener()
+        self.kind = kind
+        self.account_id = account_id
+        self.task_id = task_id
+        self.ok = 0
+        self.failed = 0
+        self.errors = {}
+        self._started = time.monotonic()
+        self.progress = None
+        if account_id is not None:
+            from accounts.progress import ProgressPublisher
+            self.progress = ProgressPublisher(account_id, kind, task_id)
+        self.run = None
+        if persist:
+            from accounts.models import TaskRun
+            self.run = TaskRun.objects.create(
+                kind=kind, account_id=account_id, task_id=task_id, params=params or None,
+            )
+        self.event("run.start", **params)
+
+    def event(self, event, level=logging.INFO, **fields):
+        record = {"event": event, "kind": self.kind, "task_id": self.task_id, "account_id": self.account_id}
+        record.update(fields)
+        logger.log(level, event, extra={"fields": record})
+
+    def warning(self, event, **fields):
+        self.event(event, level=logging.WARNING, **fields)
+
+    def error(self, event, **fields):
+        self.event(event, level=logging.ERROR, **fields)
+
+    def count(self, error_code=None, n=1):
+        if n <= 0:
+            return
+        if error_code:
+            self.failed += n
+            self.errors[error_code] = self.errors.get(error_code, 0) + n
+        else:
+            self.ok += n
+        if self.progress is not None:
+            self.progress.publish(self.ok, self.failed)
+
+    def set_total(self, total):
+        """Сколько элементов в прогоне — для ETA в прогрессе."""
+        if self.progress is not None:
+            self.progress.total = total
+            self.progress.publish(self.ok, self.failed, force=True)
+
+    def set_stage(self, **fields):
+        """Текущий этап (например канал при обучении) — уходит в прогресс вместо записи в БД."""
+        if self.progress is not None:
+            self.progress.stage = fields
+            self.progress.publish(self.ok, self.failed, force=True)
+
+    def summary(self):
+        elapsed = time.monotonic() - self._started
+        processed = self.ok + self.failed
+        return {
+            "processed": processed,
+            "ok": self.ok,
+            "failed": self.failed,
+            "errors": self.errors,
+            "elapsed_s": round(elapsed, 1),
+            "per_min": round(processed * 60 / elapsed, 2) if elapsed > 0 else None,
+        }
+
+    def finish(self, status="done", result=None):
+        summary = self.summary()
+        self.event("run.finish", status=status, result=result, **summary)
+        if self.progress is not None:
+            self.progress.publish(self.ok, self.failed, status=status, force=True)
+        if self.run is not None:
+            from accounts.models import TaskRun
+            TaskRun.objects.filter(pk=self.run.pk).update(
+                status=status,
+                result=(result or "")[:255] or None,
+                ok=self.ok,
+                failed=self.failed,
+                errors=self.errors or None,
+                finished_at=timezone.now(),
+            )
+        return result
+
+    async def afinish(self, status="done", result=None):
+        from asgiref.sync import sync_to_async
+        from django.db import close_old_connections
+
+        def finish():
+            # в async-воркере поток sync_to_async живёт весь процесс — соединение не копим
+            close_old_connections()
+            try:
+                return self.finish(status, result)
+            finally:
+                close_old_connections()
+        return await sync_to_async(finish)()
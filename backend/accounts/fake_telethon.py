@@ -0,0 +1,261 @@
+"""
+Фейковый TelegramClient для офлайн-бенчмарков (manage.py bench_tasks, bench_views).
+
+Повторяет ту часть API Telethon, которой пользуются задачи и async-вьюхи:
+get_entity, send_message, send_file, iter_messages, iter_participants,
+get_messages, get_me, send_code_request и вызов запросов
+(InviteToChannelRequest, JoinChannelRequest, GetFullUserRequest, ...).
+Сети нет: каждый RPC «спит» заданную задержку и с заданной вероятностью
+бросает FloodWaitError или RPCError.
+
+    from accounts import fake_telethon
+    fake_telethon.configure(latency=0.05, flood_rate=0.01, error_rate=0.02)
+    # подменить telethon.sync.TelegramClient на fake_telethon.FakeTelegramClient,
+    # telethon.TelegramClient — на fake_telethon.FakeAsyncTelegramClient
+"""
+import asyncio
+import random
+import threading
+import time
+import zlib
+from collections import Counter
+from types import SimpleNamespace
+
+from telethon.errors import FloodWaitError, RPCError
+from telethon.tl.types import Channel, ChatPhotoEmpty, InputUser, PeerUser, User
+
+# ссылки на настоящие sleep: бенчмарк подменяет time.sleep/asyncio.sleep задач,
+# а задержка «сети» должна оставаться реальной
+_real_sleep = time.sleep
+_real_asleep = asyncio.sleep
+
+# диапазоны id, которые не пересекаются с настоящими пользователями
+USER_ID_BASE = 10 ** 12
+AUTHOR_ID_BASE = 2 * 10 ** 12
+MEMBER_ID_BASE = 3 * 10 ** 12
+USERNAME_PREFIX = "bench_u"
+
+
+class FakeNetwork:
+    def __init__(self, latency=0.0, jitter=0.0, flood_rate=0.0, flood_seconds=30,
+                 error_rate=0.0, messages=1000, authors=300, participants=500,
+                 missing_sender_rate=0.0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.flood_rate = flood_rate
+        self.flood_seconds = flood_seconds
+        self.error_rate = error_rate
+        # размер «каналов» для iter_messages / iter_participants
+        self.messages = messages
+        self.authors = max(1, authors)
+        self.participants = participants
+        # доля сообщений, у которых автора нет в users-векторе ответа (message.sender is None)
+        self.missing_sender_rate = missing_sender_rate
+        self.rng = random.Random(seed)
+        self.calls = Counter()
+        self.floods = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def delay(self):
+        if not self.latency and not self.jitter:
+            return 0
+        return max(0.0, self.latency + self.rng.uniform(-self.jitter, self.jitter))
+
+    def check(self, method):
+        """Учёт вызова и инъекция ошибок; задержку делает вызывающий (sync/async)."""
+        with self._lock:
+            self.calls[method] += 1
+            roll = self.rng.random()
+            if roll < self.flood_rate:
+                self.floods += 1
+                raise FloodWaitError(request=None, capture=self.flood_seconds)
+            if roll < self.flood_rate + self.error_rate:
+                self.errors += 1
+                raise RPCError(None, "INTERNAL_SERVER_ERROR", 500)
+
+    def stats(self):
+        return {"calls": dict(self.calls), "floods": self.floods, "errors": self.errors}
+
+
+network = FakeNetwork()
+
+
+def configure(**options) -> FakeNetwork:
+    global network
+    network = FakeNetwork(**options)
+    return network
+
+
+def fake_user(user_id) -> User:
+    return User(
+        id=user_id, access_hash=user_id, first_name=f"User{user_id}",
+        username=f"{USERNAME_PREFIX}{user_id}", phone=None,
+    )
+
+
+def _resolve(target):
+    if isinstance(target, PeerUser):
+        return fake_user(target.user_id)
+    if isinstance(target, int):
+        return fake_user(target)
+    name = str(target).lstrip("@")
+    if name.startswith(USERNAME_PREFIX) and name[len(USERNAME_PREFIX):].isdigit():
+        return fake_user(int(name[len(USERNAME_PREFIX):]))
+    # всё остальное — мегагруппа, чтобы train_account шёл по прямой ветке
+    return Channel(
+        id=zlib.crc32(name.encode()), title=name, photo=ChatPhotoEmpty(), date=None,
+        megagroup=True, access_hash=0, username=name,
+    )
+
+
+def _message(n):
+    author = AUTHOR_ID_BASE + network.rng.randrange(network.authors)
+    sender = None if network.rng.random() < network.missing_sender_rate else fake_user(author)
+    return SimpleNamespace(
+        id=n, message=f"message {n}", from_id=PeerUser(author), sender=sender,
+    )
+
+
+class FakeTelegramClient:
+    """Синхронный клиент — замена telethon.sync.TelegramClient (tasks.py)."""
+
+    def __init__(self, session=None, api_id=None, api_hash=None, **kwargs):
+        self.session = session
+        self.connected = False
+
+    def _rpc(self, method):
+        _real_sleep(network.delay())
+        network.check(method)
+
+    def connect(self):
+        self.connected = True
+
+    def disconnect(self):
+        self.connected = False
+
+    def is_user_authorized(self):
+        return True
+
+    def __enter__(self):
+        self.connect()
+        return self
+
+    def __exit__(self, *exc):
+        self.disconnect()
+        return False
+
+    def __call__(self, request):
+        self._rpc(type(request).__name__)
+
+    def get_entity(self, target):
+        self._rpc("get_entity")
+        return _resolve(target)
+
+    def send_message(self, entity, message, **kwargs):
+        self._rpc("send_message")
+
+    def send_file(self, entity, file, **kwargs):
+        self._rpc("send_file")
+
+    def get_messages(self, entity, limit=100, **kwargs):
+        self._rpc("get_messages")
+        return [_message(n) for n in range(1, min(limit or network.messages, network.messages) + 1)]
+
+    def forward_messages(self, entity, messages, from_peer=None, **kwargs):
+        self._rpc("forward_messages")
+
+
+class FakeAsyncTelegramClient:
+    """Asyncio-клиент — замена telethon.TelegramClient (train_account.py, инвайт и рассылка в tasks.py)."""
+
+    # сколько элементов Telegram отдаёт за один запрос истории / участников
+    MESSAGES_PAGE = 100
+    PARTICIPANTS_PAGE = 200
+
+    def __init__(self, session=None, api_id=None, api_hash=None, **kwargs):
+        self.session = session
+        self.connected = False
+
+    async def _rpc(self, method):
+        await _real_asleep(network.delay())
+        network.check(method)
+
+    async def connect(self):
+        self.connected = True
+
+    async def disconnect(self):
+        self.connected = False
+
+    async def is_user_authorized(self):
+        return True
+
+    async def sign_in(self, *args, **kwargs):
+        return None
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.disconnect()
+        return False
+
+    async def __call__(self, request):
+        await self._rpc(type(request).__name__)
+        if type(request).__name__ == "GetParticipantsRequest":
+            # страница участников канала со смещением, как ChannelParticipants
+            end = min(network.participants, request.offset + request.limit)
+            users = [fake_user(MEMBER_ID_BASE + n) for n in range(request.offset, end)]
+            return SimpleNamespace(count=network.participants, participants=users, users=users)
+        if type(request).__name__ == "GetUsersRequest":
+            return [fake_user(u.user_id) for u in request.id]
+        if type(request).__name__ == "GetFullUserRequest":
+            return SimpleNamespace(full_user=SimpleNamespace(about="bench"))
+
+    # --- профиль и вход (async-вьюхи accounts/views.py, manage.py bench_views) ---
+    async def get_me(self):
+        await self._rpc("get_me")
+        return fake_user(USER_ID_BASE - 1)
+
+    async def send_code_request(self, phone, **kwargs):
+        await self._rpc("send_code_request")
+        return SimpleNamespace(phone_code_hash="bench-hash")
+
+    async def get_input_entity(self, peer):
+        # из «кэша сессии», без RPC
+        user_id = getattr(peer, "user_id", peer)
+        return InputUser(user_id, user_id)
+
+    async def get_entity(self, target):
+        await self._rpc("get_entity")
+        return _resolve(target)
+
+    async def send_message(self, entity, message, **kwargs):
+        await self._rpc("send_message")
+
+    async def send_file(self, entity, file, **kwargs):
+        await self._rpc("send_file")
+
+    async def get_messages(self, entity, limit=100, **kwargs):
+        await self._rpc("get_messages")
+        return [_message(network.messages - n) for n in range(min(limit or network.messages, network.messages))]
+
+    async def iter_messages(self, entity, limit=None, min_id=0, reverse=False, **kwargs):
+        # id сообщений в «канале» — 1..messages
+        ids = range(min_id + 1, network.messages + 1)
+        if not reverse:
+            ids = reversed(ids)
+        for n, message_id in enumerate(ids):
+            if limit is not None and n >= limit:
+                return
+            if n % self.MESSAGES_PAGE == 0:
+                await self._rpc("iter_messages")
+            yield _message(message_id)
+
+    async def iter_participants(self, entity, limit=None, **kwargs):
+        total = min(limit or network.participants, network.participants)
+        for n in range(total):
+            if n % self.PARTICIPANTS_PAGE == 0:
+                await self._rpc("iter_participants")
+            yield fake_user(MEMBER_ID_BASE + n)
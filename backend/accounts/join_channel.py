@@ -8,20 +8,43 @@ django.setup()
 
 from accounts.models import TelegramAccount
 from accounts.models import IntermediateChannel
+from accounts.leases import AccountLease, LeaseBusy
+from accounts.memberships import remember
+from accounts.events import TaskRunLog, flush
 
-phone = sys.argv[1]
-channel_username = sys.argv[2]
+SESSIONS_DIR = os.path.join(os.path.dirname(__file__), "..", "sessions")
 
-account = TelegramAccount.objects.get(phone=phone)
 
-SESSIONS_DIR = os.path.join(os.path.dirname(__file__), "..", "sessions")
-session_path = os.path.join(SESSIONS_DIR, account.session_file)
+def join_channel(phone, channel_username, task_id=None):
+    """LeaseBusy, если аккаунт занят: join_channel_task встаёт в очередь за арендой, а не ждёт её в слоте."""
+    account = TelegramAccount.objects.get(phone=phone)
+    lease = AccountLease(account.id, "join", task_id=task_id)
+    if not lease.acquire():
+        raise LeaseBusy(account.id, lease.holder())
+
+    run = TaskRunLog("join", account_id=account.id, task_id=task_id, channel=channel_username)
+    session_path = os.path.join(SESSIONS_DIR, account.session_file)
+
+    client = TelegramClient(session_path, int(account.api_id), account.api_hash)
+
+    try:
+        with client:
+            client.connect()
+            client(JoinChannelRequest(channel_username))
+            remember(account.id, channel_username)
+            channel = IntermediateChannel.objects.get(username=channel_username)
+            channel.added_accounts.add(account)
+            run.event("channel.joined", channel=channel_username)
+            run.count()
+    except Exception as e:
+        run.error("channel.join_failed", channel=channel_username, error=str(e))
+        run.finish("failed", str(e))
+        raise
+    finally:
+        lease.release()
+    run.finish("done")
 
-client = TelegramClient(session_path, int(account.api_id), account.api_hash)
 
-with client:
-    client.connect()
-    client(JoinChannelRequest(channel_username))
-    channel = IntermediateChannel.objects.get(username=channel_username)
-    channel.added_accounts.add(account)
-    print(f"[{phone}] ✅ вступил в {channel_username}")
+if __name__ == "__main__":
+    join_channel(sys.argv[1], sys.argv[2])
+    flush()
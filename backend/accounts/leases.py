@@ -0,0 +1,203 @@
+"""
+Аренда (lease) Telegram-аккаунта.
+
+Одна сессия — одна операция: инвайт, рассылка, пересылка, правка профиля и
+обучение берут аренду на аккаунт перед тем, как открыть .session-файл.
+Аренда — Redis-ключ с TTL; держатель продлевает его heartbeat-потоком, так что
+упавший воркер освобождает аккаунт сам, как только истечёт TTL.
+"""
+import asyncio
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+
+import redis
+from django.conf import settings
+
+LEASE_KEY = "tm:lease:account:{}"
+
+# compare-and-delete / compare-and-expire: трогаем ключ, только если он всё ещё наш
+_RELEASE_LUA = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+_REFRESH_LUA = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('expire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+_client = None
+
+
+def get_redis():
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(settings.REDIS_URL, decode_responses=True)
+    return _client
+
+
+class LeaseBusy(Exception):
+    def __init__(self, account_id, holder=None):
+        self.account_id = account_id
+        self.holder = holder or {}
+        super().__init__(f"Аккаунт {account_id} занят: {self.holder.get('kind', '?')}")
+
+
+class AccountLease:
+    """
+    lease = AccountLease(account.id, "invite", task_id=self.request.id)
+    if not lease.acquire():
+        ...  # аккаунт занят
+    try:
+        ...
+    finally:
+        lease.release()
+
+    Либо как контекстный менеджер: `with AccountLease(...).hold(wait=30): ...`
+    """
+
+    def __init__(self, account_id, kind: str, task_id: str | None = None, ttl: int | None = None):
+        self.account_id = int(account_id)
+        self.kind = kind
+        self.task_id = task_id
+        self.ttl = int(ttl or settings.ACCOUNT_LEASE_TTL)
+        self.key = LEASE_KEY.format(self.account_id)
+        self.value = json.dumps({
+            "token": uuid.uuid4().hex,
+            "kind": kind,
+            "task_id": task_id,
+            "host": f"{socket.gethostname()}:{os.getpid()}",
+            "since": int(time.time()),
+        })
+        self._stop = threading.Event()
+        self._heartbeat = None
+        self.acquired = False
+
+    # --- sync ---
+    def try_acquire(self) -> bool:
+        self.acquired = bool(get_redis().set(self.key, self.value, nx=True, ex=self.ttl))
+        if self.acquired:
+            self._start_heartbeat()
+        return self.acquired
+
+    def acquire(self, wait: float = 0, poll: float = 1.0) -> bool:
+        """wait=0 — одна попытка; wait=None — ждать, пока не освободится."""
+        deadline = None if wait is None else time.monotonic() + wait
+        while not self.try_acquire():
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(poll)
+        return True
+
+    def refresh(self) -> bool:
+        return bool(get_redis().eval(_REFRESH_LUA, 1, self.key, self.value, self.ttl))
+
+    def release(self):
+        self._stop.set()
+        if self.acquired:
+            try:
+                get_redis().eval(_RELEASE_LUA, 1, self.key, self.value)
+            finally:
+                self.acquired = False
+
+    def holder(self) -> dict | None:
+        return lease_states([self.account_id]).get(self.account_id)
+
+    def hold(self, wait: float = 0):
+        return _Held(self, wait)
+
+    # --- async (async-воркер, train_account.py, async-вьюхи) ---
+    # клиент Redis синхронный: вызовы уходят в executor петли, чтобы не стопорить
+    # остальные корутины (в async-воркере это десятки аккаунтов) на время round-trip
+    async def aacquire(self, wait: float | None = 0, poll: float = 1.0) -> bool:
+        deadline = None if wait is None else time.monotonic() + wait
+        while not await asyncio.to_thread(self.try_acquire):
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(poll)
+        return True
+
+    async def arelease(self):
+        await asyncio.to_thread(self.release)
+
+    async def aholder(self) -> dict | None:
+        return await asyncio.to_thread(self.holder)
+
+    def _start_heartbeat(self):
+        self._stop.clear()
+        self._heartbeat = threading.Thread(target=self._beat, name=f"lease-{self.account_id}", daemon=True)
+        self._heartbeat.start()
+
+    def _beat(self):
+        interval = max(1, self.ttl // 3)
+        while not self._stop.wait(interval):
+            try:
+                if not self.refresh():
+                    # ключ истёк или его перехватили — дальше не продлеваем
+                    return
+            except redis.RedisError:
+                continue
+
+
+class _Held:
+    def __init__(self, lease: AccountLease, wait: float):
+        self.lease = lease
+        self.wait = wait
+
+    def __enter__(self):
+        if not self.lease.acquire(wait=self.wait):
+            raise LeaseBusy(self.lease.account_id, self.lease.holder())
+        return self.lease
+
+    def __exit__(self, *exc):
+        self.lease.release()
+        return False
+
+    async def __aenter__(self):
+        if not await self.lease.aacquire(wait=self.wait):
+            raise LeaseBusy(self.lease.account_id, await self.lease.aholder())
+        return self.lease
+
+    async def __aexit__(self, *exc):
+        await self.lease.arelease()
+        return False
+
+
+def lease_states(account_ids) -> dict:
+    """
+    {account_id: {"kind", "task_id", "host", "since", "expires_in"} | None}
+    Один round-trip в Redis на весь список. Если Redis недоступен — пустой dict.
+    """
+    ids = [int(i) for i in account_ids]
+    if not ids:
+        return {}
+    try:
+        pipe = get_redis().pipeline(transaction=False)
+        for i in ids:
+            pipe.get(LEASE_KEY.format(i))
+            pipe.ttl(LEASE_KEY.format(i))
+        raw = pipe.execute()
+    except redis.RedisError:
+        return {}
+
+    states = {}
+    for n, i in enumerate(ids):
+        value, ttl = raw[2 * n], raw[2 * n + 1]
+        if not value:
+            states[i] = None
+            continue
+        try:
+            data = json.loads(value)
+        except ValueError:
+            data = {}
+        data.pop("token", None)
+        data["expires_in"] = ttl if ttl and ttl > 0 else None
+        states[i] = data
+    return states
@@ -0,0 +1,31 @@
+"""
+Async-воркер кампаний (accounts/runtime.py): инвайты и рассылки многих
+аккаунтов в одной asyncio-петле вместо процесса Celery на аккаунт.
+
+    ASYNC_WORKER_ENABLED=1 python manage.py async_worker --queue campaigns --concurrency 50 --threads 16 --name campaigns@host1
+
+SIGTERM/SIGINT: новые задания не берутся, идущие доделываются до
+ASYNC_WORKER_SHUTDOWN_GRACE секунд, остальные отменяются и возвращаются в очередь.
+"""
+from django.core.management.base import BaseCommand
+
+from accounts.runtime import AsyncWorker
+
+
+class Command(BaseCommand):
+    help = "Async-воркер инвайтов и рассылок (Redis-очередь tm:jobs:<queue>)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--queue", default="campaigns")
+        parser.add_argument("--concurrency", type=int, default=None,
+                            help="сколько заданий (аккаунтов) одновременно; по умолчанию ASYNC_WORKER_CONCURRENCY")
+        parser.add_argument("--threads", type=int, default=None,
+                            help="потоков под ORM; по умолчанию ASYNC_WORKER_THREADS")
+        parser.add_argument("--name", default=None,
+                            help="постоянное имя воркера: по нему после падения находятся его незавершённые задания")
+
+    def handle(self, *args, **opts):
+        AsyncWorker(
+            queue=opts["queue"], concurrency=opts["concurrency"],
+            threads=opts["threads"], name=opts["name"],
+        ).run()
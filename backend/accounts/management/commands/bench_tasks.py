@@ -0,0 +1,260 @@
+"""
+Офлайн-бенчмарк задач инвайта, рассылки и обучения на фейковом Telegram.
+
+    DATABASE_URL=sqlite:////tmp/bench.db python manage.py migrate
+    DATABASE_URL=sqlite:////tmp/bench.db python manage.py bench_tasks invite --users 2000 --latency-ms 20
+    python manage.py bench_tasks dm --users 1000 --flood-rate 0.01 --error-rate 0.02 --json
+    python manage.py bench_tasks train --channels 2 --messages 5000 --participants 1000
+
+Запускать на отдельной (тестовой) БД: команда создаёт владельца bench, аккаунт,
+канал и пользователей с id из диапазона fake_telethon и перед прогоном удаляет
+пользователей этого владельца. train обходит ВСЕ активные TrainingChannel.
+
+time.sleep / asyncio.sleep задач (интервалы, FloodWait, ожидание токенов) не
+выполняются, а суммируются в «simulated_wait_s» — меряется собственная цена
+кода и БД. Задержка «сети» фейкового клиента (--latency-ms) реальная.
+Аренды аккаунта и Celery в прогоне не участвуют: вызываются _invite_all_users /
+_send_direct_messages напрямую.
+"""
+import asyncio
+import json
+import logging
+import os
+import resource
+import sys
+import tempfile
+import threading
+import time
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+from accounts import fake_telethon
+# импортируем заранее: модуль-скрипт делает django.setup(), а тот перенастраивает
+# логирование и снова включил бы заглушённый журнал событий
+from accounts import train_account as train_module
+from accounts.models import IntermediateChannel, TelegramAccount, TrainingCheckpoint
+from users.models import TelegramPeer, TelegramUser, TrainingChannel
+
+BENCH_OWNER = "bench"
+BENCH_PHONE = "+00000000000"
+BENCH_CHANNEL = "bench_channel"
+
+
+class QueryCounter:
+    """Считает SQL-запросы во всех потоках (sync_to_async ходит в БД из своего потока)."""
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        with self._lock:
+            self.count += 1
+        return execute(sql, params, many, context)
+
+    def _attach(self, sender=None, connection=None, **kwargs):
+        if self not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self)
+
+    def __enter__(self):
+        connection_created.connect(self._attach)
+        for conn in connections.all():
+            self._attach(connection=conn)
+        return self
+
+    def __exit__(self, *exc):
+        connection_created.disconnect(self._attach)
+        for conn in connections.all():
+            if self in conn.execute_wrappers:
+                conn.execute_wrappers.remove(self)
+        return False
+
+
+class VirtualSleep:
+    def __init__(self):
+        self.total = 0.0
+
+    def sleep(self, seconds):
+        self.total += max(0, seconds or 0)
+
+    async def asleep(self, seconds, result=None):
+        self.total += max(0, seconds or 0)
+        return result
+
+
+def _peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux отдаёт КБ, macOS — байты
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+class Command(BaseCommand):
+    help = "Бенчмарк invite / dm / train на фейковом TelegramClient: rows/s, запросов на элемент, пик RSS"
+
+    def add_arguments(self, parser):
+        parser.add_argument("scenario", choices=["invite", "dm", "train"])
+        parser.add_argument("--users", type=int, default=1000, help="сколько pending-пользователей засеять (invite/dm)")
+        parser.add_argument("--interval", type=int, default=30, help="interval задачи (сон виртуальный)")
+        parser.add_argument("--limit", type=int, default=100, help="limit одного запуска рассылки")
+        parser.add_argument("--channels", type=int, default=1, help="сколько TrainingChannel засеять (train)")
+        parser.add_argument("--messages", type=int, default=1000, help="сообщений в канале (train)")
+        parser.add_argument("--authors", type=int, default=300, help="уникальных авторов сообщений (train)")
+        parser.add_argument("--participants", type=int, default=500, help="участников в канале (train)")
+        parser.add_argument("--missing-sender-rate", type=float, default=0.0,
+                            help="доля сообщений без sender в ответе истории (train)")
+        parser.add_argument("--keep-checkpoints", action="store_true",
+                            help="не сбрасывать TrainingCheckpoint — замерить повторное обучение (train)")
+        parser.add_argument("--latency-ms", type=float, default=0.0, help="задержка одного RPC")
+        parser.add_argument("--jitter-ms", type=float, default=0.0)
+        parser.add_argument("--flood-rate", type=float, default=0.0, help="доля RPC с FloodWaitError")
+        parser.add_argument("--flood-seconds", type=int, default=30)
+        parser.add_argument("--error-rate", type=float, default=0.0, help="доля RPC с RPCError")
+        parser.add_argument("--seed", type=int, default=1)
+        parser.add_argument("--events", action="store_true", help="не глушить JSON-журнал задач")
+        parser.add_argument("--json", action="store_true", help="вывести отчёт одной JSON-строкой")
+
+    def handle(self, *args, **opts):
+        network = fake_telethon.configure(
+            latency=opts["latency_ms"] / 1000, jitter=opts["jitter_ms"] / 1000,
+            flood_rate=opts["flood_rate"], flood_seconds=opts["flood_seconds"],
+            error_rate=opts["error_rate"], messages=opts["messages"],
+            authors=opts["authors"], participants=opts["participants"],
+            missing_sender_rate=opts["missing_sender_rate"], seed=opts["seed"],
+        )
+        account = self._seed(opts)
+
+        events_logger = logging.getLogger("telemanager.events")
+        events_logger.disabled = not opts["events"]
+        sleeper = VirtualSleep()
+        runner = getattr(self, f"_run_{opts['scenario']}")
+
+        with mock.patch("time.sleep", sleeper.sleep), \
+                mock.patch("asyncio.sleep", sleeper.asleep), \
+                mock.patch("telethon.sync.TelegramClient", fake_telethon.FakeTelegramClient), \
+                mock.patch("telethon.TelegramClient", fake_telethon.FakeAsyncTelegramClient), \
+                QueryCounter() as queries:
+            started = time.perf_counter()
+            outcome = runner(account, opts)
+            elapsed = time.perf_counter() - started
+        events_logger.disabled = False
+
+        rows = outcome["rows"]
+        report = {
+            "scenario": opts["scenario"],
+            **outcome,
+            "elapsed_s": round(elapsed, 3),
+            "rows_per_s": round(rows / elapsed, 1) if elapsed > 0 else None,
+            "queries": queries.count,
+            "queries_per_item": round(queries.count / rows, 2) if rows else None,
+            "peak_rss_mb": _peak_rss_mb(),
+            "simulated_wait_s": round(sleeper.total, 1),
+            "rpc": network.stats(),
+        }
+        if opts["json"]:
+            self.stdout.write(json.dumps(report, ensure_ascii=False))
+            return
+        for key, value in report.items():
+            self.stdout.write(f"{key:>18}: {value}")
+
+    # --- данные ---
+    def _seed(self, opts):
+        owner, _ = User.objects.get_or_create(username=BENCH_OWNER)
+        account, _ = TelegramAccount.objects.update_or_create(
+            phone=BENCH_PHONE,
+            defaults=dict(
+                user=owner, session_file="bench.session", api_id="1", api_hash="bench", proxy=None,
+                stop_inviting=False, is_training=False,
+            ),
+        )
+        self._reset_buckets(account)
+        TelegramUser.objects.filter(owner=owner).delete()
+
+        if opts["scenario"] == "train":
+            if not opts["keep_checkpoints"]:
+                TrainingCheckpoint.objects.filter(account=account).delete()
+            for n in range(1, opts["channels"] + 1):
+                TrainingChannel.objects.update_or_create(
+                    username=f"bench_ch{n}", defaults={"type": "group", "is_active": True},
+                )
+            return account
+
+        base = fake_telethon.USER_ID_BASE
+        TelegramPeer.objects.bulk_create(
+            [TelegramPeer(id=base + n, name=f"User{base + n}", phone="") for n in range(opts["users"])],
+            batch_size=1000, ignore_conflicts=True,
+        )
+        TelegramUser.objects.bulk_create(
+            [TelegramUser(peer_id=base + n, owner=owner) for n in range(opts["users"])],
+            batch_size=1000,
+        )
+        return account
+
+    def _reset_buckets(self, account):
+        # время виртуальное, токены сами не копятся — каждый запуск начинаем с полного ведра
+        TelegramAccount.objects.filter(pk=account.pk).update(
+            invite_tokens=3, invite_token_refill_at=None, invite_refill_seconds=60, invite_success_streak=0,
+            send_tokens=3, send_token_refill_at=None, send_refill_seconds=30, send_success_streak=0,
+        )
+
+    # --- сценарии: {"rows": обработано строк, "runs": запусков задачи, ...} ---
+    def _run_invite(self, account, opts):
+        from accounts.tasks import _invite_all_users
+
+        channel, _ = IntermediateChannel.objects.get_or_create(username=BENCH_CHANNEL)
+        users = TelegramUser.objects.filter(owner_id=account.user_id)
+        finished = users.exclude(invite_status__in=["pending", "processing"])
+        runs = done = 0
+        while users.filter(invite_status="pending").exists():
+            runs += 1
+            self._reset_buckets(account)
+            result = _invite_all_users(None, account.id, channel.id, opts["interval"], account.user_id)
+            before, done = done, finished.count()
+            if result != "Готово":
+                self.stderr.write(f"invite: {result}")
+                if done <= before:
+                    break
+        return {
+            "rows": done,
+            "runs": runs,
+            # должно быть 0: при досрочной остановке RowClaim.release() возвращает строки в pending
+            "stuck_processing": users.filter(invite_status="processing").count(),
+        }
+
+    def _run_dm(self, account, opts):
+        from accounts.tasks import _send_direct_messages
+
+        if opts["limit"] <= 0:
+            raise CommandError("--limit должен быть > 0")
+        users = TelegramUser.objects.filter(owner_id=account.user_id)
+        runs = 0
+        while True:
+            runs += 1
+            self._reset_buckets(account)
+            result = _send_direct_messages(
+                None, account.id, "bench", opts["limit"], opts["interval"], None, account.user_id,
+            )
+            if not result or not result.startswith("Рассылка завершена"):
+                break
+        return {
+            "rows": users.exclude(message_status__in=["pending", "processing"]).count(),
+            "runs": runs,
+            "stuck_processing": users.filter(message_status="processing").count(),
+        }
+
+    def _run_train(self, account, opts):
+        from accounts.events import TaskRunLog
+
+        with tempfile.TemporaryDirectory() as sessions_dir:
+            open(os.path.join(sessions_dir, account.session_file), "w").close()
+            with mock.patch.object(train_module, "SESSIONS_DIR", sessions_dir), \
+                    mock.patch.object(train_module, "TelegramClient", fake_telethon.FakeAsyncTelegramClient):
+                run = TaskRunLog("train", account_id=account.id)
+                error = asyncio.run(train_module.train_account(account, run))
+                run.finish("failed" if error else "done", error)
+        if error:
+            self.stderr.write(f"train: {error}")
+        return {"rows": TelegramUser.objects.filter(owner_id=account.user_id).count(), "runs": 1}
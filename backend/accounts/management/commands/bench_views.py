@@ -0,0 +1,115 @@
+"""
+Бенчмарк ёмкости вьюх, которые ходят в Telegram: сколько одновременных
+запросов GET /api/accounts/<id>/profile/ держит процесс.
+
+    DATABASE_URL=sqlite:////tmp/bench.db python manage.py bench_views --requests 200 --latency-ms 300 --workers 8
+
+Два прогона на одной и той же вьюхе и фейковом клиенте (fake_telethon):
+  wsgi — как gunicorn sync / runserver: пул из --workers потоков, каждый запрос
+         держит поток весь MTProto round trip (так работали вьюхи на async_to_sync);
+  asgi — одна asyncio-петля (AsyncClient, как uvicorn): пока запрос ждёт
+         Telegram, петля обслуживает остальные.
+Аренда аккаунта (Redis) в прогоне подменена пустышкой.
+"""
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.test import AsyncClient, Client, override_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from accounts import fake_telethon
+from accounts.management.commands.bench_tasks import BENCH_OWNER, BENCH_PHONE
+from accounts.models import TelegramAccount
+
+
+class _NoLease:
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def hold(self, wait=0):
+        return self
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+def _summary(timings, elapsed):
+    ordered = sorted(timings)
+    pick = lambda q: round(ordered[min(len(ordered) - 1, int(q * (len(ordered) - 1)))] * 1000, 1)
+    return {
+        "elapsed_s": round(elapsed, 3),
+        "rps": round(len(timings) / elapsed, 1) if elapsed > 0 else None,
+        "p50_ms": pick(0.5),
+        "p95_ms": pick(0.95),
+    }
+
+
+class Command(BaseCommand):
+    help = "Ёмкость вьюхи профиля: пул потоков (WSGI) против asyncio-петли (ASGI) на фейковом Telegram"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200)
+        parser.add_argument("--workers", type=int, default=8, help="потоков в wsgi-прогоне (воркеры gunicorn sync)")
+        parser.add_argument("--concurrency", type=int, default=200, help="одновременных запросов в asgi-прогоне")
+        parser.add_argument("--latency-ms", type=float, default=300.0, help="задержка одного RPC")
+        parser.add_argument("--json", action="store_true", help="вывести отчёт одной JSON-строкой")
+
+    def handle(self, *args, **opts):
+        fake_telethon.configure(latency=opts["latency_ms"] / 1000)
+        owner, _ = User.objects.get_or_create(username=BENCH_OWNER)
+        account, _ = TelegramAccount.objects.update_or_create(
+            phone=BENCH_PHONE,
+            defaults=dict(user=owner, session_file="bench.session", api_id="1", api_hash="bench", proxy=None),
+        )
+        url = f"/api/accounts/{account.id}/profile/"
+        auth = {"Authorization": f"Bearer {AccessToken.for_user(owner)}"}
+
+        with override_settings(ALLOWED_HOSTS=["*"]), \
+                mock.patch("telethon.TelegramClient", fake_telethon.FakeAsyncTelegramClient), \
+                mock.patch("accounts.views.AccountLease", _NoLease):
+            report = {
+                "requests": opts["requests"],
+                "rpc_latency_ms": opts["latency_ms"],
+                "wsgi": {"workers": opts["workers"], **self._wsgi(url, auth, opts)},
+                "asgi": {"concurrency": opts["concurrency"], **asyncio.run(self._asgi(url, auth, opts))},
+            }
+
+        if opts["json"]:
+            self.stdout.write(json.dumps(report, ensure_ascii=False))
+            return
+        for key, value in report.items():
+            self.stdout.write(f"{key:>16}: {value}")
+
+    def _wsgi(self, url, auth, opts):
+        def one(_):
+            started = time.perf_counter()
+            response = Client().get(url, headers=auth)
+            assert response.status_code == 200, response.content[:200]
+            return time.perf_counter() - started
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(opts["workers"]) as pool:
+            timings = list(pool.map(one, range(opts["requests"])))
+        return _summary(timings, time.perf_counter() - started)
+
+    async def _asgi(self, url, auth, opts):
+        client, gate = AsyncClient(), asyncio.Semaphore(opts["concurrency"])
+
+        async def one():
+            async with gate:
+                started = time.perf_counter()
+                response = await client.get(url, headers=auth)
+                assert response.status_code == 200, response.content[:200]
+                return time.perf_counter() - started
+
+        started = time.perf_counter()
+        timings = await asyncio.gather(*(one() for _ in range(opts["requests"])))
+        return _summary(timings, time.perf_counter() - started)
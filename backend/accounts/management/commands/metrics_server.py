@@ -0,0 +1,26 @@
+"""
+Сервер Prometheus-метрик web-процессов на внутреннем порту.
+
+Метрики пишут процессы uvicorn/gunicorn в общий PROMETHEUS_MULTIPROC_DIR; этот
+процесс их собирает и отдаёт. Порт не публикуется наружу — скрейпит только
+Prometheus из внутренней сети (в публичном Django /metrics нет).
+
+    PROMETHEUS_MULTIPROC_DIR=/tmp/prometheus python manage.py metrics_server --port 9807
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from telemanager_django.metrics import serve_web_metrics
+
+
+class Command(BaseCommand):
+    help = "Отдаёт Prometheus-метрики web-процессов на отдельном порту"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--port", type=int, default=9807)
+        parser.add_argument("--addr", default="0.0.0.0")
+
+    def handle(self, *args, **opts):
+        try:
+            serve_web_metrics(opts["port"], opts["addr"])
+        except RuntimeError as e:
+            raise CommandError(str(e))
@@ -0,0 +1,86 @@
+"""
+Членство аккаунтов в чатах (ChatMembership) — чтобы не звать JoinChannelRequest
+на каждый цикл пересылки.
+
+Раньше пересылка вступала в источник и в каждую целевую группу при каждом
+запуске и глотала ошибку: до N+1 лишних RPC на задачу за цикл. Теперь join
+идёт, только если членство неизвестно (записи нет) или потеряно — запись
+снимает forget(), когда отправка отвечает NOT_MEMBER_ERRORS.
+
+    known = known_chats(account.id, [source, *groups])   # один запрос
+    ensure_joined(client, account.id, group.username, known)
+"""
+from asgiref.sync import sync_to_async
+from telethon.errors import (
+    ChannelPrivateError, ChatWriteForbiddenError, RPCError, UserAlreadyParticipantError, UserNotParticipantError,
+)
+from telethon.tl.functions.channels import JoinChannelRequest
+
+from accounts.models import ChatMembership
+
+# отправка/пересылка с такой ошибкой — аккаунт больше не в чате (вышел, кикнули, чат закрыт)
+NOT_MEMBER_ERRORS = (UserNotParticipantError, ChannelPrivateError, ChatWriteForbiddenError)
+
+
+def chat_key(chat) -> str:
+    """@Group, group, https://t.me/group, entity с username — один ключ; без username — id."""
+    if not isinstance(chat, (str, int)):
+        chat = getattr(chat, "username", None) or chat.id
+    s = str(chat).strip().lower()
+    for prefix in ("https://", "http://", "t.me/", "@"):
+        if s.startswith(prefix):
+            s = s[len(prefix):]
+    return s
+
+
+def known_chats(account_id, chats) -> set:
+    keys = {chat_key(c) for c in chats}
+    return set(
+        ChatMembership.objects.filter(account_id=account_id, chat__in=keys).values_list("chat", flat=True)
+    )
+
+
+def remember(account_id, *chats):
+    ChatMembership.objects.bulk_create(
+        [ChatMembership(account_id=account_id, chat=chat_key(c)) for c in chats], ignore_conflicts=True,
+    )
+
+
+def forget(account_id, chat):
+    ChatMembership.objects.filter(account_id=account_id, chat=chat_key(chat)).delete()
+
+
+def ensure_joined(client, account_id, chat, known: set | None = None) -> bool:
+    """
+    Sync-клиент. JoinChannelRequest — только если чата нет в known (или в БД,
+    если known не передан). True — аккаунт в чате; ошибку join, как и раньше, не поднимаем.
+    """
+    key = chat_key(chat)
+    if known is None:
+        known = known_chats(account_id, [key])
+    if key in known:
+        return True
+    try:
+        client(JoinChannelRequest(chat))
+    except UserAlreadyParticipantError:
+        pass
+    except RPCError:
+        return False
+    remember(account_id, key)
+    known.add(key)
+    return True
+
+
+async def aensure_joined(client, account_id, chat) -> bool:
+    """То же для async-клиента (train_account.py)."""
+    key = chat_key(chat)
+    if key in await sync_to_async(known_chats)(account_id, [key]):
+        return True
+    try:
+        await client(JoinChannelRequest(chat))
+    except UserAlreadyParticipantError:
+        pass
+    except Exception:
+        return False  # приватный / нет прав / обычная группа — для сбора участников не критично
+    await sync_to_async(remember)(account_id, key)
+    return True
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.7 on 2026-10-19 13:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_telegramaccount_invite_refill_seconds_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=20)),
+                ('task_id', models.CharField(blank=True, db_index=True, max_length=255, null=True)),
+                ('params', models.JSONField(blank=True, null=True)),
+                ('status', models.CharField(choices=[('running', 'Running'), ('done', 'Done'), ('stopped', 'Stopped'), ('failed', 'Failed')], default='running', max_length=10)),
+                ('result', models.CharField(blank=True, max_length=255, null=True)),
+                ('ok', models.IntegerField(default=0)),
+                ('failed', models.IntegerField(default=0)),
+                ('errors', models.JSONField(blank=True, null=True)),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('account', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='task_runs', to='accounts.telegramaccount')),
+            ],
+            options={
+                'ordering': ['-id'],
+                'indexes': [models.Index(fields=['account', 'kind', 'started_at'], name='accounts_ta_account_2fb0a8_idx')],
+            },
+        ),
+    ]
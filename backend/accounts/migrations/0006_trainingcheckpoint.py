@@ -0,0 +1,29 @@
+# Generated by Django 5.2.7 on 2026-10-19 14:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_taskrun'),
+        ('users', '0004_alter_telegramuser_options_telegramuser_created_at_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrainingCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('max_message_id', models.BigIntegerField(default=0)),
+                ('participants_offset', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='training_checkpoints', to='accounts.telegramaccount')),
+                ('channel', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='checkpoints', to='users.trainingchannel')),
+            ],
+            options={
+                'unique_together': {('account', 'channel')},
+            },
+        ),
+    ]
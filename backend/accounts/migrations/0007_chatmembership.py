@@ -0,0 +1,26 @@
+# Generated by Django 5.2.7 on 2026-10-19 14:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0006_trainingcheckpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChatMembership',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('chat', models.CharField(max_length=255)),
+                ('joined_at', models.DateTimeField(auto_now_add=True)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chat_memberships', to='accounts.telegramaccount')),
+            ],
+            options={
+                'unique_together': {('account', 'chat')},
+            },
+        ),
+    ]
@@ -14,9 +14,23 @@ class Proxy(models.Model):
     username = models.CharField(max_length=100, blank=True, null=True)
     password = models.CharField(max_length=100, blank=True, null=True)
 
+    # здоровье по результатам probe_proxies_task (accounts/proxy_health.py):
+    # скользящие средние задержки рукопожатия и доли ошибок, None — ещё не проверялся
+    is_alive = models.BooleanField(null=True, blank=True)
+    latency_ms = models.FloatField(null=True, blank=True)
+    error_rate = models.FloatField(default=0.0)
+    consecutive_failures = models.PositiveIntegerField(default=0)
+    last_checked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.CharField(max_length=255, blank=True, null=True)
+
     def __str__(self):
         return f"{self.proxy_type.upper()} {self.host}:{self.port}"
 
+    @property
+    def is_down(self) -> bool:
+        # не проверенный ещё прокси не считаем мёртвым
+        return self.is_alive is False
+
 class TelegramAccount(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='telegram_accounts')
     phone = models.CharField(max_length=20, unique=True)
@@ -82,3 +96,79 @@ class IntermediateChannel(models.Model):
 
     def __str__(self):
         return self.username
+
+
+class TaskRun(models.Model):
+    """Сводка одного прогона задачи (accounts.events.TaskRunLog)."""
+    STATUS_CHOICES = [
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('stopped', 'Stopped'),
+        ('failed', 'Failed'),
+    ]
+
+    kind = models.CharField(max_length=20)  # invite / dm / forward / train / check / join
+    task_id = models.CharField(max_length=255, blank=True, null=True, db_index=True)
+    account = models.ForeignKey(
+        TelegramAccount,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='task_runs'
+    )
+    params = models.JSONField(blank=True, null=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='running')
+    result = models.CharField(max_length=255, blank=True, null=True)
+
+    ok = models.IntegerField(default=0)
+    failed = models.IntegerField(default=0)
+    errors = models.JSONField(blank=True, null=True)  # {"FLOOD_WAIT": 3, "PRIVACY": 12}
+
+    started_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-id']
+        indexes = [
+            models.Index(fields=['account', 'kind', 'started_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} #{self.pk} ({self.status})"
+
+
+class TrainingCheckpoint(models.Model):
+    """
+    Докуда аккаунт уже прочитал обучающий канал (train_account.py):
+    повторное обучение берёт только сообщения новее max_message_id,
+    а прерванный скан участников продолжается с participants_offset.
+    """
+    account = models.ForeignKey(TelegramAccount, on_delete=models.CASCADE, related_name='training_checkpoints')
+    channel = models.ForeignKey('users.TrainingChannel', on_delete=models.CASCADE, related_name='checkpoints')
+    max_message_id = models.BigIntegerField(default=0)
+    # 0 — скан участников не начат или пройден целиком
+    participants_offset = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('account', 'channel')
+
+    def __str__(self):
+        return f"{self.account_id}:{self.channel_id} msg>{self.max_message_id} offset={self.participants_offset}"
+
+
+class ChatMembership(models.Model):
+    """
+    Аккаунт уже состоит в чате/канале (accounts/memberships.py): пересылка,
+    join_channel и обучение зовут JoinChannelRequest, только если записи нет.
+    Запись снимается, когда отправка в чат отвечает «не участник».
+    """
+    account = models.ForeignKey(TelegramAccount, on_delete=models.CASCADE, related_name='chat_memberships')
+    chat = models.CharField(max_length=255)  # memberships.chat_key: username без @ в нижнем регистре или id
+    joined_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('account', 'chat')
+
+    def __str__(self):
+        return f"{self.account_id} in {self.chat}"
@@ -0,0 +1,127 @@
+"""
+Живой прогресс задач через Redis pub/sub.
+
+Задача публикует компактное событие {processed, ok, failed, total, eta} в канал
+аккаунта не чаще PROGRESS_MIN_INTERVAL; последнее состояние дополнительно
+лежит в ключе с TTL, чтобы новый подписчик сразу получил снимок.
+Сам поход в Redis делает RedisProgressHandler в потоке QueueListener
+(accounts.events): publish() только кладёт запись в очередь.
+Фронтенд слушает /api/accounts/progress/stream/ (SSE, см. views.progress_stream_view)
+по короткому токену потока из /api/accounts/progress/stream/token/.
+"""
+import asyncio
+import json
+import logging
+import time
+
+import redis
+import redis.asyncio as aioredis
+from django.conf import settings
+
+from accounts.events import logger
+from accounts.leases import get_redis
+
+CHANNEL = "tm:progress:account:{}"
+LAST_KEY = "tm:progress:last:{}"
+LAST_TTL = 3600
+
+
+def is_progress(record) -> bool:
+    return getattr(record, "progress", None) is not None
+
+
+class RedisProgressHandler(logging.Handler):
+    """Публикует записи прогресса из очереди accounts.events; остальные записи пропускает."""
+
+    def __init__(self):
+        super().__init__()
+        self.addFilter(is_progress)
+
+    def emit(self, record):
+        account_id, payload = record.progress
+        try:
+            pipe = get_redis().pipeline(transaction=False)
+            pipe.publish(CHANNEL.format(account_id), payload)
+            pipe.set(LAST_KEY.format(account_id), payload, ex=LAST_TTL)
+            pipe.execute()
+        except redis.RedisError:
+            # прогресс — вспомогательный канал, из-за него задача падать не должна
+            pass
+
+
+class ProgressPublisher:
+    def __init__(self, account_id, kind, task_id=None, min_interval=None):
+        self.account_id = account_id
+        self.kind = kind
+        self.task_id = task_id
+        self.min_interval = settings.PROGRESS_MIN_INTERVAL if min_interval is None else min_interval
+        self.total = None
+        self.stage = {}
+        self._started = time.monotonic()
+        self._last_sent = 0.0
+
+    def publish(self, ok, failed, status="running", force=False):
+        now = time.monotonic()
+        if not force and now - self._last_sent < self.min_interval:
+            return
+        self._last_sent = now
+
+        processed = ok + failed
+        elapsed = now - self._started
+        eta = None
+        if self.total and processed and processed < self.total:
+            eta = int((self.total - processed) * elapsed / processed)
+
+        payload = json.dumps({
+            "account_id": self.account_id,
+            "kind": self.kind,
+            "task_id": self.task_id,
+            "status": status,
+            "processed": processed,
+            "ok": ok,
+            "failed": failed,
+            "total": self.total,
+            "eta": eta,
+            "ts": int(time.time()),
+            **self.stage,
+        }, ensure_ascii=False, default=str)
+        logger.info("progress", extra={"progress": (self.account_id, payload)})
+
+
+def last_progress(account_ids) -> list:
+    ids = list(account_ids)
+    if not ids:
+        return []
+    try:
+        raw = get_redis().mget([LAST_KEY.format(i) for i in ids])
+    except redis.RedisError:
+        return []
+    return [v for v in raw if v]
+
+
+async def stream_events(account_ids, heartbeat=15):
+    """
+    SSE-генератор: сначала снимок последних состояний, затем живые события.
+    Пустой комментарий раз в `heartbeat` секунд не даёт прокси закрыть соединение.
+    """
+    # клиент Redis синхронный — снимок читаем в потоке, как AccountLease.aacquire
+    for payload in await asyncio.to_thread(last_progress, account_ids):
+        yield f"data: {payload}\n\n"
+
+    if not account_ids:
+        return
+
+    client = aioredis.Redis.from_url(settings.REDIS_URL, decode_responses=True)
+    pubsub = client.pubsub()
+    await pubsub.subscribe(*[CHANNEL.format(i) for i in account_ids])
+    try:
+        while True:
+            message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=heartbeat)
+            if message is None:
+                yield ": ping\n\n"
+                continue
+            yield f"data: {message['data']}\n\n"
+    finally:
+        await pubsub.unsubscribe()
+        await pubsub.aclose()
+        await client.aclose()
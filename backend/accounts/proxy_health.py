@@ -0,0 +1,142 @@
+"""
+Проверка прокси: подключение и рукопожатие до Telegram через каждый прокси.
+
+Раньше о мёртвом прокси узнавали, когда задача минуту висела на таймауте
+подключения. probe_proxies_task (beat, раз в PROXY_PROBE_INTERVAL) параллельно
+проходит все прокси: TCP-подключение и SOCKS5 CONNECT / HTTP CONNECT до
+PROXY_PROBE_TARGET — тот же путь, что у Telethon, но без MTProto.
+
+В Proxy хранятся скользящие средние (вес новой проверки PROXY_PROBE_ALPHA):
+latency_ms — время рукопожатия, error_rate — доля неудач. После
+PROXY_DOWN_AFTER неудач подряд прокси помечается is_alive=False, и
+рассылка / обучение на его аккаунтах не запускаются (accounts/views.py).
+
+    results = asyncio.run(probe_all(Proxy.objects.all()))
+    # {proxy_id: {"ok": True, "latency_ms": 84.2, "error": None}, ...}
+"""
+import asyncio
+import base64
+import ipaddress
+import time
+
+from django.conf import settings
+from django.utils import timezone
+
+from accounts.models import Proxy
+
+
+class ProbeError(Exception):
+    pass
+
+
+async def _socks5(reader, writer, proxy, host, port):
+    creds = bool(proxy.username or proxy.password)
+    writer.write(b"\x05\x02\x00\x02" if creds else b"\x05\x01\x00")
+    await writer.drain()
+    ver, method = await reader.readexactly(2)
+    if ver != 5:
+        raise ProbeError("socks5: не SOCKS5-сервер")
+    if method == 0x02:
+        user, pwd = (proxy.username or "").encode(), (proxy.password or "").encode()
+        writer.write(b"\x01" + bytes([len(user)]) + user + bytes([len(pwd)]) + pwd)
+        await writer.drain()
+        _, status = await reader.readexactly(2)
+        if status != 0:
+            raise ProbeError("socks5: неверный логин/пароль")
+    elif method != 0x00:
+        raise ProbeError("socks5: нет подходящего способа авторизации")
+
+    try:
+        addr = b"\x01" + ipaddress.IPv4Address(host).packed
+    except ValueError:
+        addr = b"\x03" + bytes([len(host)]) + host.encode()
+    writer.write(b"\x05\x01\x00" + addr + port.to_bytes(2, "big"))
+    await writer.drain()
+    _, rep, _, _ = await reader.readexactly(4)
+    if rep != 0:
+        raise ProbeError(f"socks5: CONNECT отклонён (код {rep})")
+
+
+async def _http_connect(reader, writer, proxy, host, port):
+    lines = [f"CONNECT {host}:{port} HTTP/1.1", f"Host: {host}:{port}"]
+    if proxy.username or proxy.password:
+        token = base64.b64encode(f"{proxy.username or ''}:{proxy.password or ''}".encode()).decode()
+        lines.append(f"Proxy-Authorization: Basic {token}")
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode())
+    await writer.drain()
+    status = (await reader.readline()).decode(errors="replace").split()
+    if len(status) < 2 or status[1] != "200":
+        raise ProbeError(f"http: CONNECT отклонён ({' '.join(status[1:3]) or 'пустой ответ'})")
+
+
+async def probe(proxy: Proxy, target=None, timeout: float | None = None) -> dict:
+    """Одна проверка: {"ok", "latency_ms", "error"}. latency — подключение + рукопожатие."""
+    host, port = target or settings.PROXY_PROBE_TARGET
+    timeout = float(timeout or settings.PROXY_PROBE_TIMEOUT)
+    handshake = _socks5 if (proxy.proxy_type or "").lower() == "socks5" else _http_connect
+
+    async def _run():
+        reader, writer = await asyncio.open_connection(proxy.host, int(proxy.port))
+        try:
+            await handshake(reader, writer, proxy, host, int(port))
+        finally:
+            writer.close()
+
+    started = time.perf_counter()
+    try:
+        await asyncio.wait_for(_run(), timeout)
+    except asyncio.TimeoutError:
+        return {"ok": False, "latency_ms": None, "error": f"таймаут {timeout:g} с"}
+    except (OSError, asyncio.IncompleteReadError, ProbeError) as e:
+        return {"ok": False, "latency_ms": None, "error": str(e) or type(e).__name__}
+    return {"ok": True, "latency_ms": round((time.perf_counter() - started) * 1000, 1), "error": None}
+
+
+async def probe_all(proxies, concurrency: int | None = None, **kwargs) -> dict:
+    sem = asyncio.Semaphore(int(concurrency or settings.PROXY_PROBE_CONCURRENCY))
+
+    async def one(proxy):
+        async with sem:
+            return proxy.id, await probe(proxy, **kwargs)
+
+    return dict(await asyncio.gather(*(one(p) for p in proxies)))
+
+
+def record(proxy: Proxy, result: dict, now=None):
+    """Вносит проверку в скользящие средние прокси (без save)."""
+    alpha = float(settings.PROXY_PROBE_ALPHA)
+    first = proxy.last_checked_at is None
+    failed = 0.0 if result["ok"] else 1.0
+    proxy.error_rate = failed if first else round((1 - alpha) * proxy.error_rate + alpha * failed, 4)
+    proxy.last_checked_at = now or timezone.now()
+    if result["ok"]:
+        latency = result["latency_ms"]
+        proxy.latency_ms = latency if proxy.latency_ms is None else round((1 - alpha) * proxy.latency_ms + alpha * latency, 1)
+        proxy.consecutive_failures = 0
+        proxy.is_alive = True
+        proxy.last_error = None
+    else:
+        proxy.consecutive_failures += 1
+        proxy.last_error = (result["error"] or "")[:255]
+        if proxy.consecutive_failures >= settings.PROXY_DOWN_AFTER:
+            proxy.is_alive = False
+
+
+HEALTH_FIELDS = ["is_alive", "latency_ms", "error_rate", "consecutive_failures", "last_checked_at", "last_error"]
+
+
+def check_proxies() -> dict:
+    """Проверяет все прокси и сохраняет результат одним bulk_update."""
+    proxies = list(Proxy.objects.all())
+    if not proxies:
+        return {"checked": 0, "alive": 0, "down": []}
+    results = asyncio.run(probe_all(proxies))
+    now = timezone.now()
+    for proxy in proxies:
+        record(proxy, results[proxy.id], now)
+    Proxy.objects.bulk_update(proxies, HEALTH_FIELDS)
+    return {
+        "checked": len(proxies),
+        "alive": sum(1 for p in proxies if results[p.id]["ok"]),
+        "down": [p.id for p in proxies if p.is_down],
+    }
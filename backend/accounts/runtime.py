@@ -0,0 +1,157 @@
+"""
+Async-воркер кампаний: инвайты и рассылки многих аккаунтов в одном процессе.
+
+Celery-воркер campaigns держит процесс (и поток) на аккаунт, который почти всё
+время спит между инвайтами. Здесь каждое задание — корутина (tasks.invite_all_users,
+tasks.send_direct_messages) в общей петле, Telethon-клиенты асинхронные, ORM
+уходит в пул потоков. Один процесс ведёт десятки аккаунтов.
+
+Очередь — Redis-список tm:jobs:<queue>, не протокол Celery: задание берётся
+BLMOVE в inflight-список воркера и удаляется оттуда по завершении, так что
+упавший воркер с тем же --name при старте вернёт свои задания в очередь.
+
+    python manage.py async_worker --queue campaigns --concurrency 50 --threads 16
+
+Вьюхи ставят задания через dispatch(): при ASYNC_WORKER_ENABLED — сюда,
+иначе — как раньше, Celery-задачей.
+"""
+import asyncio
+import json
+import logging
+import os
+import signal
+import socket
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from redis import asyncio as aioredis
+
+from accounts.leases import AccountLease, get_redis
+
+logger = logging.getLogger("telemanager.runtime")
+
+QUEUE_KEY = "tm:jobs:{}"
+DELAYED_KEY = "tm:jobs:{}:delayed"          # zset: задание -> когда вернуть в очередь
+INFLIGHT_KEY = "tm:jobs:{}:inflight:{}"     # задания, которые воркер сейчас выполняет
+
+
+def _handlers():
+    # импорт здесь: tasks тянет Telethon, а enqueue/dispatch нужны вьюхам
+    from accounts import tasks
+    return {"invite": tasks.invite_all_users, "dm": tasks.send_direct_messages}
+
+
+def enqueue(kind: str, queue: str = "campaigns", **kwargs) -> str:
+    """Ставит задание в очередь async-воркера; возвращает его id (в роли task_id)."""
+    job_id = uuid.uuid4().hex
+    get_redis().lpush(QUEUE_KEY.format(queue), json.dumps({"id": job_id, "kind": kind, "kwargs": kwargs}))
+    return job_id
+
+
+def dispatch(kind: str, celery_task, **kwargs) -> str:
+    """Запуск кампании: async-воркер, если он включён, иначе celery_task.delay(**kwargs)."""
+    if settings.ASYNC_WORKER_ENABLED:
+        return enqueue(kind, **kwargs)
+    return celery_task.delay(**kwargs).id
+
+
+class AsyncWorker:
+    def __init__(self, queue: str = "campaigns", concurrency: int | None = None,
+                 threads: int | None = None, name: str | None = None, grace: float | None = None):
+        self.queue = queue
+        self.concurrency = int(concurrency or settings.ASYNC_WORKER_CONCURRENCY)
+        self.threads = int(threads or settings.ASYNC_WORKER_THREADS)
+        self.grace = float(settings.ASYNC_WORKER_SHUTDOWN_GRACE if grace is None else grace)
+        # имя должно переживать рестарт (как -n у Celery), иначе inflight старого процесса некому вернуть
+        self.name = name or f"{socket.gethostname()}:{os.getpid()}"
+        self.queue_key = QUEUE_KEY.format(queue)
+        self.delayed_key = DELAYED_KEY.format(queue)
+        self.inflight_key = INFLIGHT_KEY.format(queue, self.name)
+        self.handlers = _handlers()
+        self.redis = None
+        self._running = set()
+        self._closing = None
+
+    def run(self):
+        asyncio.run(self.main())
+
+    async def main(self):
+        loop = asyncio.get_running_loop()
+        # sync_to_async(thread_sensitive=False) идёт в executor по умолчанию:
+        # threads — потолок одновременных запросов к БД (и соединений) от процесса
+        loop.set_default_executor(ThreadPoolExecutor(self.threads, thread_name_prefix="orm"))
+        self._closing = asyncio.Event()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, self._closing.set)
+
+        self.redis = aioredis.from_url(settings.REDIS_URL, decode_responses=True)
+        try:
+            await self._recover()
+            logger.info("async worker %s: queue=%s concurrency=%s threads=%s",
+                        self.name, self.queue, self.concurrency, self.threads)
+            while not self._closing.is_set():
+                await self._promote_delayed()
+                if len(self._running) >= self.concurrency:
+                    await asyncio.wait(self._running, timeout=1, return_when=asyncio.FIRST_COMPLETED)
+                    continue
+                raw = await self.redis.blmove(self.queue_key, self.inflight_key, 1, "RIGHT", "LEFT")
+                if raw is None:
+                    continue
+                task = asyncio.create_task(self._run(raw))
+                self._running.add(task)
+                task.add_done_callback(self._running.discard)
+            await self._shutdown()
+        finally:
+            await self.redis.aclose()
+
+    async def _recover(self):
+        """Задания, оставшиеся в inflight от прошлого процесса с этим именем, — обратно в очередь."""
+        moved = 0
+        while await self.redis.lmove(self.inflight_key, self.queue_key, "RIGHT", "RIGHT"):
+            moved += 1
+        if moved:
+            logger.warning("async worker %s: вернул в очередь %s незавершённых заданий", self.name, moved)
+
+    async def _promote_delayed(self):
+        due = await self.redis.zrangebyscore(self.delayed_key, "-inf", time.time())
+        for raw in due:
+            # zrem — кто первый снял, тот и переложил: между воркерами без дублей
+            if await self.redis.zrem(self.delayed_key, raw):
+                await self.redis.lpush(self.queue_key, raw)
+
+    async def _run(self, raw: str):
+        job = json.loads(raw)
+        job_id, kind, kwargs = job["id"], job["kind"], job.get("kwargs") or {}
+        try:
+            handler = self.handlers.get(kind)
+            if handler is None:
+                logger.error("async worker: неизвестное задание %s (%s)", kind, job_id)
+                return
+            lease = AccountLease(kwargs["account_id"], kind, task_id=job_id)
+            if not await lease.aacquire():
+                # аккаунт занят — как self.retry у Celery-задачи: вернёмся позже
+                await self.redis.zadd(self.delayed_key, {raw: time.time() + settings.ACCOUNT_LEASE_RETRY_SECONDS})
+                return
+            try:
+                await handler(task_id=job_id, **kwargs)
+            finally:
+                await lease.arelease()
+        except asyncio.CancelledError:
+            # остановка воркера: строки задача уже вернула (claim.release), само задание — в очередь
+            await self.redis.lpush(self.queue_key, raw)
+            raise
+        except Exception:
+            logger.exception("async worker: задание %s (%s) упало", kind, job_id)
+        finally:
+            await self.redis.lrem(self.inflight_key, 1, raw)
+
+    async def _shutdown(self):
+        if not self._running:
+            return
+        logger.info("async worker %s: ждём %s заданий до %s с", self.name, len(self._running), self.grace)
+        _, pending = await asyncio.wait(set(self._running), timeout=self.grace)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
@@ -1,17 +1,41 @@
 from rest_framework import serializers
 from .models import TelegramAccount
 from .models import Proxy
+from .models import TaskRun
 
 class TelegramAccountSerializer(serializers.ModelSerializer):
+    # кто сейчас держит сессию аккаунта (accounts.leases); None — аккаунт свободен
+    lease = serializers.SerializerMethodField()
+    # False — прокси аккаунта мёртв по последним проверкам, None — прокси нет или не проверялся
+    proxy_alive = serializers.BooleanField(source='proxy.is_alive', read_only=True, allow_null=True, default=None)
+
     class Meta:
         model = TelegramAccount
         fields = [
             'id', 'phone', 'geo', 'status', 'days_idle', 'role',
             'name', 'last_used', 'proxy_id',
-            'api_id', 'api_hash', 'twofa_password', 'is_training', 'training_status', 'invite_task_id'
+            'api_id', 'api_hash', 'twofa_password', 'is_training', 'training_status', 'invite_task_id',
+            'lease', 'proxy_alive',
         ]
 
+    def get_lease(self, obj):
+        return self.context.get("leases", {}).get(obj.id)
+
 class ProxySerializer(serializers.ModelSerializer):
     class Meta:
         model = Proxy
-        fields = ['id', 'host', 'port', 'proxy_type', 'username', 'password']
\ No newline at end of file
+        fields = [
+            'id', 'host', 'port', 'proxy_type', 'username', 'password',
+            'is_alive', 'latency_ms', 'error_rate', 'consecutive_failures', 'last_checked_at', 'last_error',
+        ]
+        # заполняет probe_proxies_task
+        read_only_fields = ['is_alive', 'latency_ms', 'error_rate', 'consecutive_failures', 'last_checked_at', 'last_error']
+
+
+class TaskRunSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = TaskRun
+        fields = [
+            'id', 'kind', 'task_id', 'account_id', 'params', 'status', 'result',
+            'ok', 'failed', 'errors', 'started_at', 'finished_at',
+        ]
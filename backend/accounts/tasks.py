@@ -1,29 +1,75 @@
+import asyncio
 import os, time
+from asgiref.sync import sync_to_async
 from celery import shared_task
-from telethon.sync import TelegramClient
-from telethon.tl.functions.channels import InviteToChannelRequest
-from telethon.tl.types import PeerChannel
-from telethon.errors import FloodWaitError, RPCError
-from django.db import transaction
+from django.db import close_old_connections, transaction
+from django.db.models import Prefetch, prefetch_related_objects
 from accounts.models import TelegramAccount, IntermediateChannel
+from accounts.leases import AccountLease, LeaseBusy
+from accounts.claims import RowClaim, reap_expired
+from accounts.cancellation import StopToken
+from accounts.events import TaskRunLog
+from telemanager_django.metrics import (
+    ATTEMPTS, FLOOD_WAIT_SECONDS, RPC_LATENCY, DB_FLUSH_LATENCY, TOKEN_WAIT, timed, record_result,
+)
 from users.models import TelegramUser
+from forwarding.models import ForwardingTask, ForwardingGroup
+from forwarding.source_cache import SourceMessages
 from datetime import timedelta
 from django.utils import timezone
 from django.conf import settings
 import re, random
-try:
-    import socks
-except Exception:
-    socks = None
+
+# Telethon и socks импортируются внутри задач, при первом использовании: web-процессы
+# (вьюхи ставят задачи через .delay), beat и сервисные воркеры не платят за их импорт
 
 SESSION_DIR = os.path.join(settings.BASE_DIR, "sessions")
 
+
+def _tally(run, action, error_code=None, n=1, account_id=None):
+    """Итог попытки: в сводку прогона (TaskRun) и в метрики."""
+    run.count(error_code, n)
+    record_result(action, account_id or run.account_id, run.kind, error_code, n)
+
+
+def _db(fn):
+    """
+    ORM из корутины — в пуле потоков, чтобы запросы разных аккаунтов не ждали друг друга.
+    Потоки пула живут долго (async-воркер), поэтому вокруг каждого вызова — как вокруг
+    запроса у Django — close_old_connections: протухшее или упавшее соединение не остаётся
+    в потоке навсегда, а с пулом psycopg соединение возвращается в пул.
+    """
+    def call(*args, **kwargs):
+        close_old_connections()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            close_old_connections()
+    return sync_to_async(call, thread_sensitive=False)
+
+
+def _save_each(objs):
+    for obj in objs:
+        obj.save()
+
+
+def _with_locked_account(account_id, fn, *args, **kwargs):
+    """fn(account, ...) под select_for_update: корзина токенов меняется атомарно."""
+    with transaction.atomic():
+        acc = TelegramAccount.objects.select_for_update().get(id=account_id)
+        return fn(acc, *args, **kwargs)
+
+
 def _session_path_for(account):
     fname = account.session_file or f"{account.phone}.session"
     return os.path.join(SESSION_DIR, fname)
 
 def _build_proxy(proxy_obj):
-    if not proxy_obj or not socks:
+    if not proxy_obj:
+        return None
+    try:
+        import socks
+    except Exception:
         return None
     t = (proxy_obj.proxy_type or '').lower()
     if t == 'socks5':
@@ -115,188 +161,234 @@ def invite_all_users_task(self, account_id, channel_id, interval=30, owner_user_
     """
     Приглашение в промежуточный канал ТОЛЬКО пользователей, принадлежащих владельцу аккаунта.
     """
+    lease = AccountLease(account_id, "invite", task_id=self.request.id)
+    if not lease.acquire():
+        # аккаунт занят другой операцией — встаём в очередь за арендой, а не падаем
+        raise self.retry(countdown=settings.ACCOUNT_LEASE_RETRY_SECONDS, max_retries=None)
+    try:
+        return _invite_all_users(self.request.id, account_id, channel_id, interval, owner_user_id)
+    finally:
+        lease.release()
+
+
+def _invite_all_users(task_id, account_id, channel_id, interval, owner_user_id):
+    # Celery-задача и бенчмарк: своя петля на вызов; async-воркер (accounts/runtime.py) ждёт корутину сам
+    return asyncio.run(invite_all_users(task_id, account_id, channel_id, interval, owner_user_id))
+
+
+async def invite_all_users(task_id, account_id, channel_id, interval, owner_user_id):
+    from telethon import TelegramClient
+    from telethon.errors import FloodWaitError, RPCError
+    from telethon.tl.functions.channels import InviteToChannelRequest
+    from telethon.tl.types import PeerChannel
+
+    run = await _db(TaskRunLog)("invite", account_id=account_id, task_id=task_id, channel_id=channel_id, interval=interval)
+    claim = RowClaim("invite", account_id, task_id=task_id)
+    stop = StopToken(account_id, "invite")
     try:
-        account = TelegramAccount.objects.get(id=account_id)
-        channel = IntermediateChannel.objects.get(id=channel_id)
+        account = await _db(TelegramAccount.objects.get)(id=account_id)
+        channel = await _db(IntermediateChannel.objects.get)(id=channel_id)
 
         if owner_user_id is None:
             owner_user_id = account.user_id
 
+        acc_label = str(account_id)
         session_path = os.path.join("sessions", account.session_file)
         client = TelegramClient(session_path, int(account.api_id), account.api_hash)
 
-        with client:
-            entity = client.get_entity(channel.username)
+        async with client:
+            entity = await client.get_entity(channel.username)
             peer = PeerChannel(entity.id)
 
-            with transaction.atomic():
-                candidates = (
-                    TelegramUser.objects
-                    .select_for_update(skip_locked=True)
-                    .filter(owner_id=owner_user_id, invite_status="pending")
-                    .order_by("id")[:500]
-                )
-
-                users = []
-                for user in candidates:
-                    user.invite_status = "processing"
-                    user.invite_error_code = None
-                    if hasattr(user, "processed_by_id"):
-                        user.processed_by_id = account_id
-                    user.save(update_fields=["invite_status", "invite_error_code", "processed_by_id"] if hasattr(user, "processed_by_id") else ["invite_status", "invite_error_code"])
-                    users.append(user)
+            users = await _db(claim.claim)(
+                TelegramUser.objects.filter(owner_id=owner_user_id, invite_status="pending").order_by("id"), 500,
+            )
+
+            run.set_total(len(users))
 
             to_invite, user_refs = [], []
 
             for user in users:
+                await _db(claim.renew)(extra=interval)
                 try:
                     # Позволяем остановить задание
-                    if TelegramAccount.objects.get(id=account_id).stop_inviting:
-                        print("Остановка по флагу stop_inviting")
-                        return "Остановлено вручную"
+                    if await stop.arequested():
+                        run.event("invite.stop_requested")
+                        return await run.afinish("stopped", "Остановлено вручную")
 
-                    tg_user = client.get_entity(user.user_id)
+                    ATTEMPTS.labels(action="invite", account=acc_label, task="invite").inc()
+                    with timed(RPC_LATENCY, method="get_entity", account=acc_label, task="invite"):
+                        tg_user = await client.get_entity(user.peer_id)
                     to_invite.append(tg_user)
                     user_refs.append(user)
                 except Exception as e:
-                    print(f"Ошибка get_entity для {user.user_id}: {e}")
+                    run.warning("get_entity.failed", user_id=user.peer_id, error=str(e))
                     user.invite_status = "failed"
                     user.invite_error_code = "GET_ENTITY"
                     if hasattr(user, "processed_by_id"):
                         user.processed_by_id = account_id
-                    user.save()
+                    await _db(user.save)()
+                    _tally(run, "invite", "GET_ENTITY")
                     continue
 
                 if len(to_invite) == 1:
                     try:
-                        with transaction.atomic():
-                            acc = TelegramAccount.objects.select_for_update().get(id=account.id)
-                            ok, wait_for, refill_sec = _refill_and_consume_token(acc, "invite", min_refill_sec=interval)
+                        ok, wait_for, refill_sec = await _db(_with_locked_account)(
+                            account.id, _refill_and_consume_token, "invite", min_refill_sec=interval,
+                        )
 
                         if not ok:
                             if wait_for > 60:
-                                for r in user_refs:
-                                    if r.invite_status == "processing":
-                                        r.invite_status = "pending"
-                                        r.save(update_fields=["invite_status"])
-                                return f"Invite: нет токенов, подождать ~{wait_for}s (invite_refill_seconds={refill_sec})"
-                            time.sleep(wait_for)
-
-                        client(InviteToChannelRequest(peer, to_invite))
-                        print(f"Приглашено: {[u.id for u in to_invite]}")
-                        for u in user_refs:
-                            u.invite_status = "invited"
-                            u.invite_error_code = None
-                            if hasattr(u, "processed_by_id"):
-                                u.processed_by_id = account_id
-                            u.save()
-                        
-                        with transaction.atomic():
-                            acc = TelegramAccount.objects.select_for_update().get(id=account.id)
-                            _on_success_speedup(acc, "invite", floor_interval=interval)
+                                # необработанные строки вернёт в pending claim.release()
+                                run.event("invite.no_tokens", wait_s=wait_for, refill_s=refill_sec)
+                                return await run.afinish("stopped", f"Invite: нет токенов, подождать ~{wait_for}s (invite_refill_seconds={refill_sec})")
+                            TOKEN_WAIT.labels(bucket="invite", account=acc_label, task="invite").observe(wait_for)
+                            if await stop.asleep(wait_for):
+                                continue  # выход — на проверке в начале следующей итерации
+
+                        with timed(RPC_LATENCY, method="invite", account=acc_label, task="invite"):
+                            await client(InviteToChannelRequest(peer, to_invite))
+                        run.event("invite.sent", user_ids=[u.id for u in to_invite])
+                        with timed(DB_FLUSH_LATENCY, task="invite"):
+                            for u in user_refs:
+                                u.invite_status = "invited"
+                                u.invite_error_code = None
+                                if hasattr(u, "processed_by_id"):
+                                    u.processed_by_id = account_id
+                            await _db(_save_each)(user_refs)
+                        _tally(run, "invite", n=len(user_refs))
+
+                        await _db(_with_locked_account)(account.id, _on_success_speedup, "invite", floor_interval=interval)
 
                         to_invite.clear()
                         user_refs.clear()
-                        time.sleep(interval)
+                        await stop.asleep(interval)
                     except FloodWaitError as e:
-                        print(f"FloodWait: {e.seconds} сек.")
+                        run.warning("flood_wait", seconds=e.seconds)
+                        FLOOD_WAIT_SECONDS.labels(account=acc_label, task="invite").inc(e.seconds)
                         for u in user_refs:
                             u.invite_status = "failed"
                             u.invite_error_code = "FLOOD_WAIT"
                             if hasattr(u, "processed_by_id"):
                                 u.processed_by_id = account_id
-                            u.save()
+                        await _db(_save_each)(user_refs)
+                        _tally(run, "invite", "FLOOD_WAIT", n=len(user_refs))
                         
 
                         wait = getattr(e, "seconds", None)  # у RPCError может не быть секунд
-                        with transaction.atomic():
-                            acc = TelegramAccount.objects.select_for_update().get(id=account.id)
-                            _on_flood_slowdown(acc, "invite", wait=wait)
+                        await _db(_with_locked_account)(account.id, _on_flood_slowdown, "invite", wait=wait)
 
 
-                        time.sleep(e.seconds)
+                        await _db(claim.renew)(extra=e.seconds)
+                        await stop.asleep(e.seconds)
                         to_invite.clear()
                         user_refs.clear()
                     except RPCError as e:
-                        print(f"RPC ошибка: {e}")
+                        run.warning("invite.rpc_error", error=str(e))
                         for u in user_refs:
                             u.invite_status = "failed"
                             u.invite_error_code = "RPC_ERROR"
                             if hasattr(u, "processed_by_id"):
                                 u.processed_by_id = account_id
-                            u.save()
+                        await _db(_save_each)(user_refs)
+                        _tally(run, "invite", "RPC_ERROR", n=len(user_refs))
 
                         wait = getattr(e, "seconds", None)
-                        with transaction.atomic():
-                            acc = TelegramAccount.objects.select_for_update().get(id=account.id)
-                            _on_flood_slowdown(acc, "invite", wait=wait)
+                        await _db(_with_locked_account)(account.id, _on_flood_slowdown, "invite", wait=wait)
 
 
-                        time.sleep(60)
+                        await stop.asleep(60)
                         to_invite.clear()
                         user_refs.clear()
                     except Exception as e:
-                        print(f"Неизвестная ошибка инвайта: {e}")
+                        run.error("invite.failed", error=str(e))
                         for u in user_refs:
                             u.invite_status = "failed"
                             u.invite_error_code = "UNKNOWN"
                             if hasattr(u, "processed_by_id"):
                                 u.processed_by_id = account_id
-                            u.save()
-                        time.sleep(60)
+                        await _db(_save_each)(user_refs)
+                        _tally(run, "invite", "UNKNOWN", n=len(user_refs))
+                        await stop.asleep(60)
                         to_invite.clear()
                         user_refs.clear()
 
-            if to_invite:
+            if to_invite and not await stop.arequested():
                 try:
-                    client(InviteToChannelRequest(peer, to_invite))
-                    print(f"Приглашено финально: {[u.id for u in to_invite]}")
-                    for u in user_refs:
-                        u.invite_status = "invited"
-                        u.invite_error_code = None
-                        if hasattr(u, "processed_by_id"):
-                            u.processed_by_id = account_id
-                        u.save()
+                    with timed(RPC_LATENCY, method="invite", account=acc_label, task="invite"):
+                        await client(InviteToChannelRequest(peer, to_invite))
+                    run.event("invite.sent", user_ids=[u.id for u in to_invite], final=True)
+                    with timed(DB_FLUSH_LATENCY, task="invite"):
+                        for u in user_refs:
+                            u.invite_status = "invited"
+                            u.invite_error_code = None
+                            if hasattr(u, "processed_by_id"):
+                                u.processed_by_id = account_id
+                        await _db(_save_each)(user_refs)
+                    _tally(run, "invite", n=len(user_refs))
                 except FloodWaitError as e:
-                    print(f"FloodWait в конце: {e.seconds} сек.")
+                    run.warning("flood_wait", seconds=e.seconds, final=True)
+                    FLOOD_WAIT_SECONDS.labels(account=acc_label, task="invite").inc(e.seconds)
                     for u in user_refs:
                         u.invite_status = "failed"
                         u.invite_error_code = "FLOOD_WAIT"
-                        u.save()
+                    await _db(_save_each)(user_refs)
+                    _tally(run, "invite", "FLOOD_WAIT", n=len(user_refs))
 
                     wait = getattr(e, "seconds", None)
-                    with transaction.atomic():
-                        acc = TelegramAccount.objects.select_for_update().get(id=account.id)
-                        _on_flood_slowdown(acc, "invite", wait=wait)
+                    await _db(_with_locked_account)(account.id, _on_flood_slowdown, "invite", wait=wait)
 
 
-                    time.sleep(e.seconds)
+                    await _db(claim.renew)(extra=e.seconds)
+                    await stop.asleep(e.seconds)
                 except Exception as e:
-                    print(f"Финальная ошибка: {e}")
+                    run.error("invite.failed", error=str(e), final=True)
                     for u in user_refs:
                         u.invite_status = "failed"
                         u.invite_error_code = "UNKNOWN"
-                        u.save()
+                    await _db(_save_each)(user_refs)
+                    _tally(run, "invite", "UNKNOWN", n=len(user_refs))
 
-        return "Готово"
+        return await run.afinish("done", "Готово")
 
+    except asyncio.CancelledError:
+        # воркер останавливается — задачу снимают посреди пачки
+        await run.afinish("stopped", "Воркер остановлен")
+        raise
     except Exception as e:
-        return f"Ошибка: {str(e)}"
+        run.error("run.error", error=str(e))
+        return await run.afinish("failed", f"Ошибка: {str(e)}")
+    finally:
+        # остановка, нет токенов, ошибка — недоделанное сразу обратно в очередь
+        released = await _db(claim.release)()
+        if released:
+            run.event("invite.released", count=released)
 
 
 @shared_task(bind=True)
 def send_direct_messages_task(self, account_id, message_text, limit=100, interval=10, media_path=None, owner_user_id=None):
-    import os, time, random
-    from django.db import transaction
-    from telethon.sync import TelegramClient
-    from telethon.errors import FloodWaitError, RPCError, PeerIdInvalidError, UserPrivacyRestrictedError
-    from accounts.models import TelegramAccount
-    from users.models import TelegramUser
+    lease = AccountLease(account_id, "dm", task_id=self.request.id)
+    if not lease.acquire():
+        raise self.retry(countdown=settings.ACCOUNT_LEASE_RETRY_SECONDS, max_retries=None)
+    try:
+        return _send_direct_messages(self.request.id, account_id, message_text, limit, interval, media_path, owner_user_id)
+    finally:
+        lease.release()
+
+
+def _send_direct_messages(task_id, account_id, message_text, limit, interval, media_path, owner_user_id):
+    return asyncio.run(send_direct_messages(task_id, account_id, message_text, limit, interval, media_path, owner_user_id))
+
+
+async def send_direct_messages(task_id, account_id, message_text, limit, interval, media_path, owner_user_id):
+    from telethon import TelegramClient
+    from telethon.errors import FloodWaitError, PeerIdInvalidError, RPCError, UserPrivacyRestrictedError
 
     JITTER_MAX = max(1, min(10, int(interval / 2)))
     HARD_STOP_FLOOD = 1800  # сек
 
-    account = TelegramAccount.objects.get(id=account_id)
+    # proxy — сразу: ленивый FK из корутины ORM не отдаст
+    account = await _db(TelegramAccount.objects.select_related("proxy").get)(id=account_id)
     if owner_user_id is None:
         owner_user_id = account.user_id
 
@@ -304,75 +396,90 @@ def send_direct_messages_task(self, account_id, message_text, limit=100, interva
     proxy = _build_proxy(account.proxy)
     media_path = _abs_path(media_path)
 
-    print(f"DM:start acc={account_id} owner={owner_user_id} limit={limit} interval={interval} media={bool(media_path)} -> session={session_path}")
-
-    with transaction.atomic():
-        users = list(
-            TelegramUser.objects
-            .select_for_update(skip_locked=True)
-            .filter(
-                owner_id=owner_user_id,
-                message_status="pending",
-                invite_status__in=["pending", "failed", "skipped", "invited", "success"]
-            )
-            .order_by("id")[:limit]
+    run = await _db(TaskRunLog)(
+        "dm", account_id=account_id, task_id=task_id,
+        owner_id=owner_user_id, limit=limit, interval=interval, media=bool(media_path),
+    )
+
+    if account.proxy is not None and account.proxy.is_down:
+        # задание поставлено до того, как прокси упал: не ждём таймаутов подключения
+        run.error("proxy.down", proxy_id=account.proxy_id, last_error=account.proxy.last_error)
+        return await run.afinish("failed", f"PROXY_DOWN proxy={account.proxy_id}")
+
+    claim = RowClaim("message", account_id, task_id=task_id)
+    stop = StopToken(account_id, "dm")
+    users = await _db(claim.claim)(
+        TelegramUser.objects
+        .select_related("peer")
+        .filter(
+            owner_id=owner_user_id,
+            message_status="pending",
+            invite_status__in=["pending", "failed", "skipped", "invited", "success"]
         )
-        for u in users:
-            u.message_status = "processing"
-            u.message_error_code = None
-            if hasattr(u, "processed_by_id"):
-                u.processed_by_id = account_id
-            u.save(update_fields=["message_status", "message_error_code"] + (["processed_by_id"] if hasattr(u, "processed_by_id") else []))
+        .order_by("id"),
+        limit,
+    )
 
     if not users:
-        msg = f"DM:no-candidates owner={owner_user_id}"
-        print(msg)
-        return msg
+        run.event("dm.no_candidates", owner_id=owner_user_id)
+        return await run.afinish("done", f"DM:no-candidates owner={owner_user_id}")
 
-    print(f"DM:users picked {len(users)}")
+    run.event("dm.claimed", count=len(users))
+    run.set_total(len(users))
 
     sent = failed = 0
+    acc_label = str(account_id)
     client = TelegramClient(session_path, int(account.api_id), account.api_hash, proxy=proxy)
 
     try:
-        client.connect()
-        if not client.is_user_authorized():
-            return "DM:not-authorized (session exists but not signed in)"
+        await client.connect()
+        if not await client.is_user_authorized():
+            run.error("session.not_authorized")
+            return await run.afinish("failed", "DM:not-authorized (session exists but not signed in)")
 
         for user in users:
+            if await stop.arequested():
+                run.event("dm.stop_requested")
+                return await run.afinish("stopped", f"DM:stopped sent={sent} failed={failed}")
+            await _db(claim.renew)(extra=interval + JITTER_MAX)
             try:
                 # Надёжнее выбирать идентификатор: username -> phone -> id
                 target = None
-                username = getattr(user, "username", None)
-                phone = getattr(user, "phone", None)
+                username = user.peer.username
+                phone = user.peer.phone
 
                 if username:
                     target = username if username.startswith("@") else f"@{username}"
                 elif phone:
                     target = phone
                 else:
-                    target = int(user.user_id)
+                    target = int(user.peer_id)
 
-                entity = client.get_entity(target)
+                ATTEMPTS.labels(action="message", account=acc_label, task="dm").inc()
+                with timed(RPC_LATENCY, method="get_entity", account=acc_label, task="dm"):
+                    entity = await client.get_entity(target)
 
                 if media_path and os.path.exists(media_path):
-                    client.send_file(entity, media_path, caption=message_text)
+                    with timed(RPC_LATENCY, method="send_file", account=acc_label, task="dm"):
+                        await client.send_file(entity, media_path, caption=message_text)
                 else:
-                    client.send_message(entity, message_text)
+                    with timed(RPC_LATENCY, method="send_message", account=acc_label, task="dm"):
+                        await client.send_message(entity, message_text)
 
                 user.message_status = "sent"
                 user.message_error_code = None
                 sent += 1
 
             except FloodWaitError as e:
-                print(f"[{getattr(user,'user_id',None)}] FloodWait {e.seconds}s")
+                run.warning("flood_wait", user_id=user.peer_id, seconds=e.seconds)
+                FLOOD_WAIT_SECONDS.labels(account=acc_label, task="dm").inc(e.seconds)
                 user.message_status = "failed"
                 user.message_error_code = "FLOOD_WAIT"
                 failed += 1
                 if e.seconds >= HARD_STOP_FLOOD:
-                    user.save(update_fields=["message_status", "message_error_code"])
-                    return f"DM:hard-stop flood={e.seconds}s"
-                time.sleep(min(e.seconds, 60))
+                    await _db(user.save)(update_fields=["message_status", "message_error_code"])
+                    return await run.afinish("stopped", f"DM:hard-stop flood={e.seconds}s")
+                await stop.asleep(min(e.seconds, 60))
 
             except (PeerIdInvalidError, ValueError) as e:
                 # Не смогли получить entity по голому ID — частый кейс без access_hash
@@ -386,13 +493,13 @@ def send_direct_messages_task(self, account_id, message_text, limit=100, interva
                 failed += 1
 
             except RPCError as e:
-                print(f"[{getattr(user,'user_id',None)}] RPC {e}")
+                run.warning("dm.rpc_error", user_id=user.peer_id, error=str(e))
                 user.message_status = "failed"
                 user.message_error_code = "RPC_ERROR"
                 failed += 1
 
             except Exception as e:
-                print(f"[{getattr(user,'user_id',None)}] UNKNOWN {e}")
+                run.error("dm.failed", user_id=user.peer_id, error=str(e))
                 user.message_status = "failed"
                 user.message_error_code = "UNKNOWN"
                 failed += 1
@@ -400,142 +507,311 @@ def send_direct_messages_task(self, account_id, message_text, limit=100, interva
             finally:
                 if hasattr(user, "processed_by_id"):
                     user.processed_by_id = account_id
-                user.save(update_fields=["message_status", "message_error_code"] + (["processed_by_id"] if hasattr(user, "processed_by_id") else []))
-                time.sleep(interval + random.randint(0, JITTER_MAX))
+                with timed(DB_FLUSH_LATENCY, task="dm"):
+                    await _db(user.save)(update_fields=["message_status", "message_error_code"] + (["processed_by_id"] if hasattr(user, "processed_by_id") else []))
+                _tally(run, "message", user.message_error_code)
+                await stop.asleep(interval + random.randint(0, JITTER_MAX))
 
-        result = f"Рассылка завершена аккаунтом {account.phone}: sent={sent}, failed={failed}"
-        print(result)
-        return result
+        return await run.afinish("done", f"Рассылка завершена аккаунтом {account.phone}: sent={sent}, failed={failed}")
 
+    except asyncio.CancelledError:
+        await run.afinish("stopped", "Воркер остановлен")
+        raise
     finally:
+        released = await _db(claim.release)()
+        if released:
+            run.event("dm.released", count=released)
         try:
-            client.disconnect()
+            await client.disconnect()
         except Exception:
             pass
 
 
+@shared_task
+def reap_expired_claims_task():
+    # тик beat: строки задач, снятых revoke(terminate=True) или упавших вместе с воркером
+    run = TaskRunLog("reap", persist=False)
+    reaped = reap_expired()
+    if any(reaped.values()):
+        run.warning("claims.reaped", **reaped)
+    return reaped
+
+
+@shared_task
+def probe_proxies_task():
+    # тик beat: рукопожатие через каждый прокси, задержка и доля ошибок — в Proxy
+    from accounts.proxy_health import check_proxies
+
+    run = TaskRunLog("proxy", persist=False)
+    summary = check_proxies()
+    if summary["down"]:
+        run.warning("proxy.down", proxy_ids=summary["down"], checked=summary["checked"])
+    return summary
+
+
+@shared_task
+def archive_processed_users_task():
+    # тик beat: давно обработанные строки TelegramUser — в архив, горячая таблица не растёт с историей
+    from users.archive import archive_processed
+
+    run = TaskRunLog("archive", persist=False)
+    moved = archive_processed()
+    if moved:
+        run.event("users.archived", count=moved)
+    return moved
 
-from forwarding.models import ForwardingTask, ForwardingGroup
-from django.utils import timezone
-from telethon.sync import TelegramClient
-from telethon.errors import FloodWaitError, RPCError
-from telethon.tl.functions.channels import JoinChannelRequest
-import os, random, time
 
 @shared_task
 def process_forwarding_tasks():
-    now = timezone.now()
-    tasks = ForwardingTask.objects.filter(is_active=True).select_related('account').prefetch_related('target_groups')
+    from telethon.sync import TelegramClient
+    from accounts.memberships import known_chats
 
-    for task in tasks:
-        if task.last_sent_at and (now - task.last_sent_at).total_seconds() < task.interval_minutes * 60:
+    # тик beat: только события в журнал, строку TaskRun на каждый тик не пишем
+    run = TaskRunLog("forward", persist=False)
+    now = timezone.now()
+    due = [
+        task for task in ForwardingTask.objects.filter(is_active=True).select_related('account')
+        if not task.last_sent_at or (now - task.last_sent_at).total_seconds() >= task.interval_minutes * 60
+    ]
+    # активные группы всех созревших задач — одним запросом на тик
+    prefetch_related_objects(due, Prefetch(
+        'target_groups', queryset=ForwardingGroup.objects.filter(is_active=True), to_attr='active_groups',
+    ))
+
+    by_account = {}
+    for task in due:
+        by_account.setdefault(task.account_id, []).append(task)
+
+    # одно подключение на аккаунт за тик, а не на каждую его задачу
+    for tasks in by_account.values():
+        account = tasks[0].account
+
+        # аккаунт занят инвайтом/рассылкой — пропускаем его задачи до следующего тика beat
+        lease = AccountLease(account.id, "forward")
+        if not lease.try_acquire():
             continue
 
-        account = task.account
-        session_path = os.path.join("sessions", account.session_file)
-
         try:
+            session_path = os.path.join("sessions", account.session_file)
             client = TelegramClient(session_path, int(account.api_id), account.api_hash)
             with client:
-                try:
-                    client(JoinChannelRequest(task.source_channel))
-                except RPCError:
-                    pass
+                # где аккаунт уже состоит — одним запросом на аккаунт; JoinChannelRequest только для остальных
+                known = known_chats(account.id, [
+                    chat for task in tasks for chat in (task.source_channel, *(g.username for g in task.active_groups))
+                ])
+                for task in tasks:
+                    try:
+                        _forward_scheduled(client, task, run, now, known)
+                    except Exception as e:
+                        run.error("forward.task_failed", forwarding_task_id=task.id, account_id=account.id, error=str(e))
+        except Exception as e:
+            run.error("forward.account_failed", account_id=account.id,
+                      forwarding_task_ids=[t.id for t in tasks], error=str(e))
+        finally:
+            lease.release()
 
-                messages = client.get_messages(task.source_channel, limit=30)
-                if not messages:
-                    continue
+    run.finish("done")
 
-                message = random.choice(messages)
 
-                for group in task.target_groups.filter(is_active=True):
-                    try:
-                        try:
-                            client(JoinChannelRequest(group.username))
-                        except RPCError:
-                            pass
+def _forward_scheduled(client, task, run, now, known):
+    from telethon.errors import FloodWaitError
+    from accounts.memberships import NOT_MEMBER_ERRORS, chat_key, ensure_joined, forget
 
-                        client.forward_messages(group.username, message)
-                    except FloodWaitError as e:
-                        time.sleep(e.seconds)
-                    except Exception:
-                        continue
+    account_id = task.account_id
 
-                task.last_sent_at = now
-                task.save()
+    def source_lost(error):
+        # доступ к источнику потерян — забываем его, а не группы; в следующем цикле вступим заново
+        forget(account_id, task.source_channel)
+        known.discard(chat_key(task.source_channel))
+        run.warning("forward.source_not_member", account_id=account_id, source=task.source_channel, error=str(error))
+        _tally(run, "forward", "NOT_MEMBER", account_id=account_id)
 
-        except Exception:
+    # один get_messages на источник за FORWARD_SOURCE_CACHE_SECONDS, а не на задачу
+    cache = SourceMessages(task.source_channel)
+    try:
+        ensure_joined(client, account_id, task.source_channel, known)
+        messages = cache.get(lambda min_id: client.get_messages(task.source_channel, limit=cache.keep, min_id=min_id))
+    except NOT_MEMBER_ERRORS as e:
+        source_lost(e)
+        return
+    if not messages:
+        return
+
+    message_id = random.choice(messages)["id"]
+
+    acc_label = str(account_id)
+    for group in task.active_groups:
+        try:
+            ensure_joined(client, account_id, group.username, known)
+
+            ATTEMPTS.labels(action="forward", account=acc_label, task="forward").inc()
+            with timed(RPC_LATENCY, method="forward", account=acc_label, task="forward"):
+                client.forward_messages(group.username, message_id, from_peer=task.source_channel)
+            _tally(run, "forward", account_id=account_id)
+        except FloodWaitError as e:
+            FLOOD_WAIT_SECONDS.labels(account=acc_label, task="forward").inc(e.seconds)
+            run.warning("flood_wait", account_id=account_id, group=group.username, seconds=e.seconds)
+            _tally(run, "forward", "FLOOD_WAIT", account_id=account_id)
+            time.sleep(e.seconds)
+        except NOT_MEMBER_ERRORS as e:
+            # ошибка пересылки не говорит, чей доступ пропал: список сообщений мог прийти
+            # из кэша, а источник — уже закрыться; проверяем источник одним запросом
+            if not _source_readable(client, task.source_channel):
+                source_lost(e)
+                return
+            # вышли/кикнули из группы — членство потеряно, в следующем цикле вступим заново
+            forget(account_id, group.username)
+            known.discard(chat_key(group.username))
+            run.warning("forward.not_member", account_id=account_id, group=group.username, error=str(e))
+            _tally(run, "forward", "NOT_MEMBER", account_id=account_id)
+        except Exception as e:
+            run.warning("forward.failed", account_id=account_id, group=group.username, error=str(e))
+            _tally(run, "forward", "UNKNOWN", account_id=account_id)
             continue
 
+    task.last_sent_at = now
+    task.save(update_fields=["last_sent_at"])
 
-from telethon.tl.functions.channels import GetFullChannelRequest
-from telethon.tl.types import PeerChannel, Channel
-from forwarding.models import ForwardingTask
-from telethon.sync import TelegramClient
-from telethon.errors import FloodWaitError, RPCError
-from telethon.tl.functions.channels import JoinChannelRequest
-from django.utils import timezone
-import os, random, time
+
+def _source_readable(client, source) -> bool:
+    """False — только если сам источник ответил ошибкой членства; прочие сбои на источник не списываем."""
+    from accounts.memberships import NOT_MEMBER_ERRORS
+
+    try:
+        client.get_messages(source, limit=1)
+    except NOT_MEMBER_ERRORS:
+        return False
+    except Exception:
+        pass
+    return True
+
+
+def _forward_once(client, task, run) -> float:
+    """
+    Один цикл пересылки по задаче. Возвращает, сколько секунд ждать до следующего.
+    """
+    from telethon.errors import FloodWaitError
+    from telethon.tl.types import Channel
+
+    cache = SourceMessages(task.source_channel)
+
+    def fetch(min_id):
+        # только при промахе кэша: свежий список источника уже лежит в Redis
+        try:
+            source_entity = client.get_entity(task.source_channel)
+        except Exception as e:
+            run.warning("forward.source_failed", source=task.source_channel, error=str(e))
+            return None
+        if not isinstance(source_entity, Channel):
+            run.warning("forward.source_not_channel", source=task.source_channel)
+            return None
+        return client.get_messages(source_entity, limit=cache.keep, min_id=min_id)
+
+    messages = cache.get(fetch)
+    if messages is None:
+        return 10
+    # как раньше: самое свежее текстовое среди последних 6
+    message = next((m for m in messages[:6] if m["text"]), None)
+    if not message:
+        run.event("forward.no_messages", source=task.source_channel)
+        return task.interval_minutes * 60
+
+    acc_label = str(task.account_id)
+    for group in task.target_groups.filter(is_active=True):
+        try:
+            ATTEMPTS.labels(action="forward", account=acc_label, task="forward").inc()
+            with timed(RPC_LATENCY, method="get_entity", account=acc_label, task="forward"):
+                group_entity = client.get_entity(group.username)
+            with timed(RPC_LATENCY, method="forward", account=acc_label, task="forward"):
+                client.forward_messages(group_entity, message["id"], from_peer=task.source_channel)
+            _tally(run, "forward")
+            run.event("forward.sent", group=group.username, message_id=message["id"])
+        except FloodWaitError as e:
+            run.warning("flood_wait", group=group.username, seconds=e.seconds)
+            FLOOD_WAIT_SECONDS.labels(account=acc_label, task="forward").inc(e.seconds)
+            _tally(run, "forward", "FLOOD_WAIT")
+            time.sleep(e.seconds)
+            continue
+        except Exception as e:
+            run.warning("forward.failed", group=group.username, error=str(e))
+            _tally(run, "forward", "UNKNOWN")
+            continue
+
+    task.last_sent_at = timezone.now()
+    task.save()
+    return task.interval_minutes * 60
 
 
 @shared_task(bind=True)
 def process_forwarding_task_by_id(self, task_id):
+    from telethon.sync import TelegramClient
+
     try:
         task = ForwardingTask.objects.select_related('account').prefetch_related('target_groups').get(id=task_id)
         account = task.account
         session_path = os.path.join("sessions", account.session_file)
 
         client = TelegramClient(session_path, int(account.api_id), account.api_hash)
+        run = TaskRunLog(
+            "forward", account_id=account.id, task_id=self.request.id,
+            forwarding_task_id=task.id, source=task.source_channel,
+        )
 
-        with client:
-            while True:
-                task.refresh_from_db()
-                if not task.is_active:
-                    print(f"🛑 Задача ID={task_id} остановлена")
-                    break
+        while True:
+            task.refresh_from_db()
+            if not task.is_active:
+                run.finish("stopped", f"Задача ID={task_id} остановлена")
+                break
+
+            now = timezone.now()
+            if task.last_sent_at and (now - task.last_sent_at).total_seconds() < task.interval_minutes * 60:
+                wait_time = task.interval_minutes * 60 - (now - task.last_sent_at).total_seconds()
+                run.event("forward.wait", seconds=int(wait_time))
+                time.sleep(wait_time)
+                continue
+
+            # Сессию держим только на время цикла: между циклами аккаунт свободен
+            # для инвайта/рассылки, а не заблокирован задачей на часы
+            lease = AccountLease(account.id, "forward", task_id=self.request.id)
+            if not lease.acquire(wait=settings.ACCOUNT_LEASE_RETRY_SECONDS):
+                run.event("lease.busy")
+                continue
+            try:
+                with client:
+                    pause = _forward_once(client, task, run)
+            finally:
+                lease.release()
 
-                try:
-                    source_entity = client.get_entity(task.source_channel)
-                    if not isinstance(source_entity, Channel):
-                        print(f"❌ {task.source_channel} не является каналом/супергруппой")
-                        time.sleep(10)
-                        continue
-                except Exception as e:
-                    print(f"❌ Ошибка получения source_channel: {e}")
-                    time.sleep(10)
-                    continue
+            time.sleep(pause)
 
-                now = timezone.now()
-                if task.last_sent_at and (now - task.last_sent_at).total_seconds() < task.interval_minutes * 60:
-                    wait_time = task.interval_minutes * 60 - (now - task.last_sent_at).total_seconds()
-                    print(f"⏳ Ждём {int(wait_time)} сек.")
-                    time.sleep(wait_time)
-                    continue
+    except ForwardingTask.DoesNotExist:
+        TaskRunLog("forward", task_id=self.request.id, persist=False).error("forward.task_not_found", forwarding_task_id=task_id)
 
-                messages = client.get_messages(source_entity, limit=6)
-                message = next((m for m in messages if m.message), None)
-                if not message:
-                    print("⚠️ Нет подходящих текстовых сообщений. Пропуск.")
-                    time.sleep(task.interval_minutes * 60)
-                    continue
 
-                for group in task.target_groups.filter(is_active=True):
-                    try:
-                        group_entity = client.get_entity(group.username)
-                        client.forward_messages(group_entity, message)
-                        print(f"📤 Переслано в {group.username}")
-                    except FloodWaitError as e:
-                        print(f"⏳ FloodWait на {group.username}: ждём {e.seconds} сек")
-                        time.sleep(e.seconds)
-                        continue
-                    except Exception as e:
-                        print(f"❌ Ошибка пересылки в {group.username}: {e}")
-                        continue
+# --- Обёртки над скриптами: раньше запускались через subprocess.Popen из views ---
+
+@shared_task(bind=True)
+def train_account_task(self, phone):
+    import asyncio
+    from accounts.train_account import train_by_phone
+    try:
+        asyncio.run(train_by_phone(phone, task_id=self.request.id))
+    except LeaseBusy:
+        # аккаунт занят другой операцией — встаём в очередь за арендой, а не падаем
+        raise self.retry(countdown=settings.ACCOUNT_LEASE_RETRY_SECONDS, max_retries=None)
 
-                task.last_sent_at = timezone.now()
-                task.save()
 
-                time.sleep(task.interval_minutes * 60)
+@shared_task(bind=True)
+def check_all_accounts_task(self):
+    import asyncio
+    from accounts.check_all_accounts import main
+    asyncio.run(main(task_id=self.request.id))
 
-    except ForwardingTask.DoesNotExist:
-        print(f"❌ Задача с ID={task_id} не найдена")
+
+@shared_task(bind=True)
+def join_channel_task(self, phone, channel_username):
+    from accounts.join_channel import join_channel
+    try:
+        join_channel(phone, channel_username, task_id=self.request.id)
+    except LeaseBusy:
+        raise self.retry(countdown=settings.ACCOUNT_LEASE_RETRY_SECONDS, max_retries=None)
@@ -1,3 +1,959 @@
-from django.test import TestCase
+"""
+Перф-тесты API: на каждый эндпоинт — верхняя граница числа SQL-запросов и p95 задержки.
 
-# Create your tests here.
+Объёмы и бюджеты задаются окружением; по умолчанию они небольшие, чтобы
+`manage.py test` шёл секунды. Реалистичный прогон:
+
+    PERF_USERS=1000000 PERF_ACCOUNTS=500 PERF_CHANNELS=500 python manage.py test
+
+Лимит запросов ловит N+1 (он растёт вместе с числом аккаунтов/каналов),
+p95 — полные сканы на больших объёмах TelegramUser.
+Async-вьюхи, которые ходят в Telegram (send_code, profile), идут на фейковом
+клиенте (fake_telethon) без задержки. Без тестов остаются sign_in и
+profile/photo, upload (пишет .session в каталог проекта) и живые события SSE-потока.
+"""
+import asyncio
+import json
+import os
+import runpy
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import mock
+
+import fakeredis
+from asgiref.sync import async_to_sync
+from celery.exceptions import Retry
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from accounts import fake_telethon
+from accounts.cancellation import StopToken
+from accounts.events import TaskRunLog, flush
+from accounts.claims import RowClaim, reap_expired
+from accounts.leases import AccountLease, LeaseBusy, lease_states
+from accounts.progress import LAST_KEY, stream_events
+from accounts.memberships import ensure_joined, forget, known_chats, remember
+from accounts.proxy_health import probe_all, record
+from accounts.runtime import AsyncWorker, dispatch
+from accounts.tasks import _db, _forward_scheduled, join_channel_task, train_account_task
+from accounts import train_account
+from accounts.train_account import FLOOD_RETRIES, GET_USERS_BATCH, FloodGate, UserWriter, _scan_channel, _scan_resuming, train_by_phone
+from accounts.models import IntermediateChannel, Proxy, TaskRun, TelegramAccount
+from forwarding.models import ForwardingGroup, ForwardingTask
+from telethon.errors import ChannelPrivateError, FloodWaitError
+from telethon.tl.types import PeerUser
+from users.models import TelegramPeer, TelegramUser, TrainingChannel
+
+PERF_USERS = int(os.environ.get("PERF_USERS", 20000))
+PERF_ACCOUNTS = int(os.environ.get("PERF_ACCOUNTS", 200))
+PERF_CHANNELS = int(os.environ.get("PERF_CHANNELS", 200))
+PERF_REPEAT = int(os.environ.get("PERF_REPEAT", 10))
+PERF_P95_MS = float(os.environ.get("PERF_P95_MS", 250))
+# агрегаты и выборки по всей таблице TelegramUser
+PERF_P95_HEAVY_MS = float(os.environ.get("PERF_P95_HEAVY_MS", 2000))
+# холодный старт web (URLconf) и воркера (autodiscover задач) в отдельном процессе
+PERF_STARTUP_MS = float(os.environ.get("PERF_STARTUP_MS", 3000))
+
+BATCH = 5000
+
+
+def _bulk(model, rows):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= BATCH:
+            model.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        model.objects.bulk_create(batch)
+
+
+def _telegram_users(owner, accounts, sources, now):
+    """~15% строк обработаны (инвайт/сообщение), остальные ждут — как в живой базе."""
+    for n in range(PERF_USERS):
+        slot = n % 20
+        invite = {1: "success", 2: "failed"}.get(slot, "pending")
+        message = {3: "sent", 4: "failed"}.get(slot, "pending")
+        changed = now - timedelta(minutes=n % (30 * 24 * 60))
+        processed = invite != "pending" or message != "pending"
+        yield TelegramUser(
+            peer_id=10 ** 10 + n,
+            source_channel=sources[n % len(sources)],
+            invite_status=invite,
+            message_status=message,
+            invite_changed_at=changed if invite != "pending" else None,
+            message_changed_at=changed if message != "pending" else None,
+            processed_at=changed if processed else None,
+            processed_by_id=accounts[n % len(accounts)] if processed else None,
+            owner=owner,
+        )
+
+
+def seed_volumes(owner):
+    now = timezone.now()
+    stranger = User.objects.create_user("perf_stranger", password="x")
+
+    _bulk(Proxy, (Proxy(host=f"10.0.{n // 250}.{n % 250}", port=1080, proxy_type="socks5")
+                  for n in range(PERF_ACCOUNTS)))
+    proxies = list(Proxy.objects.values_list("id", flat=True))
+
+    _bulk(TelegramAccount, (
+        TelegramAccount(
+            user=owner if n % 10 else stranger, phone=f"+7999{n:07d}", session_file=f"+7999{n:07d}.session",
+            api_id="1", api_hash="perf", proxy_id=proxies[n % len(proxies)], invite_task_id=f"perf-{n}",
+        )
+        for n in range(PERF_ACCOUNTS)
+    ))
+    accounts = list(TelegramAccount.objects.filter(user=owner).values_list("id", flat=True))
+
+    _bulk(IntermediateChannel, (IntermediateChannel(username=f"@perf_ic{n}") for n in range(PERF_CHANNELS)))
+    through = IntermediateChannel.added_accounts.through
+    _bulk(through, (
+        through(intermediatechannel_id=c, telegramaccount_id=accounts[(c + k) % len(accounts)])
+        for c in IntermediateChannel.objects.values_list("id", flat=True) for k in range(3)
+    ))
+
+    _bulk(TrainingChannel, (TrainingChannel(username=f"@perf_tc{n}", type="group") for n in range(PERF_CHANNELS)))
+    sources = [f"@perf_tc{n}" for n in range(PERF_CHANNELS)]
+
+    _bulk(TaskRun, (
+        TaskRun(kind=("invite", "dm", "train")[k % 3], account_id=a, status="done", ok=10, failed=1)
+        for a in accounts for k in range(5)
+    ))
+
+    _bulk(ForwardingGroup, (ForwardingGroup(user=owner, username=f"@perf_fg{n}") for n in range(PERF_CHANNELS)))
+    groups = list(ForwardingGroup.objects.values_list("id", flat=True))
+    _bulk(ForwardingTask, (
+        ForwardingTask(user=owner, account_id=a, source_channel=f"@perf_src{a}", celery_task_id=f"perf-fw-{a}")
+        for a in accounts
+    ))
+    through = ForwardingTask.target_groups.through
+    _bulk(through, (
+        through(forwardingtask_id=t, forwardinggroup_id=groups[(t + k) % len(groups)])
+        for t in ForwardingTask.objects.values_list("id", flat=True) for k in range(5)
+    ))
+
+    _bulk(TelegramPeer, (
+        TelegramPeer(id=10 ** 10 + n, username=f"perf_u{n}", name=f"User {n}", phone="") for n in range(PERF_USERS)
+    ))
+    _bulk(TelegramUser, _telegram_users(owner, accounts, sources, now))
+
+
+def _p95(timings):
+    ordered = sorted(timings)
+    return ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))]
+
+
+@override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"])
+class EndpointPerfTestCase(TestCase):
+    """База для перф-тестов: засеянная БД, JWT-клиент и assertEndpoint."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user("perf", password="perf-pass")
+        seed_volumes(cls.owner)
+        cls.account_ids = list(TelegramAccount.objects.filter(user=cls.owner).values_list("id", flat=True))
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.owner)}")
+
+    def patch(self, target, **kwargs):
+        patcher = mock.patch(target, **kwargs)
+        self.addCleanup(patcher.stop)
+        return patcher.start()
+
+    def assertEndpoint(self, method, url, max_queries, data=None, status=200, heavy=False, fmt="json"):
+        """
+        url и data могут быть функциями от номера повтора — для эндпоинтов,
+        которые меняют данные (удаление, создание с уникальным именем).
+        """
+        timings, queries = [], 0
+        for i in range(PERF_REPEAT):
+            path = url(i) if callable(url) else url
+            payload = data(i) if callable(data) else data
+            kwargs = {} if method == "get" else {"format": fmt}
+            with CaptureQueriesContext(connection) as ctx:
+                started = time.perf_counter()
+                response = getattr(self.client, method)(path, payload, **kwargs)
+                timings.append((time.perf_counter() - started) * 1000)
+            self.assertEqual(response.status_code, status, f"{method.upper()} {path}: {response.content[:300]!r}")
+            queries = max(queries, len(ctx.captured_queries))
+
+        label = f"{method.upper()} {url if not callable(url) else path}"
+        self.assertLessEqual(queries, max_queries, f"{label}: {queries} SQL-запросов, лимит {max_queries}")
+        budget = PERF_P95_HEAVY_MS if heavy else PERF_P95_MS
+        p95 = _p95(timings)
+        self.assertLessEqual(p95, budget, f"{label}: p95 {p95:.1f} мс, бюджет {budget:.0f} мс")
+
+
+class AccountsEndpointPerfTests(EndpointPerfTestCase):
+    def setUp(self):
+        super().setUp()
+        # Redis и брокер Celery в тестах не нужны: меряем только БД и код вьюх
+        self.patch("accounts.views.lease_states", return_value={})
+        self.patch("accounts.views.revoke")
+        self.patch("accounts.views.request_stop")
+        self.patch("accounts.views.clear_stop")
+        for name in ("invite_all_users_task", "send_direct_messages_task", "train_account_task",
+                     "check_all_accounts_task", "join_channel_task"):
+            self.patch(f"accounts.views.{name}.delay", return_value=SimpleNamespace(id="perf-task"))
+
+    def test_account_list(self):
+        self.assertEndpoint("get", "/api/accounts/", max_queries=2)
+
+    def test_metrics_not_public(self):
+        # метрики web отдаёт только manage.py metrics_server во внутренней сети
+        self.assertEqual(self.client.get("/metrics").status_code, 404)
+
+    def test_telegram_async_views(self):
+        self.patch("telethon.TelegramClient", new=fake_telethon.FakeAsyncTelegramClient)
+        self.patch("accounts.views.AccountLease")
+        self.assertEndpoint("get", f"/api/accounts/{self.account_ids[0]}/profile/", max_queries=2)
+        # update_or_create: SELECT ... FOR UPDATE + INSERT, в тесте — ещё две пары SAVEPOINT/RELEASE
+        self.assertEndpoint(
+            "post", "/api/accounts/send_code/", max_queries=7,
+            data=lambda i: {"phone": f"+7555{i:07d}", "api_id": 1, "api_hash": "perf"},
+        )
+        self.assertEqual(TelegramAccount.objects.filter(phone__startswith="+7555", phone_code_hash="bench-hash").count(), PERF_REPEAT)
+
+        self.client.credentials()
+        self.assertEndpoint("get", f"/api/accounts/{self.account_ids[0]}/profile/", max_queries=0, status=401)
+
+    def test_async_views_answer_401_like_drf(self):
+        profile = f"/api/accounts/{self.account_ids[0]}/profile/"
+        for header in (None, "Bearer not-a-token", "Bearer a b"):
+            with self.subTest(header=header):
+                self.client.credentials(**({"HTTP_AUTHORIZATION": header} if header else {}))
+                drf, native = self.client.get("/api/accounts/"), self.client.get(profile)
+                self.assertEqual((native.status_code, native.json()), (drf.status_code, drf.json()))
+                self.assertEqual(native["WWW-Authenticate"], drf["WWW-Authenticate"])
+
+    def test_progress_stream_takes_only_stream_token(self):
+        self.patch("accounts.views.stream_events", return_value=iter([]))
+        access = str(AccessToken.for_user(self.owner))
+        stream_token = self.client.post("/api/accounts/progress/stream/token/").json()["token"]
+        stream = "/api/accounts/progress/stream/?token={}"
+        self.assertEqual(self.client.get(stream.format(stream_token)).status_code, 200)
+        # полный access-токен в URL поток не принимает, а токен потока не годится для API
+        self.assertEqual(self.client.get(stream.format(access)).status_code, 401)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {stream_token}")
+        self.assertEqual(self.client.get("/api/accounts/").status_code, 401)
+
+    def test_profile_patch_accepts_form_bodies(self):
+        # Django разбирает в request.POST только POST: PATCH-форму вьюха должна разобрать сама
+        sent = []
+
+        async def with_client(account, job):
+            async def call(request):
+                sent.append(request)
+                return SimpleNamespace(full_user=SimpleNamespace(about=""))
+            client = mock.Mock(side_effect=call)
+            client.get_me = mock.AsyncMock(return_value=SimpleNamespace(id=1, username="", first_name="", last_name=""))
+            return await job(client)
+
+        self.patch("accounts.views._with_client", side_effect=with_client)
+        url = f"/api/accounts/{self.account_ids[0]}/profile/"
+        for fmt in ("multipart", None):
+            with self.subTest(fmt=fmt):
+                if fmt:
+                    response = self.client.patch(url, {"about": "Привет"}, format=fmt)
+                else:
+                    response = self.client.patch(url, "about=%D0%9F%D1%80%D0%B8%D0%B2%D0%B5%D1%82",
+                                                 content_type="application/x-www-form-urlencoded")
+                self.assertEqual(response.status_code, 200, response.content)
+        updates = [r.about for r in sent if type(r).__name__ == "UpdateProfileRequest"]
+        self.assertEqual(updates, ["Привет", "Привет"])
+
+    def test_proxies(self):
+        self.assertEndpoint("get", "/api/accounts/proxies/", max_queries=2)
+        self.assertEndpoint(
+            "post", "/api/accounts/proxies/", max_queries=2, status=201,
+            data=lambda i: {"host": f"192.0.2.{i}", "port": 1080, "proxy_type": "socks5"},
+        )
+
+    def test_proxy_delete(self):
+        proxies = list(Proxy.objects.values_list("id", flat=True)[:PERF_REPEAT])
+        self.assertEndpoint("delete", lambda i: f"/api/accounts/proxies/{proxies[i]}/", max_queries=4, status=204)
+
+    def test_task_runs(self):
+        self.assertEndpoint("get", "/api/accounts/runs/", max_queries=2)
+        self.assertEndpoint("get", f"/api/accounts/runs/?kind=invite&account_id={self.account_ids[0]}", max_queries=2)
+
+    def test_set_proxy(self):
+        proxy = Proxy.objects.first()
+        self.assertEndpoint(
+            "put", lambda i: f"/api/accounts/{self.account_ids[i]}/set_proxy/", max_queries=4,
+            data={"proxy_id": proxy.id},
+        )
+
+    def test_delete_account(self):
+        ids = self.account_ids[-PERF_REPEAT:]
+        self.assertEndpoint("delete", lambda i: f"/api/accounts/{ids[i]}/", max_queries=12, status=204, heavy=True)
+
+    def test_check_all_and_train(self):
+        self.assertEndpoint("post", "/api/accounts/check_all/", max_queries=1)
+        self.assertEndpoint("post", f"/api/accounts/{self.account_ids[0]}/train/", max_queries=2)
+
+    def test_intermediate_channels(self):
+        self.assertEndpoint("get", "/api/accounts/intermediate-channels/", max_queries=3)
+        self.assertEndpoint(
+            "post", "/api/accounts/intermediate-channels/add/", max_queries=5,
+            data=lambda i: {"username": f"@perf_new{i}"},
+        )
+
+    def test_intermediate_channel_delete(self):
+        ids = list(IntermediateChannel.objects.values_list("id", flat=True)[:PERF_REPEAT])
+        self.assertEndpoint("delete", lambda i: f"/api/accounts/intermediate-channels/{ids[i]}/", max_queries=4)
+
+    def test_add_account_to_intermediate_channel(self):
+        channel = IntermediateChannel.objects.first()
+        self.assertEndpoint(
+            "post", f"/api/accounts/intermediate-channels/{channel.id}/add_account/", max_queries=3,
+            data={"account_id": self.account_ids[0]},
+        )
+
+    def test_invite(self):
+        channel = IntermediateChannel.objects.first()
+        self.assertEndpoint(
+            "post", "/api/accounts/invite/", max_queries=3,
+            data={"account_id": self.account_ids[0], "channel_id": channel.id},
+        )
+        self.assertEndpoint(
+            "post", "/api/accounts/invite/stop/", max_queries=3, data=lambda i: {"account_id": self.account_ids[i]},
+        )
+
+    def test_broadcast(self):
+        self.assertEndpoint(
+            "post", "/api/accounts/broadcast/", max_queries=2, fmt="multipart",
+            data={"account_id": self.account_ids[0], "message_text": "perf"},
+        )
+        self.assertEndpoint(
+            "post", "/api/accounts/broadcast/stop/", max_queries=2, data=lambda i: {"account_id": self.account_ids[i]},
+        )
+
+    def test_start_refused_when_proxy_down(self):
+        account = TelegramAccount.objects.get(id=self.account_ids[1])
+        Proxy.objects.filter(id=account.proxy_id).update(is_alive=False, last_error="таймаут 10 с")
+        self.assertEndpoint("post", f"/api/accounts/{account.id}/train/", max_queries=2, status=409)
+        self.assertEndpoint(
+            "post", "/api/accounts/broadcast/", max_queries=2, status=409, fmt="multipart",
+            data={"account_id": account.id, "message_text": "perf"},
+        )
+        rows = self.client.get("/api/accounts/").json()
+        self.assertIs(next(r for r in rows if r["id"] == account.id)["proxy_alive"], False)
+
+
+class ProxyHealthTests(TestCase):
+    """Рукопожатие через локальные фейковые SOCKS5 / HTTP-прокси и учёт результатов в Proxy."""
+
+    async def _serve(self, handler):
+        server = await asyncio.start_server(handler, "127.0.0.1", 0)
+        return server, server.sockets[0].getsockname()[1]
+
+    @staticmethod
+    async def _socks5(reader, writer):
+        await reader.readexactly(3)                       # ver, 1 метод, без авторизации
+        writer.write(b"\x05\x00")
+        request = await reader.readexactly(10)            # ver cmd rsv atyp=1 ip4 port
+        writer.write(b"\x05\x00\x00\x01" + request[4:])
+        await writer.drain()
+        writer.close()
+
+    @staticmethod
+    async def _http_forbidden(reader, writer):
+        await reader.readuntil(b"\r\n\r\n")
+        writer.write(b"HTTP/1.1 403 Forbidden\r\n\r\n")
+        await writer.drain()
+        writer.close()
+
+    def test_probe_handshakes(self):
+        async def scenario():
+            socks_server, socks_port = await self._serve(self._socks5)
+            http_server, http_port = await self._serve(self._http_forbidden)
+            closed = socket.socket()
+            closed.bind(("127.0.0.1", 0))
+            closed_port = closed.getsockname()[1]
+            closed.close()
+            proxies = [
+                Proxy(id=1, host="127.0.0.1", port=socks_port, proxy_type="socks5"),
+                Proxy(id=2, host="127.0.0.1", port=http_port, proxy_type="http"),
+                Proxy(id=3, host="127.0.0.1", port=closed_port, proxy_type="socks5"),
+            ]
+            async with socks_server, http_server:
+                return await probe_all(proxies, target=("149.154.167.51", 443), timeout=5)
+
+        results = asyncio.run(scenario())
+        self.assertTrue(results[1]["ok"])
+        self.assertIsNotNone(results[1]["latency_ms"])
+        self.assertFalse(results[2]["ok"])
+        self.assertIn("403", results[2]["error"])
+        self.assertFalse(results[3]["ok"])
+
+    @override_settings(PROXY_PROBE_ALPHA=0.5, PROXY_DOWN_AFTER=2)
+    def test_record_rolls_averages_and_marks_down(self):
+        proxy = Proxy(host="127.0.0.1", port=1080)
+        record(proxy, {"ok": True, "latency_ms": 100.0, "error": None})
+        record(proxy, {"ok": True, "latency_ms": 200.0, "error": None})
+        self.assertEqual((proxy.is_alive, proxy.latency_ms, proxy.error_rate), (True, 150.0, 0.0))
+
+        record(proxy, {"ok": False, "latency_ms": None, "error": "таймаут"})
+        self.assertTrue(proxy.is_alive)                   # одна неудача — ещё не мёртв
+        record(proxy, {"ok": False, "latency_ms": None, "error": "таймаут"})
+        self.assertTrue(proxy.is_down)
+        self.assertEqual(proxy.error_rate, 0.75)
+
+        record(proxy, {"ok": True, "latency_ms": 100.0, "error": None})
+        self.assertEqual((proxy.is_alive, proxy.consecutive_failures, proxy.last_error), (True, 0, None))
+
+
+class RowClaimTests(TestCase):
+    """Аренда строк очереди: release и сборщик возвращают недоделанное в pending."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user("claims", password="x")
+        TelegramPeer.objects.bulk_create([TelegramPeer(id=n) for n in range(1, 11)])
+        TelegramUser.objects.bulk_create([TelegramUser(peer_id=n, owner=cls.owner) for n in range(1, 11)])
+
+    def pending(self):
+        return TelegramUser.objects.filter(owner=self.owner, invite_status="pending").order_by("id")
+
+    def test_release_returns_untouched_rows(self):
+        claim = RowClaim("invite", None, task_id="t1")
+        users = claim.claim(self.pending(), 4)
+        self.assertEqual(len(users), 4)
+        self.assertEqual(self.pending().count(), 6)
+
+        users[0].invite_status = "failed"
+        users[0].save(update_fields=["invite_status"])
+        users[0].refresh_from_db()
+        self.assertIsNone(users[0].invite_claimed_by)
+        self.assertIsNone(users[0].invite_lease_expires_at)
+
+        self.assertEqual(claim.release(), 3)
+        self.assertEqual(self.pending().count(), 9)
+
+    def test_reaper_takes_only_expired_leases(self):
+        RowClaim("invite", None, task_id="dead", ttl=60).claim(self.pending(), 3)
+        live = RowClaim("message", None, task_id="live", ttl=3600)
+        live.claim(TelegramUser.objects.filter(owner=self.owner, message_status="pending").order_by("id"), 2)
+
+        self.assertEqual(reap_expired(), {"invite": 0, "message": 0})
+        reaped = reap_expired(now=timezone.now() + timedelta(minutes=5))
+        self.assertEqual(reaped, {"invite": 3, "message": 0})
+        self.assertEqual(self.pending().count(), 10)
+        self.assertEqual(TelegramUser.objects.filter(message_claimed_by="live").count(), 2)
+
+
+class AccountLeaseTests(SimpleTestCase):
+    """Аренда на fakeredis: Lua-скрипты release/refresh и TTL работают как в настоящем Redis."""
+
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis(decode_responses=True)
+        patcher = mock.patch("accounts.leases.get_redis", return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def lease(self, kind="invite", ttl=60):
+        lease = AccountLease(7, kind, task_id=kind, ttl=ttl)
+        self.addCleanup(lease.release)
+        return lease
+
+    def test_second_holder_is_refused(self):
+        first, second = self.lease("invite"), self.lease("dm")
+        self.assertTrue(first.acquire())
+        self.assertFalse(second.acquire())
+        with self.assertRaises(LeaseBusy) as busy:
+            with second.hold():
+                pass
+        self.assertEqual(busy.exception.holder["kind"], "invite")
+        self.assertNotIn("token", lease_states([7])[7])
+
+        first.release()
+        self.assertTrue(second.acquire())
+
+    def test_release_by_non_owner_is_noop(self):
+        owner, other = self.lease("invite"), self.lease("dm")
+        self.assertTrue(owner.acquire())
+        other.acquired = True  # как будто думает, что аренда его
+        other.release()
+        self.assertFalse(other.refresh())
+        self.assertEqual(lease_states([7])[7]["kind"], "invite")
+        self.assertTrue(owner.refresh())
+
+    def test_heartbeat_keeps_lease_alive(self):
+        lease = self.lease(ttl=2)
+        self.assertTrue(lease.acquire())
+        time.sleep(2.5)  # heartbeat раз в секунду продлевает ключ
+        self.assertIsNotNone(self.redis.get(lease.key))
+
+    def test_async_acquire_stays_off_the_loop(self):
+        threads = []
+        redis = self.redis
+
+        def get_redis():
+            threads.append(threading.current_thread())
+            return redis
+
+        async def hold():
+            async with self.lease().hold():
+                pass
+
+        with mock.patch("accounts.leases.get_redis", side_effect=get_redis):
+            asyncio.run(hold())
+        self.assertTrue(threads)
+        self.assertNotIn(threading.current_thread(), threads)
+        self.assertIsNone(lease_states([7])[7])
+
+    def test_expired_lease_is_taken_over(self):
+        dead, alive = self.lease("invite", ttl=1), self.lease("dm")
+        self.assertTrue(dead.acquire())
+        dead._stop.set()  # воркер упал: heartbeat больше не продлевает
+        time.sleep(1.2)
+        self.assertTrue(alive.acquire())
+        # очнувшийся держатель не продлевает и не снимает чужую аренду
+        self.assertFalse(dead.refresh())
+        dead.release()
+        self.assertEqual(lease_states([7])[7]["kind"], "dm")
+
+
+class BusyAccountTaskTests(TestCase):
+    """Занятый аккаунт: join и train встают в очередь за арендой (self.retry), а не ждут её в слоте воркера."""
+
+    def setUp(self):
+        redis = fakeredis.FakeRedis(decode_responses=True)
+        patcher = mock.patch("accounts.leases.get_redis", return_value=redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        owner = User.objects.create_user("busy")
+        self.account = TelegramAccount.objects.create(user=owner, phone="+70000000004")
+        lease = AccountLease(self.account.id, "invite")
+        self.assertTrue(lease.acquire())
+        self.addCleanup(lease.release)
+
+    def assertRetried(self, task, *args):
+        with mock.patch.object(task, "retry", return_value=Retry()) as retry:
+            with self.assertRaises(Retry):
+                task(*args)
+        retry.assert_called_once_with(countdown=settings.ACCOUNT_LEASE_RETRY_SECONDS, max_retries=None)
+        self.assertFalse(TaskRun.objects.exists())
+
+    def test_join_retries(self):
+        self.assertRetried(join_channel_task, self.account.phone, "@group")
+
+    def test_train_retries(self):
+        with self.assertRaises(LeaseBusy):
+            async_to_sync(train_by_phone)(self.account.phone)
+        # сама задача гоняет корутину в asyncio.run — в своём потоке, вне транзакции теста
+        with mock.patch("accounts.train_account.train_by_phone", mock.AsyncMock(side_effect=LeaseBusy(self.account.id))):
+            self.assertRetried(train_account_task, self.account.phone)
+
+
+class MetricsFilesTests(SimpleTestCase):
+    """PROMETHEUS_MULTIPROC_DIR: файлы прошлого запуска удаляются на старте gunicorn, вышедшие воркеры помечаются."""
+
+    def test_gunicorn_hooks(self):
+        hooks = runpy.run_path(os.path.join(settings.BASE_DIR, "gunicorn.conf.py"))
+        with tempfile.TemporaryDirectory() as path, mock.patch("telemanager_django.metrics._MULTIPROC_DIR", path):
+            for name in ("counter_11.db", "histogram_12.db", "keep.txt"):
+                open(os.path.join(path, name), "w").close()
+            hooks["on_starting"](server=None)
+            self.assertEqual(os.listdir(path), ["keep.txt"])
+
+            with mock.patch("telemanager_django.metrics.multiprocess.mark_process_dead") as mark:
+                hooks["child_exit"](server=None, worker=SimpleNamespace(pid=13))
+            mark.assert_called_once_with(13)
+
+
+class ProgressTests(SimpleTestCase):
+    @override_settings(PROGRESS_MIN_INTERVAL=0)
+    def test_progress_published_off_the_send_loop(self):
+        redis = fakeredis.FakeRedis(decode_responses=True)
+        threads = []
+
+        def get_redis():
+            threads.append(threading.current_thread())
+            return redis
+
+        with mock.patch("accounts.progress.get_redis", side_effect=get_redis):
+            run = TaskRunLog("dm", account_id=7, task_id="t1", persist=False)
+            for _ in range(3):
+                run.count()
+            run.count("FLOOD_WAIT")
+            flush()
+        self.assertTrue(threads)
+        self.assertNotIn(threading.current_thread(), threads)
+        last = json.loads(redis.get(LAST_KEY.format(7)))
+        self.assertEqual((last["processed"], last["ok"], last["failed"]), (4, 3, 1))
+
+    def test_stream_snapshot_read_off_the_loop(self):
+        threads = []
+
+        def last_progress(account_ids):
+            threads.append(threading.current_thread())
+            return ['{"account_id": 7}']
+
+        async def read():
+            return [event async for event in stream_events([])]
+
+        with mock.patch("accounts.progress.last_progress", side_effect=last_progress):
+            self.assertEqual(asyncio.run(read()), ['data: {"account_id": 7}\n\n'])
+        self.assertTrue(threads)
+        self.assertNotIn(threading.current_thread(), threads)
+
+
+class StopTokenTests(SimpleTestCase):
+    def test_checks_redis_every_n_items(self):
+        redis = mock.Mock()
+        redis.exists.side_effect = [0, 0, 1]
+        with mock.patch("accounts.cancellation.get_redis", return_value=redis):
+            stop = StopToken(1, "invite", every=3, interval=3600)
+            seen = [stop.requested() for _ in range(8)]
+        self.assertEqual(seen, [False, False, False, False, False, False, True, True])
+        self.assertEqual(redis.exists.call_count, 3)
+
+    def test_wait_wakes_up_on_stop(self):
+        redis = mock.Mock()
+        redis.exists.side_effect = [0, 1]
+        with mock.patch("accounts.cancellation.get_redis", return_value=redis), \
+                mock.patch("accounts.cancellation.time.sleep") as sleep:
+            self.assertTrue(StopToken(1, "dm", interval=5).wait(3600))
+        self.assertEqual(sleep.call_count, 2)
+
+
+class ImportTimeBudgetTests(SimpleTestCase):
+    """
+    Telethon и socks нужны только задачам и вьюхам, которые ходят в Telegram:
+    загрузка URLconf и модулей задач не должна их импортировать.
+    Подробный профиль: python -X importtime manage.py check 2> imports.txt
+    """
+    HEAVY = ("telethon", "socks")
+    BOOT = {
+        "web": "from django.urls import resolve; resolve('/api/accounts/')",
+        "worker": "from telemanager_django.celery import app; app.loader.import_default_modules()",
+    }
+
+    def boot(self, code):
+        script = (
+            "import json, sys, time\n"
+            "t = time.perf_counter()\n"
+            "import django; django.setup()\n"
+            f"{code}\n"
+            "print(json.dumps({'ms': (time.perf_counter() - t) * 1000,"
+            f" 'heavy': sorted({{m.split('.')[0] for m in sys.modules}} & set({self.HEAVY!r}))}}))\n"
+        )
+        env = {**os.environ, "DJANGO_SETTINGS_MODULE": "telemanager_django.settings"}
+        out = subprocess.run([sys.executable, "-c", script], env=env, capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        self.assertEqual(out.returncode, 0, out.stderr)
+        return json.loads(out.stdout.strip().splitlines()[-1])
+
+    def test_boot_does_not_import_telethon(self):
+        for name, code in self.BOOT.items():
+            with self.subTest(name):
+                result = self.boot(code)
+                self.assertEqual(result["heavy"], [])
+                self.assertLess(result["ms"], PERF_STARTUP_MS)
+
+
+class AsyncRuntimeTests(SimpleTestCase):
+    JOB = json.dumps({"id": "job1", "kind": "invite", "kwargs": {"account_id": 7, "channel_id": 1}})
+
+    def worker(self, handler):
+        worker = AsyncWorker(name="test")
+        worker.redis = mock.AsyncMock()
+        worker.handlers = {"invite": handler}
+        return worker
+
+    @override_settings(ASYNC_WORKER_ENABLED=True)
+    def test_dispatch_enqueues_instead_of_celery(self):
+        redis, task = mock.Mock(), mock.Mock()
+        with mock.patch("accounts.runtime.get_redis", return_value=redis):
+            job_id = dispatch("dm", task, account_id=7, message_text="hi")
+        task.delay.assert_not_called()
+        key, raw = redis.lpush.call_args.args
+        self.assertEqual(key, "tm:jobs:campaigns")
+        self.assertEqual(json.loads(raw), {"id": job_id, "kind": "dm", "kwargs": {"account_id": 7, "message_text": "hi"}})
+
+    def test_busy_account_is_delayed(self):
+        handler = mock.AsyncMock()
+        worker = self.worker(handler)
+        with mock.patch("accounts.runtime.AccountLease.try_acquire", return_value=False):
+            asyncio.run(worker._run(self.JOB))
+        handler.assert_not_awaited()
+        self.assertIn(self.JOB, worker.redis.zadd.call_args.args[1])
+        worker.redis.lrem.assert_awaited_once_with("tm:jobs:campaigns:inflight:test", 1, self.JOB)
+
+    def test_cancelled_job_goes_back_to_queue(self):
+        handler = mock.AsyncMock(side_effect=asyncio.CancelledError)
+        worker = self.worker(handler)
+        with mock.patch("accounts.runtime.AccountLease.try_acquire", return_value=True), \
+                mock.patch("accounts.runtime.AccountLease.release") as release:
+            with self.assertRaises(asyncio.CancelledError):
+                asyncio.run(worker._run(self.JOB))
+        handler.assert_awaited_once_with(task_id="job1", account_id=7, channel_id=1)
+        release.assert_called_once()
+        worker.redis.lpush.assert_awaited_once_with("tm:jobs:campaigns", self.JOB)
+        worker.redis.lrem.assert_awaited_once()
+
+
+class OrmExecutorTests(SimpleTestCase):
+    def test_db_calls_close_old_connections(self):
+        # потоки пула живут весь процесс: до и после вызова — как вокруг HTTP-запроса
+        with mock.patch("accounts.tasks.close_old_connections") as close:
+            self.assertEqual(async_to_sync(_db(lambda x: x * 2))(21), 42)
+        self.assertEqual(close.call_count, 2)
+
+
+class TrainScanTests(TestCase):
+    def scan(self, *errors):
+        scan_channel = mock.AsyncMock(side_effect=[*errors, None])
+        run = mock.Mock()
+        with mock.patch("accounts.train_account._scan_channel", scan_channel):
+            async_to_sync(_scan_resuming)(None, SimpleNamespace(id=1), SimpleNamespace(username="@c"), run, FloodGate(), None)
+        return scan_channel, run
+
+    def test_flood_wait_resumes_channel(self):
+        scan_channel, run = self.scan(FloodWaitError(request=None, capture=0))
+        self.assertEqual(scan_channel.await_count, 2)
+        run.count.assert_not_called()
+
+    def test_channel_deferred_after_retries(self):
+        floods = [FloodWaitError(request=None, capture=0)] * (FLOOD_RETRIES + 1)
+        scan_channel, run = self.scan(*floods)
+        self.assertEqual(scan_channel.await_count, FLOOD_RETRIES + 1)
+        run.count.assert_called_once_with("FLOOD_WAIT")
+
+    def test_unresolved_ids_are_released(self):
+        writer = UserWriter(User.objects.create_user("trainer"), run=mock.Mock())
+        self.assertEqual(async_to_sync(writer.unknown)([1, 2]), {1, 2})
+        self.assertEqual(async_to_sync(writer.unknown)([1, 2]), set())
+        writer.release({2})
+        self.assertEqual(async_to_sync(writer.unknown)([1, 2]), {2})
+
+
+class StableHistoryClient(fake_telethon.FakeAsyncTelegramClient):
+    """
+    История без случайности: автор сообщения n — всегда один и тот же, поэтому
+    повторный скан видит тех же авторов. sender есть у всех или ни у кого.
+    Запоминает, с какого места читались история и участники.
+    """
+
+    def __init__(self, senders=True, fail_on=None, break_at=None, **kwargs):
+        super().__init__(**kwargs)
+        self.senders = senders
+        # (запрос, номер его вызова с 1) → ошибка, которой он ответит
+        self.fail_on = fail_on or {}
+        # на сообщении с этим id история обрывается
+        self.break_at = break_at
+        self.min_ids, self.participant_offsets = [], []
+
+    async def iter_messages(self, entity, limit=None, min_id=0, reverse=False, **kwargs):
+        self.min_ids.append(min_id)
+        async for message in super().iter_messages(entity, limit, min_id, reverse, **kwargs):
+            if message.id == self.break_at:
+                raise ConnectionError("history interrupted")
+            author = fake_telethon.AUTHOR_ID_BASE + message.id
+            message.from_id = PeerUser(author)
+            message.sender = fake_telethon.fake_user(author) if self.senders else None
+            yield message
+
+    async def __call__(self, request):
+        name = type(request).__name__
+        if name == "GetParticipantsRequest":
+            self.participant_offsets.append(request.offset)
+        error = self.fail_on.get((name, fake_telethon.network.calls[name] + 1))
+        if error:
+            fake_telethon.network.calls[name] += 1
+            raise error
+        return await super().__call__(request)
+
+
+class FakeTrainTestCase(TestCase):
+    """_scan_channel на фейковом клиенте: 250 сообщений, сеть без задержек, паузы не спят."""
+
+    MESSAGES = 250
+
+    def setUp(self):
+        owner = User.objects.create_user("trainer")
+        self.account = TelegramAccount.objects.create(user=owner, phone="+70000000003")
+        self.channel = TrainingChannel.objects.create(username="train_src", type="group")
+        self.run = mock.Mock()
+        self.writer = UserWriter(owner, self.run)
+        self.network = self.configure(messages=self.MESSAGES, participants=0)
+        self.client = StableHistoryClient()
+        patcher = mock.patch("asyncio.sleep", mock.AsyncMock())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def configure(self, **options):
+        previous = fake_telethon.network
+        self.addCleanup(setattr, fake_telethon, "network", previous)
+        self.network = fake_telethon.configure(**options)
+        return self.network
+
+    def scan(self, scanner=_scan_channel):
+        async def go():
+            try:
+                await scanner(self.client, self.account, self.channel, self.run, FloodGate(), self.writer)
+            finally:
+                await self.writer.flush()
+        async_to_sync(go)()
+
+    def checkpoint(self):
+        return self.account.training_checkpoints.get(channel=self.channel)
+
+    def authors(self, first=1, last=MESSAGES):
+        return {fake_telethon.AUTHOR_ID_BASE + n for n in range(first, last + 1)}
+
+    def collected(self):
+        return set(TelegramUser.objects.values_list("peer_id", flat=True))
+
+
+class TrainCheckpointTests(FakeTrainTestCase):
+    """TrainingCheckpoint: повторное обучение читает только новое, прерванное — продолжается с места обрыва."""
+
+    def test_rerun_reads_only_new_messages(self):
+        self.scan()
+        self.assertEqual(self.checkpoint().max_message_id, self.MESSAGES)
+
+        self.network.messages = 300
+        self.scan()
+        self.assertEqual(self.client.min_ids, [0, self.MESSAGES])
+        # без чекпоинта — одна get_messages за последним id, с ним — ни одной
+        self.assertEqual(self.network.calls["get_messages"], 1)
+        self.assertEqual(self.collected(), self.authors(1, 300))
+
+    def test_interrupted_scan_resumes_from_checkpoint(self):
+        self.client.break_at = 230
+        with self.assertRaises(ConnectionError):
+            self.scan()
+        # две полные пачки сохранены, оборванная — нет
+        self.assertEqual(self.checkpoint().max_message_id, 200)
+        self.assertEqual(self.collected(), self.authors(1, 200))
+
+        self.client.break_at = None
+        self.scan()
+        self.assertEqual(self.client.min_ids, [0, 200])
+        self.assertEqual(self.collected(), self.authors())
+
+    def test_participants_offset(self):
+        self.network.participants = 450
+        # вторая страница участников падает: позиция — после первой
+        self.client.fail_on = {("GetParticipantsRequest", 2): RuntimeError("boom")}
+        self.scan()
+        self.assertEqual(self.checkpoint().participants_offset, 200)
+
+        self.client.participant_offsets = []
+        self.scan()
+        self.assertEqual(self.client.participant_offsets, [200, 400, 450])
+        # список пройден целиком — следующее обучение начнёт его с начала
+        self.assertEqual(self.checkpoint().participants_offset, 0)
+        self.assertEqual(TelegramUser.objects.filter(peer_id__gte=fake_telethon.MEMBER_ID_BASE).count(), 450)
+
+
+class TrainHarvestTests(FakeTrainTestCase):
+    """Авторы сообщений — из message.sender; GetUsers только для промахов, пачками по GET_USERS_BATCH."""
+
+    def test_senders_need_no_rpc(self):
+        self.scan()
+        self.assertEqual(self.collected(), self.authors())
+        self.assertEqual(self.network.calls["GetUsersRequest"], 0)
+
+    def test_misses_resolved_in_batches(self):
+        self.client.senders = False
+        # вся история — одна пачка из 250 промахов
+        with mock.patch.object(train_account, "MESSAGES_CHUNK", self.MESSAGES):
+            self.scan()
+        self.assertEqual(self.collected(), self.authors())
+        self.assertEqual(self.network.calls["GetUsersRequest"], -(-self.MESSAGES // GET_USERS_BATCH))
+
+    def test_flood_wait_keeps_position_before_chunk(self):
+        self.client = StableHistoryClient(senders=False, fail_on={("GetUsersRequest", 2): FloodWaitError(request=None, capture=0)})
+        with self.assertRaises(FloodWaitError):
+            self.scan()
+        # первая пачка записана, вторая — нет, и позиция не ушла за неё
+        self.assertEqual(self.checkpoint().max_message_id, 100)
+        self.assertEqual(self.collected(), self.authors(1, 100))
+
+        self.client.fail_on = {("GetUsersRequest", 4): FloodWaitError(request=None, capture=0)}
+        self.scan(_scan_resuming)
+        self.assertEqual(self.collected(), self.authors())
+        self.assertEqual(self.checkpoint().max_message_id, self.MESSAGES)
+
+    def test_unresolved_chunk_holds_checkpoint(self):
+        # не FloodWait: скан доходит до конца, но позиция остаётся перед пачкой с промахами
+        self.client = StableHistoryClient(senders=False, fail_on={("GetUsersRequest", 2): RuntimeError("boom")})
+        self.scan()
+        self.assertEqual(self.checkpoint().max_message_id, 100)
+        self.assertEqual(self.collected(), self.authors() - self.authors(101, 200))
+        self.run.warning.assert_any_call("checkpoint.held", channel="train_src", message_id=100)
+
+
+class ForwardMembershipTests(TestCase):
+    """NOT_MEMBER при пересылке: забывается тот чат, доступ к которому действительно пропал."""
+
+    def setUp(self):
+        owner = User.objects.create_user("forwarder")
+        self.account = TelegramAccount.objects.create(user=owner, phone="+70000000002")
+        self.task = ForwardingTask.objects.create(user=owner, account=self.account, source_channel="@src")
+        self.task.active_groups = [ForwardingGroup.objects.create(user=owner, username="@dst")]
+        remember(self.account.id, "@src", "@dst")
+        self.client = mock.Mock()
+        self.client.forward_messages.side_effect = ChannelPrivateError(request=None)
+        self.run = mock.Mock()
+        cache = mock.patch("accounts.tasks.SourceMessages")
+        cache.start().return_value.get.return_value = [{"id": 5, "text": True}]
+        self.addCleanup(cache.stop)
+
+    def forward(self):
+        known = known_chats(self.account.id, ["@src", "@dst"])
+        _forward_scheduled(self.client, self.task, self.run, timezone.now(), known)
+        return known_chats(self.account.id, ["@src", "@dst"])
+
+    def test_lost_target_is_forgotten(self):
+        self.assertEqual(self.forward(), {"src"})
+
+    def test_lost_source_is_forgotten_not_target(self):
+        self.client.get_messages.side_effect = ChannelPrivateError(request=None)
+        self.assertEqual(self.forward(), {"dst"})
+        self.client.forward_messages.assert_called_once()
+
+    def test_source_fetch_failure_blames_source(self):
+        with mock.patch("accounts.tasks.SourceMessages") as cache:
+            cache.return_value.get.side_effect = ChannelPrivateError(request=None)
+            self.assertEqual(self.forward(), {"dst"})
+        self.client.forward_messages.assert_not_called()
+
+
+class ChatMembershipTests(TestCase):
+    def setUp(self):
+        owner = User.objects.create_user("member")
+        self.account = TelegramAccount.objects.create(user=owner, phone="+70000000001")
+        self.client = mock.Mock()
+
+    def test_joins_only_when_membership_unknown(self):
+        self.assertTrue(ensure_joined(self.client, self.account.id, "@Group"))
+        self.assertTrue(ensure_joined(self.client, self.account.id, "https://t.me/group"))
+        self.assertEqual(self.client.call_count, 1)
+        self.assertEqual(known_chats(self.account.id, ["group", "other"]), {"group"})
+
+        # отправка ответила «не участник» — в следующий раз вступаем снова
+        forget(self.account.id, "group")
+        known = known_chats(self.account.id, ["group"])
+        self.assertTrue(ensure_joined(self.client, self.account.id, "group", known))
+        self.assertEqual(self.client.call_count, 2)
+        self.assertEqual(known, {"group"})
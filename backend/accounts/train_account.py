@@ -1,14 +1,16 @@
 import os
 import django
 import asyncio
+import time
 import socks
 from telethon import TelegramClient
 from telethon.errors import SessionPasswordNeededError, FloodWaitError
 from telethon.tl.functions.channels import (
-    JoinChannelRequest,
     GetFullChannelRequest,
+    GetParticipantsRequest,
 )
-from telethon.tl.types import Channel, Chat, User
+from telethon.tl.functions.users import GetUsersRequest
+from telethon.tl.types import Channel, Chat, User, ChannelParticipantsRecent
 from asgiref.sync import sync_to_async
 import sys
 
@@ -17,31 +19,378 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "telemanager_django.settings")
 django.setup()
 
-from accounts.models import TelegramAccount  # noqa: E402
-from users.models import TrainingChannel, TelegramUser  # noqa: E402
+from django.conf import settings  # noqa: E402
+from django.db import transaction  # noqa: E402
+from accounts.models import TelegramAccount, TrainingCheckpoint  # noqa: E402
+from accounts.leases import AccountLease, LeaseBusy  # noqa: E402
+from accounts.memberships import aensure_joined  # noqa: E402
+from accounts.events import TaskRunLog, flush  # noqa: E402
+from telemanager_django.metrics import RPC_LATENCY, FLOOD_WAIT_SECONDS, DB_FLUSH_LATENCY, timed  # noqa: E402
+from users.models import TrainingChannel, TelegramPeer, TelegramUser, TelegramUserArchive  # noqa: E402
 
 SESSIONS_DIR = os.path.join(os.path.dirname(__file__), "..", "sessions")
 
+# первый проход по каналу — не глубже стольких последних сообщений
+MESSAGES_LIMIT = 500000
+# как часто сохранять позицию скана сообщений
+CHECKPOINT_EVERY = 200
+PARTICIPANTS_PAGE = 200
+# сообщения разбираются пачками: одна проверка «есть ли автор в базе» на пачку
+MESSAGES_CHUNK = 100
+WRITE_BATCH = 500
+# users.GetUsers за раз (для авторов, которых не оказалось в ответе истории)
+GET_USERS_BATCH = 100
+# сколько раз продолжать канал с чекпоинта после FloodWait, прежде чем отложить до следующего обучения
+FLOOD_RETRIES = 3
+
+
+class FloodGate:
+    """
+    FloodWait общий на аккаунт: Telegram ограничивает сессию, а не канал,
+    поэтому пауза, полученная одним сканом, останавливает и все остальные.
+    """
+
+    def __init__(self):
+        self._until = 0.0
+
+    def pause(self, seconds):
+        self._until = max(self._until, time.monotonic() + seconds)
+
+    async def wait(self):
+        left = self._until - time.monotonic()
+        if left > 0:
+            await asyncio.sleep(left)
 
-async def _ensure_join(client: TelegramClient, entity) -> None:
+
+class UserWriter:
     """
-    Пытается присоединиться к чату/каналу; молча игнорирует, если уже внутри/приватный.
+    Общий для всех сканов буфер новых TelegramUser: bulk_create пачками
+    вместо create() на каждого. Помнит уже известные user_id, чтобы один и тот же
+    автор из двух каналов не резолвился и не писался дважды.
+
+    Известность — в базе этого владельца: пользователь, собранный другим
+    владельцем, добавляется и сюда; общая запись TelegramPeer лишь обновляется.
     """
-    try:
-        await client(JoinChannelRequest(entity))
-    except Exception:
-        pass  # уже внутри / приватный / нет прав — для сбора участников не критично
 
+    def __init__(self, owner, run: TaskRunLog, batch_size=WRITE_BATCH):
+        self.owner = owner
+        self.run = run
+        self.batch_size = batch_size
+        self._peers = []
+        self._buffer = []
+        self._known = set()
+        # отданы какому-то скану на резолв — другие сканы их не берут
+        self._claimed = set()
+        self._lock = asyncio.Lock()
+
+    async def unknown(self, user_ids) -> set:
+        """Кого из user_ids ещё нет ни в базе, ни в буфере — один запрос на пачку."""
+        ids = {i for i in user_ids if i not in self._known and i not in self._claimed}
+        if not ids:
+            return set()
+        # архив (users/archive.py) тоже считается: его пользователей уже обработали
+        existing = await sync_to_async(
+            lambda: set(
+                TelegramUser.objects.filter(owner=self.owner, peer_id__in=ids).order_by().values_list("peer_id", flat=True)
+                .union(TelegramUserArchive.objects.filter(owner=self.owner, peer_id__in=ids)
+                       .values_list("peer_id", flat=True), all=True)
+            )
+        )()
+        self._known |= existing
+        # пока ждали базу, эти id мог забрать соседний скан
+        fresh = ids - existing - self._claimed
+        self._claimed |= fresh
+        return fresh
+
+    def release(self, user_ids):
+        """Вернуть id, которые скан так и не получил: их ещё может взять другой скан (или этот после FloodWait)."""
+        self._claimed -= set(user_ids)
+
+    async def add(self, user: User, source: str) -> bool:
+        if user.id in self._known:
+            return False
+        self._known.add(user.id)
+        self._peers.append(TelegramPeer(
+            id=user.id,
+            username=user.username,
+            name=f"{user.first_name or ''} {user.last_name or ''}".strip(),
+            phone=user.phone or "",
+        ))
+        self._buffer.append(TelegramUser(
+            peer_id=user.id,
+            source_channel=source,
+            owner=self.owner,
+            invite_error_code=None,
+            message_error_code=None,
+        ))
+        if len(self._buffer) >= self.batch_size:
+            await self.flush()
+        return True
+
+    async def flush(self):
+        async with self._lock:
+            peers, members = self._peers, self._buffer
+            self._peers, self._buffer = [], []
+            if not members:
+                return
+            with timed(DB_FLUSH_LATENCY, task="train"):
+                await sync_to_async(self._write)(peers, members)
+            self.run.count(n=len(members))
+
+    @staticmethod
+    def _write(peers, members):
+        with transaction.atomic():
+            # справочник общий: свежие username/имя/телефон перезаписывают старые
+            TelegramPeer.objects.bulk_create(
+                peers, update_conflicts=True, unique_fields=["id"], update_fields=["username", "name", "phone", "updated_at"],
+            )
+            # ignore_conflicts — тех же пользователей параллельно может писать обучение другого аккаунта
+            TelegramUser.objects.bulk_create(members, ignore_conflicts=True)
+
+
+async def _save_checkpoint(checkpoint: TrainingCheckpoint, **fields):
+    for name, value in fields.items():
+        setattr(checkpoint, name, value)
+    await sync_to_async(checkpoint.save)(update_fields=[*fields, "updated_at"])
 
-async def train_account(account: TelegramAccount):
+
+async def _iter_participants(client: TelegramClient, target, offset: int):
+    """
+    Страницы (смещение после страницы, пользователи), начиная с offset.
+    У каналов/мегагрупп листаем GetParticipantsRequest со смещением, у обычных
+    групп смещения в API нет — пропускаем уже пройденных на клиенте.
+    """
+    if not isinstance(target, Channel):
+        users = [u async for u in client.iter_participants(target, limit=None)]
+        for start in range(offset, len(users), PARTICIPANTS_PAGE):
+            page = users[start:start + PARTICIPANTS_PAGE]
+            yield start + len(page), page
+        return
+
+    while True:
+        page = await client(GetParticipantsRequest(target, ChannelParticipantsRecent(), offset, PARTICIPANTS_PAGE, 0))
+        if not page.users:
+            return
+        offset += len(page.participants)
+        yield offset, page.users
+
+
+async def _resolve_target(client: TelegramClient, account_id, channel: TrainingChannel, run: TaskRunLog):
+    """
+    Чат, из которого собираем пользователей, или None, если канал пропускаем.
+    Вступает в чат, только если членство аккаунта ещё не известно (ChatMembership).
+    """
+    entity = await client.get_entity(f"{channel.username}")
+
+    if isinstance(entity, Channel):
+        if getattr(entity, "megagroup", False):
+            # Мегагруппа — работаем напрямую
+            await aensure_joined(client, account_id, entity)
+            return entity
+        # Broadcast-канал — ищем связанный discussion-чат
+        full = await client(GetFullChannelRequest(entity))
+        linked_id = getattr(full.full_chat, "linked_chat_id", None)
+        if not linked_id:
+            run.event("channel.skipped", channel=channel.username, reason="broadcast_without_linked_chat")
+            return None
+        try:
+            linked_entity = await client.get_entity(linked_id)
+        except Exception:
+            # Иногда без join к исходному каналу не резолвится access_hash
+            await aensure_joined(client, account_id, entity)
+            try:
+                linked_entity = await client.get_entity(linked_id)
+            except Exception:
+                run.warning("channel.skipped", channel=channel.username, reason="linked_chat_unresolved")
+                return None
+        await aensure_joined(client, account_id, linked_entity)
+        return linked_entity
+
+    if isinstance(entity, Chat):
+        # Обычная (не Channel) группа
+        await aensure_joined(client, account_id, entity)
+        return entity
+
+    run.warning("channel.skipped", channel=channel.username, reason="unknown_type")
+    return None
+
+
+async def _get_users(client, peers, run, gate: FloodGate, source: str, acc_label: str) -> list:
+    """Пользователи по PeerUser одним users.GetUsers на пачку вместо get_entity на каждого."""
+    inputs = []
+    for peer in peers:
+        try:
+            # access_hash берётся из кэша сессии, который Telethon пополняет ответами истории
+            inputs.append(await client.get_input_entity(peer))
+        except Exception as e:
+            run.warning("get_entity.failed", channel=source, user_id=peer.user_id, error=str(e))
+            run.count("GET_ENTITY")
+
+    users = []
+    for start in range(0, len(inputs), GET_USERS_BATCH):
+        batch = inputs[start:start + GET_USERS_BATCH]
+        await gate.wait()
+        try:
+            with timed(RPC_LATENCY, method="get_users", account=acc_label, task="train"):
+                users += await client(GetUsersRequest(batch))
+        except FloodWaitError:
+            # не терять пачку: _scan_resuming переждёт и продолжит с чекпоинта, авторы резолвятся заново
+            raise
+        except Exception as e:
+            run.warning("get_users.failed", channel=source, error=str(e), n=len(batch))
+            run.count("GET_ENTITY", n=len(batch))
+    return [u for u in users if isinstance(u, User)]
+
+
+async def _scan_channel(client, account, channel, run, gate: FloodGate, writer: UserWriter):
+    acc_label = str(account.id)
+    target = await _resolve_target(client, account.id, channel, run)
+    if target is None:
+        return
+
+    checkpoint, _ = await sync_to_async(TrainingCheckpoint.objects.get_or_create)(
+        account_id=account.id, channel_id=channel.id,
+    )
+
+    # --- Скан сообщений целевого target: от старых к новым, только новее чекпоинта ---
+    added_from_msgs = 0
+    min_id = checkpoint.max_message_id
+    if not min_id:
+        await gate.wait()
+        latest = await client.get_messages(target, limit=1)
+        min_id = max(0, latest[0].id - MESSAGES_LIMIT) if latest else 0
+    last_id = min_id
+    run.event("channel.resume", channel=channel.username, min_id=min_id,
+              participants_offset=checkpoint.participants_offset)
+
+    async def harvest(chunk) -> bool:
+        """True, если резолвлены все новые авторы пачки."""
+        nonlocal added_from_msgs
+        # автор почти всегда уже пришёл в users-векторе ответа GetHistory (message.sender),
+        # отдельный RPC нужен только тем, кого там не оказалось
+        peers, senders = {}, {}
+        for message in chunk:
+            from_id = getattr(message, "from_id", None)
+            user_id = getattr(from_id, "user_id", None)
+            if not user_id:
+                continue
+            peers.setdefault(user_id, from_id)
+            sender = getattr(message, "sender", None)
+            if isinstance(sender, User):
+                senders[user_id] = sender
+
+        fresh = await writer.unknown(peers)
+        users = [senders[i] for i in fresh if i in senders]
+        misses = [peers[i] for i in fresh if i not in senders]
+        missed = set(fresh)
+        try:
+            if misses:
+                users += await _get_users(client, misses, run, gate, channel.username, acc_label)
+        finally:
+            missed -= {u.id for u in users}
+            writer.release(missed)
+        for user in users:
+            if await writer.add(user, channel.username):
+                added_from_msgs += 1
+        return not missed
+
+    # позиция двигается только по пачкам, где резолвлены все авторы: после первой
+    # пачки с промахами скан идёт дальше, но следующий запуск начнёт с неё
+    complete = True
+
+    async def advance(chunk):
+        nonlocal last_id, complete
+        if await harvest(chunk) and complete:
+            last_id = chunk[-1].id
+        elif complete:
+            complete = False
+            run.warning("checkpoint.held", channel=channel.username, message_id=last_id)
+
+    chunk, scanned = [], 0
+    try:
+        async for message in client.iter_messages(target, min_id=min_id, reverse=True):
+            chunk.append(message)
+            if len(chunk) < MESSAGES_CHUNK:
+                continue
+            await advance(chunk)
+            scanned += len(chunk)
+            chunk = []
+            if scanned % CHECKPOINT_EVERY == 0 and last_id > checkpoint.max_message_id:
+                # сначала пользователи в базу, потом позиция — иначе обрыв потеряет буфер
+                await writer.flush()
+                await _save_checkpoint(checkpoint, max_message_id=last_id)
+            await gate.wait()
+        if chunk:
+            await advance(chunk)
+    finally:
+        # позиция сохраняется и при FloodWait/обрыве — следующий запуск продолжит отсюда
+        if last_id > checkpoint.max_message_id:
+            await writer.flush()
+            await _save_checkpoint(checkpoint, max_message_id=last_id)
+
+    # --- Скан участников (универсально: работает и для Chat, и для Channel) ---
+    # FloodWait отсюда уходит в _scan_resuming: переждать и продолжить с participants_offset
+    added_from_participants = 0
+    try:
+        await gate.wait()
+        async for offset, users in _iter_participants(client, target, checkpoint.participants_offset):
+            fresh = await writer.unknown(u.id for u in users)
+            for u in users:
+                if u.id in fresh and await writer.add(u, channel.username):
+                    added_from_participants += 1
+            await writer.flush()
+            await _save_checkpoint(checkpoint, participants_offset=offset)
+            # лёгкая растяжка, чтобы не бомбить API
+            await asyncio.sleep(1)
+            await gate.wait()
+        # прошли список целиком — следующее обучение начнёт его заново
+        await _save_checkpoint(checkpoint, participants_offset=0)
+    except FloodWaitError:
+        raise
+    except Exception as e:
+        run.warning("participants.failed", channel=channel.username, error=str(e))
+
+    run.event(
+        "channel.done", channel=channel.username,
+        added_from_messages=added_from_msgs, added_from_participants=added_from_participants,
+    )
+
+
+async def _scan_resuming(client, account, channel, run, gate: FloodGate, writer: UserWriter):
+    """
+    _scan_channel с продолжением после FloodWait: пауза общая на аккаунт (gate),
+    позиция уже в чекпоинте — после неё канал продолжается, а не бросается до следующего обучения.
+    """
+    for attempt in range(FLOOD_RETRIES + 1):
+        try:
+            return await _scan_channel(client, account, channel, run, gate, writer)
+        except FloodWaitError as e:
+            run.warning("flood_wait", channel=channel.username, seconds=e.seconds, stage="channel", attempt=attempt)
+            FLOOD_WAIT_SECONDS.labels(account=str(account.id), task="train").inc(e.seconds)
+            gate.pause(e.seconds)
+            if attempt == FLOOD_RETRIES:
+                run.count("FLOOD_WAIT")
+                return
+            await gate.wait()
+
+
+async def train_account(account: TelegramAccount, run: TaskRunLog):
+    """
+    Возвращает None при успехе или строку с причиной, почему обучение не состоялось.
+    Каналы сканируются параллельно (до TRAIN_CONCURRENCY одновременно) через один клиент.
+    """
     session_path = os.path.join(SESSIONS_DIR, f"{account.session_file}")
     if not os.path.exists(session_path):
-        print(f"[{account.phone}] ❌ session file not found")
-        return
+        run.error("session.not_found")
+        return "session file not found"
 
     if not account.api_id or not account.api_hash:
-        print(f"[{account.phone}] ❌ нет api_id/api_hash")
-        return
+        run.error("account.no_keys")
+        return "нет api_id/api_hash"
+
+    if account.proxy and account.proxy.is_down:
+        run.error("proxy.down", proxy_id=account.proxy_id, last_error=account.proxy.last_error)
+        return "прокси недоступен"
 
     proxy = None
     if account.proxy:
@@ -62,15 +411,15 @@ async def train_account(account: TelegramAccount):
         try:
             await client.sign_in(password=account.twofa_password)
         except SessionPasswordNeededError:
-            print(f"[{account.phone}] ❌ требуется 2FA, но не указано")
+            run.error("session.2fa_required")
             await client.disconnect()
-            return
+            return "требуется 2FA, но не указано"
         except Exception as e:
-            print(f"[{account.phone}] ❌ ошибка входа: {e}")
+            run.error("session.sign_in_failed", error=str(e))
             await client.disconnect()
-            return
+            return f"ошибка входа: {e}"
 
-    print(f"[{account.phone}] ✅ подключен")
+    run.event("session.connected")
 
     # статус обучения
     await sync_to_async(
@@ -84,144 +433,32 @@ async def train_account(account: TelegramAccount):
 
     channels = await sync_to_async(list)(TrainingChannel.objects.filter(is_active=True))
 
-    for channel in channels:
-        try:
-            await sync_to_async(
-                lambda: TelegramAccount.objects.filter(id=account.id).update(
-                    training_status=f"📡 Обработка: {channel.username}"
-                )
-            )()
-
-            print(f"[{account.phone}] 🔄 @{channel.username}")
-            entity = await client.get_entity(f"{channel.username}")
-
-            # Определяем целевой чат для сбора (target)
-            target = None
-
-            if isinstance(entity, Channel):
-                if getattr(entity, "megagroup", False):
-                    # Мегагруппа — работаем напрямую
-                    target = entity
-                    await _ensure_join(client, target)
-                else:
-                    # Broadcast-канал — ищем связанный discussion-чат
-                    full = await client(GetFullChannelRequest(entity))
-                    linked_id = getattr(full.full_chat, "linked_chat_id", None)
-                    if not linked_id:
-                        print(f"[@{channel.username}] 📣 broadcast без связанной группы — участников не получить, скип")
-                        continue
-                    try:
-                        linked_entity = await client.get_entity(linked_id)
-                    except Exception:
-                        # Иногда без join к исходному каналу не резолвится access_hash
-                        await _ensure_join(client, entity)
-                        try:
-                            linked_entity = await client.get_entity(linked_id)
-                        except Exception:
-                            print(f"[@{channel.username}] ⚠️ не удалось получить entity связанной группы — скип")
-                            continue
-                    target = linked_entity
-                    await _ensure_join(client, target)
-
-            elif isinstance(entity, Chat):
-                # Обычная (не Channel) группа
-                target = entity
-                await _ensure_join(client, target)
-
-            else:
-                print(f"[@{channel.username}] ❌ неизвестный тип — скип")
-                continue
-
-            # --- Скан сообщений целевого target ---
-            added_from_msgs = 0
-            throttle_counter = 0
-
-            async for message in client.iter_messages(target, limit=500000):
-                from_id = getattr(message, "from_id", None)
-                if not from_id:
-                    continue
-                user_id = getattr(from_id, "user_id", None)
-                if not user_id:
-                    continue
-
-                exists = await sync_to_async(
-                    TelegramUser.objects.filter(user_id=user_id).exists
-                )()
-                if exists:
-                    continue
-
-                try:
-                    user = await client.get_entity(from_id)
-                except FloodWaitError as e:
-                    print(f"⏳ Flood wait: ждём {e.seconds} сек")
-                    await asyncio.sleep(e.seconds)
-                    continue
-                except Exception as e:
-                    print(f"⚠️ ошибка получения user: {e}")
-                    await asyncio.sleep(1)
-                    continue
-
-                if isinstance(user, User):
-                    await sync_to_async(TelegramUser.objects.create)(
-                        user_id=user.id,
-                        username=user.username,
-                        name=f"{user.first_name or ''} {user.last_name or ''}".strip(),
-                        phone=user.phone or "",
-                        source_channel=channel.username,
-                        owner=user_owner,
-                        invite_error_code=None,
-                        message_error_code=None,
-                    )
-                    added_from_msgs += 1
-                    throttle_counter += 1
-                    if throttle_counter >= 30:
-                        await asyncio.sleep(20)
-                        throttle_counter = 0
-
-            # --- Скан участников (универсально: работает и для Chat, и для Channel) ---
-            added_from_participants = 0
+    gate = FloodGate()
+    writer = UserWriter(user_owner, run)
+    limit = asyncio.Semaphore(max(1, settings.TRAIN_CONCURRENCY))
+    active, done = [], 0
+
+    async def scan(channel):
+        nonlocal done
+        async with limit:
+            active.append(channel.username)
+            # текущие каналы — в живой прогресс (Redis), без записи в БД на каждый канал
+            run.set_stage(channel=", @".join(active), channels_done=done, channels=len(channels))
+            run.event("channel.start", channel=channel.username)
             try:
-                async for u in client.iter_participants(target, limit=None):
-                    exists = await sync_to_async(
-                        TelegramUser.objects.filter(user_id=u.id).exists
-                    )()
-                    if exists:
-                        continue
-
-                    await sync_to_async(TelegramUser.objects.create)(
-                        user_id=u.id,
-                        username=u.username,
-                        name=f"{u.first_name or ''} {u.last_name or ''}".strip(),
-                        phone=u.phone or "",
-                        source_channel=channel.username,
-                        owner=user_owner,
-                        invite_error_code=None,
-                        message_error_code=None,
-                    )
-                    added_from_participants += 1
-                    # лёгкая растяжка, чтобы не бомбить API
-                    if (added_from_participants % 200) == 0:
-                        await asyncio.sleep(1)
-            except FloodWaitError as e:
-                print(f"⏳ Flood wait (participants): ждём {e.seconds} сек")
-                await asyncio.sleep(e.seconds)
+                await _scan_resuming(client, account, channel, run, gate, writer)
             except Exception as e:
-                print(f"⚠️ ошибка получения участников: {e}")
-
-            print(
-                f"[@{channel.username}] ✅ добавлено из сообщений: {added_from_msgs}, "
-                f"из участников: {added_from_participants}"
-            )
+                run.error("channel.failed", channel=channel.username, error=str(e))
+                run.count("CHANNEL_ERROR")
+            finally:
+                active.remove(channel.username)
+                done += 1
+                run.set_stage(channel=", @".join(active), channels_done=done, channels=len(channels))
 
-        except Exception as e:
-            print(f"[@{channel.username}] ⚠️ ошибка: {e}")
-            # Не сбрасываем is_training посреди цикла; только обновляем текст статуса
-            await sync_to_async(
-                lambda: TelegramAccount.objects.filter(id=account.id).update(
-                    training_status=f"❌ Ошибка на @{channel.username}: {str(e)[:200]}"
-                )
-            )()
-            continue
+    try:
+        await asyncio.gather(*(scan(channel) for channel in channels))
+    finally:
+        await writer.flush()
 
     await client.disconnect()
     await sync_to_async(
@@ -229,24 +466,45 @@ async def train_account(account: TelegramAccount):
             is_training=False, training_status="✅ Обучение завершено"
         )
     )()
-    print(f"[{account.phone}] 💫 обучение завершено")
+    run.event("train.done")
 
 
-async def main():
-    if len(sys.argv) < 2:
-        print("❗ usage: python train_account.py <phone>")
-        return
-
-    phone = sys.argv[1]
+async def train_by_phone(phone: str, task_id=None):
+    """
+    LeaseBusy, если аккаунт занят инвайтом/рассылкой: train_account_task встаёт
+    в очередь за арендой, а не держит воркер scraping, пока она освободится.
+    """
     try:
         account = await sync_to_async(
             lambda: TelegramAccount.objects.select_related("proxy").get(phone=phone)
         )()
     except TelegramAccount.DoesNotExist:
-        print(f"❌ аккаунт {phone} не найден")
+        TaskRunLog("train", task_id=task_id, persist=False).error("account.not_found", phone=phone)
+        return
+
+    lease = AccountLease(account.id, "train", task_id=task_id)
+    if not await lease.aacquire():
+        raise LeaseBusy(account.id, await lease.aholder())
+
+    run = await sync_to_async(TaskRunLog)("train", account_id=account.id, task_id=task_id)
+    try:
+        error = await train_account(account, run)
+    except Exception as e:
+        run.error("run.error", error=str(e))
+        await run.afinish("failed", str(e))
+        raise
+    finally:
+        await lease.arelease()
+    await run.afinish("failed" if error else "done", error or "Обучение завершено")
+
+
+async def main():
+    if len(sys.argv) < 2:
+        print("❗ usage: python train_account.py <phone>")
         return
 
-    await train_account(account)
+    await train_by_phone(sys.argv[1])
+    flush()
 
 
 if __name__ == "__main__":
@@ -1,10 +1,13 @@
 from django.urls import path
-from .views import TelegramAccountListView, UploadTelegramAccountView, ProxyListCreateView, set_account_proxy, delete_account, ProxyDestroyView, check_all_accounts_view, train_account_view, add_intermediate_channel, list_intermediate_channels, delete_intermediate_channel, add_account_to_intermediate_channel, invite_all_users_view, stop_invite_task, send_code_view, sign_in_view, send_direct_messages_view, TelegramProfileView, TelegramProfilePhotoView
+from .views import TelegramAccountListView, UploadTelegramAccountView, ProxyListCreateView, set_account_proxy, delete_account, ProxyDestroyView, check_all_accounts_view, train_account_view, add_intermediate_channel, list_intermediate_channels, delete_intermediate_channel, add_account_to_intermediate_channel, invite_all_users_view, stop_invite_task, send_code_view, sign_in_view, send_direct_messages_view, stop_direct_messages_view, TelegramProfileView, TelegramProfilePhotoView, TaskRunListView, progress_stream_view, progress_stream_token_view
 
 urlpatterns = [
     path('', TelegramAccountListView.as_view(), name='telegram_accounts'),
     path('upload/', UploadTelegramAccountView.as_view(), name='upload_account'),
     path('proxies/', ProxyListCreateView.as_view(), name='proxy-list-create'),
+    path('runs/', TaskRunListView.as_view(), name='task-runs'),
+    path('progress/stream/', progress_stream_view, name='progress-stream'),
+    path('progress/stream/token/', progress_stream_token_view, name='progress-stream-token'),
     path('<int:account_id>/set_proxy/', set_account_proxy),
     path('<int:account_id>/', delete_account, name='delete_account'),
     path('proxies/<int:pk>/', ProxyDestroyView.as_view(), name='proxy-delete'),
@@ -19,6 +22,7 @@ urlpatterns = [
     path("send_code/", send_code_view, name="send_code"),
     path("sign_in/", sign_in_view, name="sign_in"),
     path("broadcast/", send_direct_messages_view, name="broadcast"),
+    path("broadcast/stop/", stop_direct_messages_view, name="stop-broadcast"),
     path('<int:account_id>/profile/', TelegramProfileView.as_view(), name='tg-profile'),
     path('<int:account_id>/profile/photo/', TelegramProfilePhotoView.as_view(), name='tg-photo'),
 ]
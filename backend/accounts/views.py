@@ -1,36 +1,41 @@
-import os, json
+import io, os, json
 from django.conf import settings
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework.parsers import MultiPartParser
+from rest_framework.exceptions import NotAuthenticated, ParseError
+from rest_framework.parsers import FormParser, MultiPartParser
 from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from .models import TelegramAccount
 from .serializers import TelegramAccountSerializer
-from .models import Proxy, IntermediateChannel
-from .serializers import ProxySerializer
+from .leases import AccountLease, LeaseBusy, lease_states
+from .cancellation import request_stop, clear_stop
+from .runtime import dispatch
+import redis
+from .progress import stream_events
+from .models import Proxy, IntermediateChannel, TaskRun
+from .serializers import ProxySerializer, TaskRunSerializer
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework import generics
+from django.db.models import F, Prefetch
 from django.http import JsonResponse
+from django.views import View
 from django.views.decorators.csrf import csrf_exempt
-from accounts.tasks import invite_all_users_task, send_direct_messages_task
-import subprocess
+from django.views.decorators.http import require_POST
+from django.utils.decorators import method_decorator
+from accounts.tasks import invite_all_users_task, send_direct_messages_task, train_account_task, check_all_accounts_task, join_channel_task
 from celery.app.control import Control
-from asgiref.sync import async_to_sync
-from django.http import JsonResponse, FileResponse
-from telethon.errors import RPCError
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse, FileResponse, StreamingHttpResponse
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError, AuthenticationFailed
+from rest_framework_simplejwt.tokens import Token
 from celery import current_app
-# from telethon.sync import TelegramClient
-from telethon.tl import functions, types
-from telethon.errors import (
-    PhoneCodeInvalidError, SessionPasswordNeededError, PhoneCodeExpiredError,
-    ApiIdInvalidError, PhoneNumberInvalidError
-)
-from telethon.errors.rpcerrorlist import FloodWaitError
 import asyncio
-import socks
 from rest_framework.decorators import parser_classes
-from telethon import TelegramClient
+
+# Telethon и socks — только внутри вьюх, которые ходят в Telegram: загрузка URLconf
+# и остальные эндпоинты не платят за их импорт (accounts/tests.py: ImportTimeBudgetTests)
 
 revoke = current_app.control.revoke
 
@@ -45,9 +50,15 @@ class TelegramAccountListView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        accounts = TelegramAccount.objects.filter(user=request.user)
-        serializer = TelegramAccountSerializer(accounts, many=True)
-        return Response(serializer.data)
+        # поля TelegramAccountSerializer строками .values() — без модели и сериализатора на аккаунт
+        fields = [f for f in TelegramAccountSerializer.Meta.fields if f not in ("lease", "proxy_alive")]
+        accounts = list(TelegramAccount.objects.filter(user=request.user)
+                        .values(*fields, proxy_alive=F("proxy__is_alive")))
+        # состояние аренды — одним запросом в Redis на весь список
+        leases = lease_states([a["id"] for a in accounts])
+        for account in accounts:
+            account["lease"] = leases.get(account["id"])
+        return Response(accounts)
 
 
 class UploadTelegramAccountView(APIView):
@@ -120,6 +131,123 @@ class ProxyDestroyView(generics.DestroyAPIView):
     permission_classes = [IsAuthenticated]
 
 
+class TaskRunListView(generics.ListAPIView):
+    """
+    GET /api/accounts/runs/?kind=invite|dm|forward|train&account_id=<id>
+    Последние прогоны задач со сводкой (ok / failed / коды ошибок).
+    """
+    serializer_class = TaskRunSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        qs = TaskRun.objects.filter(account__user=self.request.user)
+        kind = self.request.GET.get("kind")
+        if kind:
+            qs = qs.filter(kind=kind)
+        account_id = self.request.GET.get("account_id")
+        if account_id:
+            qs = qs.filter(account_id=account_id)
+        return qs[:200]
+
+
+async def _async_user(request):
+    """
+    JWT из заголовка Authorization для async-вьюх (DRF в них не участвует).
+    (user, None) или (None, ответ 401 — то же тело и заголовок, что отдал бы DRF).
+    """
+    jwt = JWTAuthentication()
+    try:
+        header = jwt.get_header(request)
+        raw = jwt.get_raw_token(header) if header else None
+        if not raw:
+            raise NotAuthenticated()
+        validated = jwt.get_validated_token(raw)
+        return await sync_to_async(jwt.get_user)(validated), None
+    except (NotAuthenticated, InvalidToken, AuthenticationFailed) as e:
+        return None, _unauthorized(e, jwt.authenticate_header(request))
+    except TokenError as e:
+        return None, _unauthorized(InvalidToken(e.args[0]), jwt.authenticate_header(request))
+
+
+class ProgressStreamToken(Token):
+    """
+    Токен только на открытие SSE-потока прогресса. EventSource не умеет заголовки,
+    и токен едет в ?token= — а значит, в логи nginx/прокси; поэтому он живёт
+    PROGRESS_STREAM_TOKEN_LIFETIME и как access-токен не принимается (token_type другой).
+    """
+    token_type = "progress_stream"
+    lifetime = settings.PROGRESS_STREAM_TOKEN_LIFETIME
+
+
+async def _stream_user(request):
+    """Как _async_user, но по ProgressStreamToken из ?token=."""
+    jwt = JWTAuthentication()
+    try:
+        raw = request.GET.get("token")
+        if not raw:
+            raise NotAuthenticated()
+        validated = ProgressStreamToken(raw)
+        return await sync_to_async(jwt.get_user)(validated), None
+    except (NotAuthenticated, InvalidToken, AuthenticationFailed) as e:
+        return None, _unauthorized(e, jwt.authenticate_header(request))
+    except TokenError as e:
+        return None, _unauthorized(InvalidToken(e.args[0]), jwt.authenticate_header(request))
+
+
+def _unauthorized(exc, www_authenticate):
+    # как rest_framework.views.exception_handler: dict — как есть, иначе {"detail": ...}
+    data = exc.detail if isinstance(exc.detail, (list, dict)) else {"detail": exc.detail}
+    response = JsonResponse(data, status=401, safe=False)
+    response["WWW-Authenticate"] = www_authenticate
+    return response
+
+
+def _request_data(request):
+    """Тело async-вьюхи, как request.data у DRF: JSON или форма. None — тело не разобрать."""
+    if request.content_type == "application/json":
+        try:
+            return json.loads(request.body or b"{}")
+        except ValueError:
+            return None
+    if request.method == "POST":
+        return request.POST
+    # PATCH/PUT Django в request.POST не разбирает — разбираем теми же парсерами, что DRF
+    stream = io.BytesIO(request.body)
+    try:
+        if request.content_type == "multipart/form-data":
+            return MultiPartParser().parse(stream, request.META["CONTENT_TYPE"], {"request": request}).data
+        return FormParser().parse(stream, request.content_type, {"request": request})
+    except ParseError:
+        return None
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def progress_stream_token_view(request):
+    """
+    POST /api/accounts/progress/stream/token/
+    Короткий токен для progress_stream_view: access-токен в URL не передаём.
+    """
+    return Response({"token": str(ProgressStreamToken.for_user(request.user))})
+
+
+async def progress_stream_view(request):
+    """
+    GET /api/accounts/progress/stream/?token=<progress_stream_token_view>
+    SSE: прогресс задач (processed / ok / failed / eta) по всем аккаунтам пользователя.
+    Заменяет опрос списка аккаунтов и training_status.
+    """
+    user, denied = await _stream_user(request)
+    if denied:
+        return denied
+
+    account_ids = [i async for i in TelegramAccount.objects.filter(user=user).values_list("id", flat=True)]
+    response = StreamingHttpResponse(stream_events(account_ids), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
 @api_view(['PUT'])
 @permission_classes([IsAuthenticated])
 def set_account_proxy(request, account_id):
@@ -142,6 +270,19 @@ def set_account_proxy(request, account_id):
     return Response({"message": "Прокси обновлён"})
 
 
+def _proxy_down(account):
+    """Тело ответа 409, если прокси аккаунта мёртв по последним проверкам (probe_proxies_task)."""
+    proxy = account.proxy
+    if proxy is None or not proxy.is_down:
+        return None
+    return {
+        "error": "Прокси аккаунта недоступен",
+        "proxy_id": proxy.id,
+        "last_error": proxy.last_error,
+        "last_checked_at": proxy.last_checked_at,
+    }
+
+
 @api_view(['DELETE'])
 @permission_classes([IsAuthenticated])
 def delete_account(request, account_id):
@@ -158,10 +299,8 @@ def delete_account(request, account_id):
 @permission_classes([IsAuthenticated])
 @csrf_exempt
 def check_all_accounts_view(request):
-    script_path = os.path.join(os.path.dirname(__file__), 'check_all_accounts.py')
-
     try:
-        subprocess.Popen(['python3', script_path])
+        check_all_accounts_task.delay()
         return JsonResponse({'message': 'Проверка запущена'}, status=200)
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
@@ -173,15 +312,18 @@ def check_all_accounts_view(request):
 def train_account_view(request, account_id):
     from .models import TelegramAccount
     try:
-        account = TelegramAccount.objects.get(id=account_id, user=request.user)
+        account = TelegramAccount.objects.select_related("proxy").get(id=account_id, user=request.user)
     except TelegramAccount.DoesNotExist:
         return JsonResponse({"error": "Аккаунт не найден"}, status=404)
 
+    down = _proxy_down(account)
+    if down:
+        return JsonResponse(down, status=409)
+
     phone = account.phone
-    script_path = os.path.join(os.path.dirname(__file__), 'train_account.py')
 
     try:
-        subprocess.Popen(['python3', script_path, phone])
+        train_account_task.delay(phone)
         return JsonResponse({'message': f'Обучение аккаунта {phone} запущено'})
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
@@ -205,7 +347,10 @@ def add_intermediate_channel(request):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def list_intermediate_channels(request):
-    channels = IntermediateChannel.objects.all().order_by('-created_at')
+    # телефоны аккаунтов — одним запросом на все каналы, а не по запросу на канал
+    channels = IntermediateChannel.objects.prefetch_related(
+        Prefetch('added_accounts', queryset=TelegramAccount.objects.only('id', 'phone'))
+    ).order_by('-created_at')
     data = [
         {
             'id': c.id,
@@ -244,10 +389,8 @@ def add_account_to_intermediate_channel(request, pk):
     except IntermediateChannel.DoesNotExist:
         return Response({'error': 'Канал не найден'}, status=404)
 
-    script_path = os.path.join(os.path.dirname(__file__), 'join_channel.py')
-
     try:
-        subprocess.Popen(['python3', script_path, account.phone, channel.username])
+        join_channel_task.delay(account.phone, channel.username)
         return Response({'message': f'Добавление аккаунта {account.phone} в {channel.username} запущено'})
     except Exception as e:
         return Response({'error': str(e)}, status=500)
@@ -277,7 +420,12 @@ def invite_all_users_view(request):
     if getattr(account, "cooldown_until", None) and now < account.cooldown_until:
         return Response({'error': 'Аккаунт в кулдауне', 'cooldown_until': account.cooldown_until}, status=429)
 
-    task = invite_all_users_task.delay(
+    try:
+        clear_stop(account.id, "invite")
+    except redis.RedisError:
+        pass  # без Redis задача всё равно не возьмёт аренду аккаунта
+    task_id = dispatch(
+        "invite", invite_all_users_task,
         account_id=account.id,
         channel_id=channel_id,
         interval=interval,
@@ -285,10 +433,10 @@ def invite_all_users_view(request):
     )
 
     account.stop_inviting = False
-    account.invite_task_id = task.id
+    account.invite_task_id = task_id
     account.save(update_fields=["stop_inviting","invite_task_id"])
 
-    return Response({'message': 'Инвайт запущен', 'task_id': task.id, 'accepted': {'interval': interval}})
+    return Response({'message': 'Инвайт запущен', 'task_id': task_id, 'accepted': {'interval': interval}})
 
 
 
@@ -301,7 +449,13 @@ def stop_invite_task(request):
         if not account.invite_task_id:
             return Response({"error": "Задача не найдена"}, status=404)
 
-        revoke(account.invite_task_id, terminate=True)
+        try:
+            # задача выйдет сама на ближайшей проверке флага и вернёт строки в очередь;
+            # revoke без terminate снимает её, если она ещё ждёт аренду в очереди
+            request_stop(account.id, "invite")
+            revoke(account.invite_task_id)
+        except redis.RedisError:
+            revoke(account.invite_task_id, terminate=True)
         account.stop_inviting = True
         account.invite_task_id = None
         account.save()
@@ -311,76 +465,86 @@ def stop_invite_task(request):
         return Response({"error": "Аккаунт не найден"}, status=404)
 
 
-@api_view(['POST'])
-@permission_classes([IsAuthenticated])
-def send_code_view(request):
-    data = request.data
+@csrf_exempt
+@require_POST
+async def send_code_view(request):
+    from telethon import TelegramClient
+    from telethon.errors import ApiIdInvalidError, FloodWaitError, PhoneNumberInvalidError
+
+    user, denied = await _async_user(request)
+    if denied:
+        return denied
+    data = _request_data(request)
+    if data is None:
+        return JsonResponse({"error": "Некорректный JSON"}, status=400)
     phone = (data.get("phone") or "").strip()
     api_id = data.get("api_id")
     api_hash = data.get("api_hash")
     force_sms = bool(data.get("force_sms", False))
 
     if not all([phone, api_id, api_hash]):
-        return Response({"error": "Нужно указать phone, api_id и api_hash"}, status=400)
+        return JsonResponse({"error": "Нужно указать phone, api_id и api_hash"}, status=400)
 
     session_name = session_path_for(phone)
 
-    async def _send_code_async():
+    try:
         client = TelegramClient(session_name, int(api_id), api_hash)
         await client.connect()
         try:
             res = await client.send_code_request(phone, force_sms=force_sms)
-            return res.phone_code_hash
         finally:
             await client.disconnect()
-
-    try:
-        phone_code_hash = async_to_sync(_send_code_async)()   # ← запускаем async безопасно
-        # ORM — только в sync:
-        TelegramAccount.objects.update_or_create(
-            user=request.user,
+        await TelegramAccount.objects.aupdate_or_create(
+            user=user,
             phone=phone,
             defaults={
                 "api_id": int(api_id),
                 "api_hash": api_hash,
                 "session_file": f"{phone}.session",
-                "phone_code_hash": phone_code_hash,
+                "phone_code_hash": res.phone_code_hash,
             },
         )
-        return Response({"message": "Код отправлен"})
+        return JsonResponse({"message": "Код отправлен"})
     except FloodWaitError as e:
-        return Response({"error": f"Flood wait: подождите {e.seconds} сек."}, status=429)
+        return JsonResponse({"error": f"Flood wait: подождите {e.seconds} сек."}, status=429)
     except (ApiIdInvalidError, PhoneNumberInvalidError) as e:
-        return Response({"error": str(e)}, status=400)
+        return JsonResponse({"error": str(e)}, status=400)
     except Exception as e:
-        return Response({"error": str(e)}, status=500)
+        return JsonResponse({"error": str(e)}, status=500)
 
 
-from telethon.errors import PhoneCodeInvalidError, SessionPasswordNeededError
+@csrf_exempt
+@require_POST
+async def sign_in_view(request):
+    from telethon import TelegramClient, functions
+    from telethon.errors import (
+        FloodWaitError, PhoneCodeExpiredError, PhoneCodeInvalidError, SessionPasswordNeededError,
+    )
 
-@api_view(['POST'])
-@permission_classes([IsAuthenticated])
-def sign_in_view(request):
-    data = request.data
+    user, denied = await _async_user(request)
+    if denied:
+        return denied
+    data = _request_data(request)
+    if data is None:
+        return JsonResponse({"error": "Некорректный JSON"}, status=400)
     phone = (data.get("phone") or "").strip()
     code = (data.get("code") or "").strip()
     password = data.get("password", "")
 
     if not all([phone, code]):
-        return Response({"error": "Нужно указать phone и code"}, status=400)
+        return JsonResponse({"error": "Нужно указать phone и code"}, status=400)
 
     try:
-        account = TelegramAccount.objects.get(phone=phone, user=request.user)
+        account = await TelegramAccount.objects.aget(phone=phone, user=user)
     except TelegramAccount.DoesNotExist:
-        return Response({"error": "Аккаунт не найден"}, status=404)
+        return JsonResponse({"error": "Аккаунт не найден"}, status=404)
 
     if not account.phone_code_hash:
-        return Response({"error": "Сначала запросите код (/send_code/)"},
-                        status=400)
+        return JsonResponse({"error": "Сначала запросите код (/send_code/)"}, status=400)
 
     session_name = session_path_for(phone)
 
-    async def _sign_in_async():
+    try:
         client = TelegramClient(session_name, int(account.api_id), account.api_hash)
         await client.connect()
         try:
@@ -395,35 +559,27 @@ def sign_in_view(request):
                 if not password:
                     raise
                 await client.sign_in(password=password)
-
             me = await client.get_me()
-            return {
-                "first_name": (me.first_name or "").strip(),
-                "last_name": (me.last_name or "").strip(),
-            }
         finally:
             await client.disconnect()
 
-    try:
-        me_info = async_to_sync(_sign_in_async)()  # ← запускаем async-часть
-        # ← А вот это уже синхронно: безопасно для ORM
-        account.name = f"{me_info['first_name']} {me_info['last_name']}".strip()
+        account.name = f"{(me.first_name or '').strip()} {(me.last_name or '').strip()}".strip()
         account.status = "активен"
         account.phone_code_hash = None
         if password:
             account.twofa_password = password
-        account.save()
-        return Response({"message": "Успешно авторизовано"})
+        await account.asave()
+        return JsonResponse({"message": "Успешно авторизовано"})
     except PhoneCodeInvalidError:
-        return Response({"error": "Неверный код"}, status=401)
+        return JsonResponse({"error": "Неверный код"}, status=401)
     except PhoneCodeExpiredError:
-        return Response({"error": "Срок действия кода истёк, запросите новый"}, status=401)
+        return JsonResponse({"error": "Срок действия кода истёк, запросите новый"}, status=401)
     except SessionPasswordNeededError:
-        return Response({"error": "Нужен пароль 2FA"}, status=403)
+        return JsonResponse({"error": "Нужен пароль 2FA"}, status=403)
     except FloodWaitError as e:
-        return Response({"error": f"Flood wait: подождите {e.seconds} сек."}, status=429)
+        return JsonResponse({"error": f"Flood wait: подождите {e.seconds} сек."}, status=429)
     except Exception as e:
-        return Response({"error": str(e)}, status=500)
+        return JsonResponse({"error": str(e)}, status=500)
 
 
 @api_view(['POST'])
@@ -445,7 +601,7 @@ def send_direct_messages_view(request):
         return Response({"error": "Нужен account_id и message_text"}, status=400)
 
     try:
-        account = TelegramAccount.objects.get(id=account_id, user=request.user)
+        account = TelegramAccount.objects.select_related("proxy").get(id=account_id, user=request.user)
     except TelegramAccount.DoesNotExist:
         return Response({"error": "Аккаунт не найден"}, status=404)
 
@@ -454,6 +610,10 @@ def send_direct_messages_view(request):
     if getattr(account, "cooldown_until", None) and now < account.cooldown_until:
         return Response({"error": "Аккаунт в кулдауне", "cooldown_until": account.cooldown_until}, status=429)
 
+    down = _proxy_down(account)
+    if down:
+        return Response(down, status=409)
+
     if media_file:
         os.makedirs("media", exist_ok=True)
         fname = os.path.basename(media_file.name)
@@ -464,7 +624,12 @@ def send_direct_messages_view(request):
     else:
         media_path = None
 
-    task = send_direct_messages_task.delay(
+    try:
+        clear_stop(account.id, "dm")
+    except redis.RedisError:
+        pass
+    task_id = dispatch(
+        "dm", send_direct_messages_task,
         account_id=account.id,
         message_text=message,
         limit=limit,
@@ -473,12 +638,30 @@ def send_direct_messages_view(request):
         owner_user_id=request.user.id,
     )
 
-    return Response({"message": "Задача рассылки запущена", "task_id": task.id, "accepted": {"limit": limit, "interval": interval}})
+    return Response({"message": "Задача рассылки запущена", "task_id": task_id, "accepted": {"limit": limit, "interval": interval}})
+
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def stop_direct_messages_view(request):
+    account_id = request.data.get("account_id")
+    if not TelegramAccount.objects.filter(id=account_id, user=request.user).exists():
+        return Response({"error": "Аккаунт не найден"}, status=404)
+    try:
+        # и идущая, и ещё ждущая аренду рассылка аккаунта выйдут на проверке флага
+        request_stop(account_id, "dm")
+    except redis.RedisError:
+        return Response({"error": "Redis недоступен"}, status=503)
+    return Response({"message": "Рассылка остановлена"})
 
 
 
 def _build_proxy(proxy_obj: Proxy | None):
-    if not proxy_obj or not socks:
+    if not proxy_obj:
+        return None
+    try:
+        import socks
+    except Exception:
         return None
     t = (proxy_obj.proxy_type or '').lower()
     if t == 'socks5':
@@ -500,22 +683,33 @@ def _build_proxy(proxy_obj: Proxy | None):
 #         return await coro(client)
 
 
+PROFILE_LEASE_WAIT = 15  # сек. ждём освобождения аккаунта, потом 423
+
+
+def _lease_busy_response(e: LeaseBusy):
+    return JsonResponse({'error': 'Аккаунт занят другой операцией', 'lease': e.holder}, status=423)
+
+
 async def _with_client(account: TelegramAccount, coro):
     """
     Открываем клиент БЕЗ start(), явно connect()/disconnect(),
     чтобы Telethon не спрашивал телефон.
     """
+    from telethon import TelegramClient
+
     session_path = session_path_for(account.phone)
     proxy = _build_proxy(account.proxy)
-    client = TelegramClient(session_path, int(account.api_id), account.api_hash, proxy=proxy)
-    await client.connect()
-    try:
-        # Не уходим в интерактив – сами проверяем авторизацию
-        if not await client.is_user_authorized():
-            raise RuntimeError("Session exists but is not authorized")
-        return await coro(client)
-    finally:
-        await client.disconnect()
+    # Сессию не открываем, пока аккаунт занят задачей (инвайт/рассылка/обучение)
+    async with AccountLease(account.id, "profile").hold(wait=PROFILE_LEASE_WAIT):
+        client = TelegramClient(session_path, int(account.api_id), account.api_hash, proxy=proxy)
+        await client.connect()
+        try:
+            # Не уходим в интерактив – сами проверяем авторизацию
+            if not await client.is_user_authorized():
+                raise RuntimeError("Session exists but is not authorized")
+            return await coro(client)
+        finally:
+            await client.disconnect()
 
 AVATAR_DIR = os.path.join(settings.MEDIA_ROOT, "tg_avatars")
 os.makedirs(AVATAR_DIR, exist_ok=True)
@@ -524,18 +718,35 @@ def avatar_abspath(account):
     # Фиксированное имя на аккаунт; можно по phone, но id стабильнее.
     return os.path.join(AVATAR_DIR, f"tg_{account.id}.jpg")
 
-class TelegramProfileView(APIView):
+@method_decorator(csrf_exempt, name="dispatch")
+class _AccountAsyncView(View):
     """
-    GET  /api/accounts/<id>/profile/
-    PATCH /api/accounts/<id>/profile/
+    Async-вьюха без DRF (DRF синхронный): JWT из заголовка, аккаунт текущего
+    пользователя — в self.account, сразу с proxy (его читает _with_client).
     """
-    permission_classes = [IsAuthenticated]
 
-    def get(self, request, account_id):
+    async def dispatch(self, request, *args, **kwargs):
+        user, denied = await _async_user(request)
+        if denied:
+            return denied
         try:
-            account = TelegramAccount.objects.get(id=account_id, user=request.user)
+            self.account = await TelegramAccount.objects.select_related("proxy").aget(
+                id=kwargs["account_id"], user=user,
+            )
         except TelegramAccount.DoesNotExist:
-            return Response({'error': 'Аккаунт не найден'}, status=404)
+            return JsonResponse({'error': 'Аккаунт не найден'}, status=404)
+        return await super().dispatch(request, *args, **kwargs)
+
+
+class TelegramProfileView(_AccountAsyncView):
+    """
+    GET  /api/accounts/<id>/profile/
+    PATCH /api/accounts/<id>/profile/
+    """
+
+    async def get(self, request, account_id):
+        from telethon import functions
+        from telethon.errors import FloodWaitError, RPCError
 
         async def job(client):
             me = await client.get_me()
@@ -551,25 +762,27 @@ class TelegramProfileView(APIView):
             }
 
         try:
-            data = async_to_sync(_with_client)(account, job)  # как в send_code/sign_in
-            return Response(data)
+            return JsonResponse(await _with_client(self.account, job))
+        except LeaseBusy as e:
+            return _lease_busy_response(e)
         except FloodWaitError as e:
-            return Response({'error': f'Flood wait: подождите {e.seconds} сек.'}, status=429)
+            return JsonResponse({'error': f'Flood wait: подождите {e.seconds} сек.'}, status=429)
         except RPCError as e:
-            return Response({'error': str(e)}, status=400)
+            return JsonResponse({'error': str(e)}, status=400)
         except Exception as e:
-            return Response({'error': str(e)}, status=500)
+            return JsonResponse({'error': str(e)}, status=500)
 
-    def patch(self, request, account_id):
-        try:
-            account = TelegramAccount.objects.get(id=account_id, user=request.user)
-        except TelegramAccount.DoesNotExist:
-            return Response({'error': 'Аккаунт не найден'}, status=404)
+    async def patch(self, request, account_id):
+        from telethon import functions
+        from telethon.errors import FloodWaitError, RPCError, UsernameInvalidError, UsernameOccupiedError
 
-        desired_username = (request.data.get('username') or '').strip().lstrip('@')
-        first_name = request.data.get('first_name')
-        last_name  = request.data.get('last_name')
-        about      = request.data.get('about')
+        data = _request_data(request)
+        if data is None:
+            return JsonResponse({"error": "Некорректный JSON"}, status=400)
+        desired_username = (data.get('username') or '').strip().lstrip('@')
+        first_name = data.get('first_name')
+        last_name  = data.get('last_name')
+        about      = data.get('about')
 
         async def job(client):
             me = await client.get_me()
@@ -597,34 +810,28 @@ class TelegramProfileView(APIView):
             }
 
         try:
-            data = async_to_sync(_with_client)(account, job)
-            return Response(data)
+            return JsonResponse(await _with_client(self.account, job))
+        except LeaseBusy as e:
+            return _lease_busy_response(e)
         except UsernameOccupiedError:
-            return Response({'error': 'Username уже занят'}, status=400)
+            return JsonResponse({'error': 'Username уже занят'}, status=400)
         except UsernameInvalidError:
-            return Response({'error': 'Некорректный username'}, status=400)
+            return JsonResponse({'error': 'Некорректный username'}, status=400)
         except FloodWaitError as e:
-            return Response({'error': f'Flood wait: подождите {e.seconds} сек.'}, status=429)
+            return JsonResponse({'error': f'Flood wait: подождите {e.seconds} сек.'}, status=429)
         except RPCError as e:
-            return Response({'error': str(e)}, status=400)
+            return JsonResponse({'error': str(e)}, status=400)
         except Exception as e:
-            return Response({'error': str(e)}, status=500)
+            return JsonResponse({'error': str(e)}, status=500)
 
 
-class TelegramProfilePhotoView(APIView):
+class TelegramProfilePhotoView(_AccountAsyncView):
     """
     POST /api/accounts/<id>/profile/photo/  multipart {photo}
     """
-    parser_classes = [MultiPartParser]
-    permission_classes = [IsAuthenticated]
-
-    def get(self, request, account_id):
-        from .models import TelegramAccount
-        try:
-            account = TelegramAccount.objects.get(id=account_id, user=request.user)
-        except TelegramAccount.DoesNotExist:
-            return Response({'error': 'Аккаунт не найден'}, status=404)
 
+    async def get(self, request, account_id):
+        account = self.account
         path = avatar_abspath(account)
         force = request.GET.get("refresh") in ("1", "true", "yes")
 
@@ -633,40 +840,40 @@ class TelegramProfilePhotoView(APIView):
 
         try:
             if force or not os.path.exists(path) or os.path.getsize(path) == 0:
-                res = async_to_sync(_with_client)(account, job)
+                res = await _with_client(account, job)
                 if not res:
                     if os.path.exists(path):
                         try: os.remove(path)
                         except: pass
-                    return Response({'error': 'No profile photo'}, status=404)
+                    return JsonResponse({'error': 'No profile photo'}, status=404)
 
             # Отдаём файл как картинку
             if not os.path.exists(path) or os.path.getsize(path) == 0:
-                return Response({'error': 'No profile photo'}, status=404)
+                return JsonResponse({'error': 'No profile photo'}, status=404)
 
             resp = FileResponse(open(path, "rb"), content_type="image/jpeg")
             resp["Cache-Control"] = "max-age=3600, public"
             resp["Content-Disposition"] = 'inline; filename="avatar.jpg"'
             return resp
 
+        except LeaseBusy as e:
+            return _lease_busy_response(e)
         except RuntimeError as e:
-            return Response({"error": str(e), "action": "sign_in_required"}, status=409)
+            return JsonResponse({"error": str(e), "action": "sign_in_required"}, status=409)
         except Exception as e:
-            return Response({'error': str(e)}, status=500)
+            return JsonResponse({'error': str(e)}, status=500)
 
-    def post(self, request, account_id):
-        try:
-            account = TelegramAccount.objects.get(id=account_id, user=request.user)
-        except TelegramAccount.DoesNotExist:
-            return Response({'error': 'Аккаунт не найден'}, status=404)
+    async def post(self, request, account_id):
+        from telethon import functions
+        from telethon.errors import FloodWaitError, RPCError
 
         photo = request.FILES.get('photo')
         if not photo:
-            return Response({'error': 'Файл не передан'}, status=400)
+            return JsonResponse({'error': 'Файл не передан'}, status=400)
 
         # (по желанию) простая валидация формата/размера
         if photo.size > 5 * 1024 * 1024:
-            return Response({'error': 'Фото больше 5 МБ'}, status=400)
+            return JsonResponse({'error': 'Фото больше 5 МБ'}, status=400)
 
         async def job(client):
             up = await client.upload_file(photo)
@@ -674,11 +881,13 @@ class TelegramProfilePhotoView(APIView):
             return {'ok': True}
 
         try:
-            async_to_sync(_with_client)(account, job)    # ← заменили asyncio.run на async_to_sync
-            return Response({'message': 'Фото обновлено'})
+            await _with_client(self.account, job)
+            return JsonResponse({'message': 'Фото обновлено'})
+        except LeaseBusy as e:
+            return _lease_busy_response(e)
         except FloodWaitError as e:
-            return Response({'error': f'Flood wait: подождите {e.seconds} сек.'}, status=429)
+            return JsonResponse({'error': f'Flood wait: подождите {e.seconds} сек.'}, status=429)
         except RPCError as e:
-            return Response({'error': str(e)}, status=400)
+            return JsonResponse({'error': str(e)}, status=400)
         except Exception as e:
-            return Response({'error': str(e)}, status=500)
+            return JsonResponse({'error': str(e)}, status=500)
@@ -0,0 +1,35 @@
+"""
+Проверка access-токенов rest_framework_simplejwt без Django.
+
+Как JWTAuthentication: заголовок "Authorization: Bearer <token>", подпись HS256
+на SECRET_KEY, срок (exp), token_type == "access", пользователь из claim user_id
+существует и активен.
+"""
+import jwt
+from fastapi import HTTPException, Request
+
+from api import config
+from api.db import get_pool
+
+
+def _unauthorized(detail: str):
+    return HTTPException(status_code=401, detail=detail, headers={"WWW-Authenticate": "Bearer"})
+
+
+async def current_user_id(request: Request) -> int:
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme != "Bearer" or not token:
+        raise _unauthorized("Учетные данные не были предоставлены.")
+    try:
+        payload = jwt.decode(token, config.SECRET_KEY, algorithms=[config.JWT_ALGORITHM],
+                             options={"require": ["exp"]})
+    except jwt.PyJWTError:
+        raise _unauthorized("Токен недействителен или просрочен")
+    if payload.get("token_type") != "access" or payload.get("user_id") is None:
+        raise _unauthorized("Токен недействителен или просрочен")
+
+    user_id = int(payload["user_id"])
+    is_active = await get_pool().fetchval("SELECT is_active FROM auth_user WHERE id = $1", user_id)
+    if not is_active:
+        raise _unauthorized("Пользователь не найден или неактивен")
+    return user_id
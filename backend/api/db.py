@@ -1,6 +1,36 @@
-import sqlite3
+"""
+Пул asyncpg к базе Django. Сервис только читает: сессии открываются
+с default_transaction_read_only, запись упадёт на стороне Postgres.
+"""
+import asyncpg
 
-def get_db_connection():
-    conn = sqlite3.connect("backend/db.sqlite3")
-    conn.row_factory = sqlite3.Row
-    return conn
+from api import config
+
+_pool: asyncpg.Pool | None = None
+
+
+async def open_pool():
+    global _pool
+    _pool = await asyncpg.create_pool(
+        config.DATABASE_URL,
+        min_size=config.DB_POOL_MIN_SIZE,
+        max_size=config.DB_POOL_MAX_SIZE,
+        command_timeout=config.DB_COMMAND_TIMEOUT,
+        server_settings={
+            "application_name": "telemanager-analytics",
+            "default_transaction_read_only": "on",
+        },
+    )
+
+
+async def close_pool():
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+
+
+def get_pool() -> asyncpg.Pool:
+    if _pool is None:
+        raise RuntimeError("пул БД не открыт (lifespan приложения не запускался)")
+    return _pool
@@ -1,7 +1,89 @@
-from fastapi import FastAPI
+"""
+Сервис аналитики: только чтение, отдельно от Django.
+
+Тяжёлые запросы дашборда (сводка, временные ряды, выгрузка) идут сюда и не
+занимают воркеры Django; масштабируется отдельно (uvicorn --workers N).
+База та же, что у Django (asyncpg-пул, api/db.py), токены — те же access JWT
+rest_framework_simplejwt (api/auth.py).
+
+    uvicorn api.main:app --host 0.0.0.0 --port 8001 --workers 2
+
+GET /analytics/processed-users/stats/             — как /api/processed-users/stats/
+GET /analytics/processed-users/stats/timeseries/  — как /api/processed-users/stats/timeseries/
+GET /analytics/processed-users/export/?format=csv|ndjson — потоковая выгрузка
+  Фильтры у всех: from, to, source, invite_status, message_status, processed_by, only_processed.
+"""
+from contextlib import asynccontextmanager
+
+from fastapi import Depends, FastAPI, Query
+from fastapi.responses import ORJSONResponse, StreamingResponse
+
+from api import config, queries
+from api.auth import current_user_id
+from api.db import close_pool, open_pool
+
+
+@asynccontextmanager
+async def lifespan(app):
+    config.check()
+    await open_pool()
+    try:
+        yield
+    finally:
+        await close_pool()
+
+
+app = FastAPI(title="Telemanager analytics", lifespan=lifespan, default_response_class=ORJSONResponse)
+
+
+def common_filters(
+    source: str | None = None,
+    invite_status: str | None = None,
+    message_status: str | None = None,
+    processed_by: int | None = None,
+    date_from: str | None = Query(None, alias="from"),
+    date_to: str | None = Query(None, alias="to"),
+    only_processed: str = "true",
+) -> dict:
+    return {
+        "source": source,
+        "invite_status": invite_status,
+        "message_status": message_status,
+        "processed_by": processed_by,
+        "from": date_from,
+        "to": date_to,
+        "only_processed": only_processed.lower() != "false",
+    }
 
-app = FastAPI()
 
 @app.get("/ping")
 async def ping():
     return {"message": "FastAPI is working!"}
+
+
+@app.get("/analytics/processed-users/stats/")
+async def processed_users_stats(filters: dict = Depends(common_filters), user_id: int = Depends(current_user_id)):
+    return await queries.stats(user_id, filters)
+
+
+@app.get("/analytics/processed-users/stats/timeseries/")
+async def processed_users_timeseries(
+    group_by: str = "day",
+    filters: dict = Depends(common_filters),
+    user_id: int = Depends(current_user_id),
+):
+    return await queries.timeseries(user_id, filters, group_by)
+
+
+@app.get("/analytics/processed-users/export/")
+async def processed_users_export(
+    fmt: str = Query("csv", alias="format", pattern="^(csv|ndjson)$"),
+    filters: dict = Depends(common_filters),
+    user_id: int = Depends(current_user_id),
+):
+    media_type = "text/csv; charset=utf-8" if fmt == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        queries.export(user_id, filters, fmt),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="processed-users.{fmt}"'},
+    )
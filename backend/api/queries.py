@@ -0,0 +1,205 @@
+"""
+SQL аналитики по TelegramUser — те же ответы, что у users.views
+(ProcessedUsersStatsView, ProcessedUsersTimeSeriesView), но одним-двумя
+запросами через asyncpg вместо набора ORM-агрегатов.
+
+Фильтры — как users.views._apply_common_filters:
+  owner, source, invite_status, message_status, processed_by,
+  from/to (по processed_at, а при only_processed=false — по created_at), only_processed.
+"""
+import csv
+import io
+from datetime import datetime, timezone
+
+import orjson
+
+from api import config
+from api.db import get_pool
+
+# TIME_ZONE Django: по нему наивные from/to и границы дня/часа
+TIME_ZONE = "UTC"
+
+PROCESSED_SQL = "(invite_status IN ('success', 'failed') OR message_status IN ('sent', 'failed'))"
+
+# горячая таблица и архив (users/archive.py) — сводки и выгрузка видят всю историю;
+# условия WHERE Postgres спускает в обе ветки UNION ALL
+_COLUMNS = (
+    "id, peer_id, owner_id, source_channel, invite_status, message_status, invite_error_code, "
+    "message_error_code, processed_by_id, created_at, invite_changed_at, message_changed_at, processed_at"
+)
+USERS_SQL = (
+    f"(SELECT {_COLUMNS} FROM users_telegramuser "
+    f"UNION ALL SELECT {_COLUMNS} FROM users_telegramuserarchive)"
+)
+
+
+def _parse_dt(s):
+    if not s:
+        return None
+    try:
+        dt = datetime.fromisoformat(s)
+    except ValueError:
+        return None
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+
+def build_where(owner_id: int, filters: dict) -> tuple[str, list]:
+    """(условие WHERE, аргументы $1..$n) для USERS_SQL."""
+    clauses, args = [], []
+
+    def add(sql, value):
+        args.append(value)
+        clauses.append(sql.format(f"${len(args)}"))
+
+    add("owner_id = {}", owner_id)
+    if filters.get("source"):
+        add("source_channel = {}", filters["source"])
+    if filters.get("invite_status"):
+        add("invite_status = {}", filters["invite_status"])
+    if filters.get("message_status"):
+        add("message_status = {}", filters["message_status"])
+    if filters.get("processed_by") is not None:
+        add("processed_by_id = {}", filters["processed_by"])
+
+    only_processed = filters.get("only_processed", True)
+    date_field = "processed_at" if only_processed else "created_at"
+    dt_from, dt_to = _parse_dt(filters.get("from")), _parse_dt(filters.get("to"))
+    if dt_from:
+        add(f"{date_field} >= {{}}", dt_from)
+    if dt_to:
+        add(f"{date_field} <= {{}}", dt_to)
+
+    if only_processed:
+        clauses.append(PROCESSED_SQL)
+    return " AND ".join(clauses), args
+
+
+async def stats(owner_id: int, filters: dict) -> dict:
+    where, args = build_where(owner_id, filters)
+    async with get_pool().acquire() as conn:
+        # totals по статусам и total — суммы той же матрицы, отдельные COUNT не нужны
+        matrix_rows = await conn.fetch(
+            f"SELECT invite_status, message_status, count(*) AS c FROM {USERS_SQL} AS users "
+            f"WHERE {where} GROUP BY 1, 2", *args)
+        source_rows = await conn.fetch(
+            f"""SELECT source_channel, count(*) AS total,
+                       count(*) FILTER (WHERE invite_status = 'success') AS success,
+                       count(*) FILTER (WHERE message_status = 'sent') AS sent,
+                       count(*) FILTER (WHERE invite_status = 'failed' OR message_status = 'failed') AS failed
+                FROM {USERS_SQL} AS users WHERE {where}
+                GROUP BY source_channel
+                -- при равных total — по источнику, как users.views (сортировка Python: по кодам символов, NULL в конце)
+                ORDER BY total DESC, source_channel COLLATE "C" LIMIT 20""", *args)
+
+    total, invite, message = 0, {}, {}
+    matrix = {"pending": {}, "success": {}, "failed": {}}
+    for r in matrix_rows:
+        i, m, c = r["invite_status"], r["message_status"], r["c"]
+        total += c
+        invite[i] = invite.get(i, 0) + c
+        message[m] = message.get(m, 0) + c
+        matrix.setdefault(i, {})[m] = c
+
+    by_source = [{
+        "source_channel": r["source_channel"],
+        "total": r["total"],
+        "sent": r["sent"],
+        "success": r["success"],
+        "failed": r["failed"],
+        "cr": round(r["sent"] / r["total"], 4) if r["total"] else 0,
+    } for r in source_rows]
+
+    return {
+        "total": total,
+        "invite": {k: invite.get(k, 0) for k in ("pending", "success", "failed")},
+        "message": {k: message.get(k, 0) for k in ("pending", "sent", "failed")},
+        "failed": invite.get("failed", 0) + message.get("failed", 0),
+        "matrix": matrix,
+        "by_source": by_source,
+    }
+
+
+# серия -> (поле времени, доп. условие)
+SERIES = {
+    "invite_success": ("invite_changed_at", "invite_status = 'success'"),
+    "invite_failed": ("invite_changed_at", "invite_status = 'failed'"),
+    "message_sent": ("message_changed_at", "message_status = 'sent'"),
+    "message_failed": ("message_changed_at", "message_status = 'failed'"),
+    "processed": ("processed_at", None),
+}
+
+
+async def timeseries(owner_id: int, filters: dict, group_by: str) -> dict:
+    where, args = build_where(owner_id, filters)
+    unit, tz = f"${len(args) + 1}", f"${len(args) + 2}"
+    parts = []
+    for name, (field, extra) in SERIES.items():
+        cond = f"{where} AND {field} IS NOT NULL" + (f" AND {extra}" if extra else "")
+        parts.append(
+            f"SELECT '{name}' AS series, date_trunc({unit}, {field}, {tz}) AS ts, count(*) AS c "
+            f"FROM {USERS_SQL} AS users WHERE {cond} GROUP BY 2")
+    rows = await get_pool().fetch(" UNION ALL ".join(parts), *args,
+                                  "hour" if group_by == "hour" else "day", TIME_ZONE)
+
+    bucket = {}
+    for r in rows:
+        key = r["ts"].isoformat()
+        point = bucket.setdefault(key, {"ts": key, **{name: 0 for name in SERIES}})
+        point[r["series"]] += r["c"]
+    return {"group_by": group_by, "points": sorted(bucket.values(), key=lambda p: p["ts"])}
+
+
+EXPORT_COLUMNS = [
+    "id", "user_id", "username", "name", "phone", "source_channel",
+    "invite_status", "message_status", "invite_error_code", "message_error_code",
+    "processed_by_id", "processed_at", "created_at",
+]
+
+
+def _export_value(v):
+    return v.isoformat() if isinstance(v, datetime) else v
+
+
+async def export(owner_id: int, filters: dict, fmt: str = "csv"):
+    """
+    Асинхронный генератор кусков ответа (CSV или NDJSON). Строки идут серверным
+    курсором по EXPORT_BATCH — в памяти не больше одной пачки, сколько бы строк ни было.
+    """
+    where, args = build_where(owner_id, filters)
+    sql = (
+        "SELECT u.id, u.peer_id AS user_id, p.username, p.name, p.phone, u.source_channel, "
+        "u.invite_status, u.message_status, u.invite_error_code, u.message_error_code, "
+        "u.processed_by_id, u.processed_at, u.created_at "
+        f"FROM {USERS_SQL} AS u JOIN users_telegrampeer p ON p.id = u.peer_id "
+        f"WHERE {where} ORDER BY u.id"
+    )
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    chunk = []
+    if fmt == "csv":
+        writer.writerow(EXPORT_COLUMNS)
+
+    async with get_pool().acquire() as conn:
+        # курсору нужна транзакция; repeatable read — весь файл из одного снимка
+        async with conn.transaction(isolation="repeatable_read", readonly=True):
+            n = 0
+            async for rec in conn.cursor(sql, *args, prefetch=config.EXPORT_BATCH):
+                if fmt == "csv":
+                    writer.writerow([_export_value(v) for v in rec.values()])
+                else:
+                    chunk.append(orjson.dumps(dict(rec), option=orjson.OPT_UTC_Z) + b"\n")
+                n += 1
+                if n % config.EXPORT_BATCH == 0:
+                    yield _flush(buf, chunk)
+    yield _flush(buf, chunk)
+
+
+def _flush(buf: io.StringIO, chunk: list) -> bytes:
+    if chunk:
+        data = b"".join(chunk)
+        chunk.clear()
+        return data
+    data = buf.getvalue().encode()
+    buf.seek(0)
+    buf.truncate()
+    return data
@@ -0,0 +1,205 @@
+"""
+Тесты сервиса аналитики без Postgres: пул asyncpg подменён FakePool.
+
+Сам сервис Django не импортирует; тесты идут общим `manage.py test` и берут
+токены у rest_framework_simplejwt — так проверяется совместимость с тем, что
+реально выпускает Django.
+"""
+import json
+import unittest
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+
+from django.conf import settings
+from fastapi.testclient import TestClient
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from api import config, queries
+from api.main import app
+
+STATS_URL = "/analytics/processed-users/stats/"
+
+
+class FakeConn:
+    """fetch отдаёт заранее заданные ответы по очереди; cursor — строки выгрузки."""
+
+    def __init__(self, results=(), rows=()):
+        self.results = list(results)
+        self.rows = list(rows)
+        self.queries = []
+
+    async def fetch(self, sql, *args):
+        self.queries.append((sql, args))
+        return self.results.pop(0) if self.results else []
+
+    @asynccontextmanager
+    async def transaction(self, **kwargs):
+        yield
+
+    async def cursor(self, sql, *args, prefetch=None):
+        self.queries.append((sql, args))
+        for row in self.rows:
+            yield row
+
+
+class FakePool:
+    def __init__(self, conn=None, is_active=True):
+        self.conn = conn or FakeConn()
+        self.is_active = is_active
+
+    @asynccontextmanager
+    async def acquire(self):
+        yield self.conn
+
+    async def fetch(self, sql, *args):
+        return await self.conn.fetch(sql, *args)
+
+    async def fetchval(self, sql, *args):
+        return self.is_active
+
+
+def _token(cls=AccessToken, user_id=5, lifetime=None):
+    token = cls()
+    token["user_id"] = user_id
+    if lifetime is not None:
+        token.set_exp(lifetime=lifetime)
+    return str(token)
+
+
+class AnalyticsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.pool = FakePool()
+        for target in ("api.auth.get_pool", "api.queries.get_pool"):
+            patcher = mock.patch(target, return_value=self.pool)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(config, "SECRET_KEY", settings.SECRET_KEY)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # без `with`: lifespan (пул) не запускается
+        self.client = TestClient(app)
+
+    def get(self, url, token=None, **params):
+        headers = {"Authorization": f"Bearer {token}"} if token else {}
+        return self.client.get(url, params=params, headers=headers)
+
+
+class AuthTests(AnalyticsTestCase):
+    def test_access_token_from_django(self):
+        response = self.get(STATS_URL, _token())
+        self.assertEqual(response.status_code, 200, response.text)
+        _, args = self.pool.conn.queries[0]
+        self.assertEqual(args[0], 5)
+
+    def test_rejected_tokens(self):
+        cases = {
+            "no header": None,
+            "expired": _token(lifetime=-timedelta(seconds=1)),
+            "refresh as access": _token(RefreshToken),
+            "garbage": "not-a-jwt",
+        }
+        for name, token in cases.items():
+            with self.subTest(name):
+                response = self.get(STATS_URL, token)
+                self.assertEqual(response.status_code, 401)
+                self.assertEqual(response.headers["www-authenticate"], "Bearer")
+        self.assertEqual(self.pool.conn.queries, [])
+
+    def test_foreign_key_rejected(self):
+        with mock.patch.object(config, "SECRET_KEY", "another-secret-key-of-at-least-32-bytes"):
+            self.assertEqual(self.get(STATS_URL, _token()).status_code, 401)
+
+    def test_inactive_or_deleted_user(self):
+        for is_active in (False, None):
+            with self.subTest(is_active=is_active):
+                self.pool.is_active = is_active
+                self.assertEqual(self.get(STATS_URL, _token()).status_code, 401)
+
+    def test_refuses_to_start_without_secret_key(self):
+        with mock.patch.object(config, "SECRET_KEY", ""), mock.patch("api.main.open_pool") as open_pool:
+            with self.assertRaises(RuntimeError):
+                with TestClient(app):
+                    pass
+        open_pool.assert_not_called()
+
+
+class BuildWhereTests(unittest.TestCase):
+    def test_defaults_to_processed_rows(self):
+        where, args = queries.build_where(5, {})
+        self.assertEqual(where, f"owner_id = $1 AND {queries.PROCESSED_SQL}")
+        self.assertEqual(args, [5])
+
+    def test_filters_and_placeholders(self):
+        where, args = queries.build_where(5, {
+            "source": "@src", "invite_status": "success", "message_status": "sent",
+            "processed_by": 0, "from": "2026-10-01T00:00", "to": "2026-10-02T00:00+03:00",
+        })
+        self.assertEqual(where, (
+            "owner_id = $1 AND source_channel = $2 AND invite_status = $3 AND message_status = $4"
+            f" AND processed_by_id = $5 AND processed_at >= $6 AND processed_at <= $7 AND {queries.PROCESSED_SQL}"
+        ))
+        self.assertEqual(args[:5], [5, "@src", "success", "sent", 0])
+        # наивная дата — в TIME_ZONE (UTC), явный сдвиг сохраняется
+        self.assertEqual(args[5], datetime(2026, 10, 1, tzinfo=timezone.utc))
+        self.assertEqual(args[6].utcoffset(), timedelta(hours=3))
+
+    def test_all_rows_by_created_at(self):
+        where, args = queries.build_where(5, {"only_processed": False, "from": "2026-10-01", "to": "bad"})
+        self.assertEqual(where, "owner_id = $1 AND created_at >= $2")
+        self.assertEqual(len(args), 2)
+
+
+class StatsTests(AnalyticsTestCase):
+    def test_totals_matrix_and_sources(self):
+        self.pool.conn.results = [
+            [
+                {"invite_status": "success", "message_status": "sent", "c": 3},
+                {"invite_status": "failed", "message_status": "pending", "c": 2},
+                {"invite_status": "pending", "message_status": "failed", "c": 1},
+            ],
+            [
+                {"source_channel": "@a", "total": 4, "success": 3, "sent": 3, "failed": 1},
+                {"source_channel": "@b", "total": 2, "success": 0, "sent": 0, "failed": 2},
+            ],
+        ]
+        data = self.get(STATS_URL, _token()).json()
+        self.assertEqual(data["total"], 6)
+        self.assertEqual(data["invite"], {"pending": 1, "success": 3, "failed": 2})
+        self.assertEqual(data["message"], {"pending": 2, "sent": 3, "failed": 1})
+        self.assertEqual(data["failed"], 3)
+        self.assertEqual(data["matrix"]["success"], {"sent": 3})
+        self.assertEqual([(s["source_channel"], s["cr"]) for s in data["by_source"]], [("@a", 0.75), ("@b", 0)])
+
+    def test_source_ties_ordered_like_django(self):
+        self.get(STATS_URL, _token())
+        sql, _ = self.pool.conn.queries[1]
+        self.assertIn('ORDER BY total DESC, source_channel COLLATE "C" LIMIT 20', sql)
+
+
+class ExportTests(AnalyticsTestCase):
+    ROW = {
+        "id": 1, "user_id": 42, "username": "u", "name": "N", "phone": "", "source_channel": "@a",
+        "invite_status": "success", "message_status": "sent", "invite_error_code": None,
+        "message_error_code": None, "processed_by_id": 3,
+        "processed_at": datetime(2026, 10, 1, 12, tzinfo=timezone.utc), "created_at": datetime(2026, 9, 1, tzinfo=timezone.utc),
+    }
+
+    def test_csv(self):
+        self.pool.conn.rows = [self.ROW, {**self.ROW, "id": 2}]
+        response = self.get("/analytics/processed-users/export/", _token(), format="csv")
+        self.assertEqual(response.status_code, 200)
+        lines = response.text.splitlines()
+        self.assertEqual(lines[0].split(","), queries.EXPORT_COLUMNS)
+        self.assertEqual(len(lines), 3)
+        self.assertIn("2026-10-01T12:00:00+00:00", lines[1])
+
+    def test_ndjson(self):
+        self.pool.conn.rows = [self.ROW]
+        response = self.get("/analytics/processed-users/export/", _token(), format="ndjson")
+        self.assertEqual(response.headers["content-type"], "application/x-ndjson")
+        row = json.loads(response.text.splitlines()[0])
+        self.assertEqual((row["user_id"], row["processed_at"]), (42, "2026-10-01T12:00:00Z"))
+
+    def test_unknown_format_rejected(self):
+        self.assertEqual(self.get("/analytics/processed-users/export/", _token(), format="xlsx").status_code, 422)
@@ -0,0 +1,94 @@
+"""
+Общий кэш последних сообщений исходного канала пересылки.
+
+Раньше каждая ForwardingTask сама тянула get_messages(source) — десять задач
+с одним источником делали десять одинаковых запросов за тик. Теперь список
+последних сообщений источника лежит в Redis (tm:fwd:src:<источник>) и общий
+для всех задач и аккаунтов: id сообщений в канале одинаковы для всех, кто его
+видит, а пересылать можно по id (forward_messages(..., from_peer=источник)).
+
+Кэш свежее FORWARD_SOURCE_CACHE_SECONDS отдаётся без RPC; устаревший
+дополняется инкрементально — fetch(min_id=последний известный id) вернёт
+только новые сообщения. Раз в FORWARD_SOURCE_FULL_REFRESH_SECONDS кэш
+перечитывается целиком, чтобы выпали удалённые сообщения.
+
+    cache = SourceMessages(task.source_channel)
+    entries = cache.get(lambda min_id: client.get_messages(task.source_channel, limit=cache.keep, min_id=min_id))
+    # [{"id": 812, "text": True}, ...] — от новых к старым
+
+Без Redis fetch вызывается каждый раз, как до кэша.
+"""
+import json
+import time
+
+import redis
+from django.conf import settings
+
+from accounts.leases import get_redis
+
+SOURCE_KEY = "tm:fwd:src:{}"
+
+
+def source_key(source) -> str:
+    """@Chan, chan, https://t.me/chan — один источник."""
+    s = str(source).strip().lower()
+    for prefix in ("https://", "http://", "t.me/", "@"):
+        if s.startswith(prefix):
+            s = s[len(prefix):]
+    return SOURCE_KEY.format(s)
+
+
+class SourceMessages:
+    def __init__(self, source, ttl: float | None = None, keep: int | None = None):
+        self.key = source_key(source)
+        self.ttl = float(settings.FORWARD_SOURCE_CACHE_SECONDS if ttl is None else ttl)
+        self.keep = int(keep or settings.FORWARD_SOURCE_CACHE_KEEP)
+        self.full_refresh = float(settings.FORWARD_SOURCE_FULL_REFRESH_SECONDS)
+
+    def _load(self) -> dict | None:
+        raw = get_redis().get(self.key)
+        if not raw:
+            return None
+        try:
+            return json.loads(raw)
+        except ValueError:
+            return None
+
+    def get(self, fetch) -> list[dict] | None:
+        """
+        fetch(min_id) -> сообщения Telethon (новые первыми) или None, если
+        источник недоступен. Возвращает [{"id", "text"}] или None.
+        """
+        try:
+            cached = self._load()
+        except redis.RedisError:
+            return self._entries(fetch(0))
+
+        now = time.time()
+        if cached and now - cached["fetched_at"] < self.ttl:
+            return cached["messages"]
+
+        full = not cached or now - cached.get("full_at", 0) >= self.full_refresh
+        fresh = self._entries(fetch(0 if full else cached["last_id"]))
+        if fresh is None:
+            # источник недоступен этому аккаунту — его задаче нечего пересылать, кэш не трогаем
+            return None
+
+        messages = fresh if full else (fresh + cached["messages"])[:self.keep]
+        state = {
+            "messages": messages,
+            "last_id": max([m["id"] for m in messages], default=0),
+            "fetched_at": now,
+            "full_at": now if full else cached["full_at"],
+        }
+        try:
+            get_redis().set(self.key, json.dumps(state), ex=int(self.full_refresh) + 60)
+        except redis.RedisError:
+            pass
+        return messages
+
+    @staticmethod
+    def _entries(messages) -> list[dict] | None:
+        if messages is None:
+            return None
+        return [{"id": m.id, "text": bool(m.message)} for m in messages if m]
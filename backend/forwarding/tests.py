@@ -1,3 +1,116 @@
-from django.test import TestCase
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.db import connection
+from django.test import SimpleTestCase
+from django.test.utils import CaptureQueriesContext
+
+from accounts.memberships import remember
+from accounts.tasks import process_forwarding_tasks
+from accounts.tests import EndpointPerfTestCase, PERF_REPEAT
+from forwarding.models import ForwardingGroup, ForwardingTask
+from forwarding.source_cache import SourceMessages, source_key
+
+
+class ForwardingEndpointPerfTests(EndpointPerfTestCase):
+    def setUp(self):
+        super().setUp()
+        self.patch("forwarding.views.revoke")
+        self.patch("forwarding.views.process_forwarding_task_by_id.delay", return_value=SimpleNamespace(id="perf-task"))
+        self.group_ids = list(ForwardingGroup.objects.filter(user=self.owner).values_list("id", flat=True))
+
+    def test_groups(self):
+        self.assertEndpoint("get", "/api/forwarding/groups/", max_queries=2)
+        self.assertEndpoint(
+            "post", "/api/forwarding/groups/", max_queries=3, status=201,
+            data=lambda i: {"username": f"@perf_new{i}"},
+        )
+
+    def test_group_detail(self):
+        gid = self.group_ids[0]
+        self.assertEndpoint("get", f"/api/forwarding/groups/{gid}/", max_queries=2)
+        self.assertEndpoint("patch", f"/api/forwarding/groups/{gid}/", max_queries=3, data={"title": "perf"})
+        self.assertEndpoint("post", f"/api/forwarding/groups/{gid}/disable/", max_queries=3)
+        self.assertEndpoint("post", f"/api/forwarding/groups/{gid}/enable/", max_queries=3)
+
+    def test_group_delete(self):
+        ids = self.group_ids[-PERF_REPEAT:]
+        self.assertEndpoint("delete", lambda i: f"/api/forwarding/groups/{ids[i]}/", max_queries=4, status=204)
+
+    def test_tasks(self):
+        self.assertEndpoint("get", "/api/forwarding/tasks/", max_queries=3)
+        self.assertEndpoint(
+            "post", "/api/forwarding/tasks/", max_queries=10, status=201,
+            data=lambda i: {
+                "account": self.account_ids[i], "source_channel": f"@perf_new{i}",
+                "target_groups": self.group_ids[:3],
+            },
+        )
+
+    def test_task_detail_and_stop(self):
+        ids = list(ForwardingTask.objects.filter(user=self.owner).values_list("id", flat=True)[:PERF_REPEAT])
+        self.assertEndpoint("get", f"/api/forwarding/tasks/{ids[0]}/", max_queries=3)
+        self.assertEndpoint("post", lambda i: f"/api/forwarding/tasks/{ids[i]}/stop/", max_queries=3)
+
+    def test_beat_cycle_connects_once_per_account(self):
+        extra = ForwardingTask.objects.create(user=self.owner, account_id=self.account_ids[0], source_channel="@perf_extra")
+        extra.target_groups.set(self.group_ids[:2])
+        client_cls = self.patch("telethon.sync.TelegramClient")
+        self.patch("accounts.tasks.AccountLease")
+        self.patch("accounts.tasks.SourceMessages").return_value.get.return_value = [{"id": 1, "text": True}]
+        active = ForwardingTask.objects.filter(is_active=True)
+        n_tasks, n_accounts = active.count(), active.values("account").distinct().count()
+        # аккаунты уже во всех источниках и группах — вступать никуда не нужно
+        for task in active.prefetch_related("target_groups"):
+            remember(task.account_id, task.source_channel, *(g.username for g in task.target_groups.all()))
+
+        self.patch("accounts.events.logger.disabled", new=True)  # JSON-журнал тика не нужен в выводе тестов
+        with CaptureQueriesContext(connection) as ctx:
+            process_forwarding_tasks()
+
+        self.assertEqual(client_cls.call_count, n_accounts)
+        client_cls.return_value.assert_not_called()  # ни одного JoinChannelRequest
+        # задачи + активные группы одним запросом + членства по запросу на аккаунт + UPDATE last_sent_at на задачу
+        self.assertEqual(len(ctx.captured_queries), 2 + n_accounts + n_tasks)
+        self.assertFalse(active.filter(last_sent_at__isnull=True).exists())
+
+
+class SourceMessagesTests(SimpleTestCase):
+    def setUp(self):
+        store = {}
+        self.redis = mock.Mock()
+        self.redis.get.side_effect = store.get
+        self.redis.set.side_effect = lambda key, value, ex=None: store.__setitem__(key, value)
+        patcher = mock.patch("forwarding.source_cache.get_redis", return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.channel = [SimpleNamespace(id=i, message=f"m{i}" if i % 2 else None) for i in range(10, 0, -1)]
+
+    def fetch(self, min_id):
+        self.calls.append(min_id)
+        return [m for m in self.channel if m.id > min_id][:5]
+
+    def test_shared_between_tasks_of_one_source(self):
+        self.calls = []
+        first = SourceMessages("@Source").get(self.fetch)
+        second = SourceMessages("https://t.me/source").get(self.fetch)
+        self.assertEqual(self.calls, [0])
+        self.assertEqual(first, second)
+        self.assertEqual([m["id"] for m in first], [10, 9, 8, 7, 6])
+        self.assertEqual(source_key("@Source"), "tm:fwd:src:source")
+
+    def test_stale_cache_fetches_only_new_messages(self):
+        self.calls = []
+        SourceMessages("source").get(self.fetch)
+        self.channel = [SimpleNamespace(id=12, message="new"), SimpleNamespace(id=11, message=None)] + self.channel
+        messages = SourceMessages("source", ttl=0, keep=5).get(self.fetch)
+        self.assertEqual(self.calls, [0, 10])
+        self.assertEqual([m["id"] for m in messages], [12, 11, 10, 9, 8])
+        self.assertEqual(messages[0], {"id": 12, "text": True})
+
+    def test_unavailable_source_keeps_cache(self):
+        self.calls = []
+        SourceMessages("source").get(self.fetch)
+        self.assertIsNone(SourceMessages("source", ttl=0).get(lambda min_id: None))
+        self.assertEqual(len(SourceMessages("source").get(self.fetch)), 5)
+        self.assertEqual(self.calls, [0])
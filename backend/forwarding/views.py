@@ -53,7 +53,21 @@ class ForwardingTaskListCreateView(generics.ListCreateAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return self.queryset.filter(user=self.request.user)
+        # target_groups сериализуется списком id — без prefetch это запрос на каждую задачу
+        return self.queryset.filter(user=self.request.user).prefetch_related('target_groups')
+
+    def list(self, request, *args, **kwargs):
+        # те же поля, что у ForwardingTaskSerializer ('__all__'), строками .values();
+        # target_groups — списки id одним запросом к M2M-таблице
+        fields = [f.name for f in ForwardingTask._meta.concrete_fields]
+        tasks = list(ForwardingTask.objects.filter(user=request.user).values(*fields))
+        groups = {}
+        links = ForwardingTask.target_groups.through.objects.filter(forwardingtask__user=request.user)
+        for task_id, group_id in links.values_list('forwardingtask_id', 'forwardinggroup_id'):
+            groups.setdefault(task_id, []).append(group_id)
+        for task in tasks:
+            task['target_groups'] = groups.get(task['id'], [])
+        return Response(tasks)
 
     def perform_create(self, serializer):
         task = serializer.save(user=self.request.user)
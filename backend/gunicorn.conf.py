@@ -0,0 +1,18 @@
+"""
+Конфиг gunicorn (подхватывается из рабочего каталога /app, см. CMD в Dockerfile).
+
+Метрики web-процессов лежат в PROMETHEUS_MULTIPROC_DIR (telemanager_django/metrics.py):
+файлы прошлого запуска удаляются на старте мастера, иначе их счётчики суммируются
+при каждом скрейпе, а файлы мёртвых pid копятся.
+"""
+
+
+def on_starting(server):
+    from telemanager_django.metrics import clear_multiproc_dir
+    clear_multiproc_dir()
+
+
+def child_exit(server, worker):
+    # как worker_process_shutdown у Celery (telemanager_django/celery.py)
+    from telemanager_django.metrics import mark_process_dead
+    mark_process_dead(worker.pid)
@@ -1,5 +1,6 @@
 import os
 from celery import Celery
+from celery.signals import worker_init, worker_process_shutdown
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'telemanager_django.settings')
 
@@ -12,3 +13,16 @@ app.autodiscover_tasks()
 @app.task(bind=True)
 def debug_task(self):
     print(f'Request: {self.request!r}')
+
+
+@worker_init.connect
+def _start_metrics_server(**kwargs):
+    # /metrics воркера: главный процесс отдаёт метрики всех prefork-детей
+    from telemanager_django.metrics import start_worker_metrics_server
+    start_worker_metrics_server(int(os.environ.get('CELERY_METRICS_PORT', '9808')))
+
+
+@worker_process_shutdown.connect
+def _mark_metrics_process_dead(pid=None, **kwargs):
+    from telemanager_django.metrics import mark_process_dead
+    mark_process_dead(pid or os.getpid())
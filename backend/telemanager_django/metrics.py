@@ -0,0 +1,141 @@
+"""
+Prometheus-метрики задач Telegram.
+
+Наружу метрики не публикуются: в них id аккаунтов и объёмы задач. Процессы web
+пишут в PROMETHEUS_MULTIPROC_DIR, а отдаёт их отдельный сервер на внутреннем
+порту (manage.py metrics_server, сервис web_metrics в docker-compose.dev.yml);
+каждый воркер Celery — на своём порту CELERY_METRICS_PORT (см. telemanager_django/celery.py).
+Prefork-воркеры и несколько процессов uvicorn/gunicorn пишут в общий каталог
+PROMETHEUS_MULTIPROC_DIR, откуда метрики собираются при скрейпе.
+"""
+import os
+import time
+from contextlib import contextmanager
+
+_MULTIPROC_DIR = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+if _MULTIPROC_DIR:
+    os.makedirs(_MULTIPROC_DIR, exist_ok=True)
+
+try:
+    from prometheus_client import (
+        CollectorRegistry, Counter, Histogram, REGISTRY,
+        make_wsgi_app, multiprocess, start_http_server,
+    )
+except Exception:
+    Counter = Histogram = None
+
+# Бакеты под MTProto: от десятков миллисекунд до минутных FloodWait/ожиданий токена
+RPC_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60)
+WAIT_BUCKETS = (1, 5, 10, 30, 60, 120, 300, 600, 1800)
+DB_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)
+
+
+class _Noop:
+    """Заглушка, если prometheus_client не установлен."""
+    def labels(self, *args, **kwargs):
+        return self
+
+    def inc(self, *args, **kwargs):
+        pass
+
+    def observe(self, *args, **kwargs):
+        pass
+
+
+def _counter(name, doc, labels):
+    return Counter(name, doc, labels) if Counter else _Noop()
+
+
+def _histogram(name, doc, labels, buckets):
+    return Histogram(name, doc, labels, buckets=buckets) if Histogram else _Noop()
+
+
+# action: invite | message | forward
+ATTEMPTS = _counter(
+    "tm_telegram_attempts_total", "Попытки инвайта/сообщения/пересылки",
+    ["action", "account", "task"],
+)
+RESULTS = _counter(
+    "tm_telegram_results_total", "Итог попытки: ok или failed с кодом ошибки",
+    ["action", "account", "task", "result", "error_code"],
+)
+FLOOD_WAIT_SECONDS = _counter(
+    "tm_flood_wait_seconds_total", "Сумма FloodWait, выданных Telegram",
+    ["account", "task"],
+)
+RPC_LATENCY = _histogram(
+    "tm_telegram_rpc_seconds", "Длительность RPC к Telegram",
+    ["method", "account", "task"], RPC_BUCKETS,
+)
+DB_FLUSH_LATENCY = _histogram(
+    "tm_db_flush_seconds", "Запись результатов пачки в БД",
+    ["task"], DB_BUCKETS,
+)
+TOKEN_WAIT = _histogram(
+    "tm_token_bucket_wait_seconds", "Ожидание токена send/invite",
+    ["bucket", "account", "task"], WAIT_BUCKETS,
+)
+
+
+@contextmanager
+def timed(histogram, **labels):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.labels(**labels).observe(time.perf_counter() - start)
+
+
+def record_result(action, account_id, task, error_code=None, n=1):
+    if n <= 0:
+        return
+    RESULTS.labels(
+        action=action, account=str(account_id), task=task,
+        result="failed" if error_code else "ok", error_code=error_code or "",
+    ).inc(n)
+
+
+def _registry():
+    if _MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
+
+
+def serve_web_metrics(port: int, addr: str = "0.0.0.0"):
+    """Блокирующий сервер метрик web-процессов (собирает их из PROMETHEUS_MULTIPROC_DIR)."""
+    from wsgiref.simple_server import WSGIRequestHandler, make_server
+
+    class _Quiet(WSGIRequestHandler):
+        def log_message(self, *args):  # скрейп каждые 15 с — не в лог
+            pass
+
+    if Counter is None:
+        raise RuntimeError("prometheus_client не установлен")
+    if not _MULTIPROC_DIR:
+        raise RuntimeError("PROMETHEUS_MULTIPROC_DIR не задан: метрик web-процессов здесь не видно")
+    make_server(addr, port, make_wsgi_app(_registry()), handler_class=_Quiet).serve_forever()
+
+
+def start_worker_metrics_server(port: int):
+    if Counter is None or not port:
+        return
+    start_http_server(port, registry=_registry())
+
+
+def clear_multiproc_dir():
+    """
+    Удалить файлы метрик прошлых запусков. Звать только там, где ещё не пишет ни
+    один процесс этого каталога: мастер gunicorn в on_starting (gunicorn.conf.py).
+    """
+    if not _MULTIPROC_DIR:
+        return
+    for name in os.listdir(_MULTIPROC_DIR):
+        if name.endswith(".db"):
+            os.remove(os.path.join(_MULTIPROC_DIR, name))
+
+
+def mark_process_dead(pid):
+    if Counter is not None and _MULTIPROC_DIR:
+        multiprocess.mark_process_dead(pid)
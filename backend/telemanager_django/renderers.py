@@ -0,0 +1,32 @@
+"""
+JSON-рендерер DRF на orjson.
+
+Большие списки (processed-users, аккаунты, задачи пересылки) отдаются строками
+.values(), а не сериализаторами — основное время ответа уходит в json.dumps.
+orjson делает то же в разы быстрее и сам понимает datetime/date/UUID; остальное
+(Decimal, ленивые строки, QuerySet) — через JSONEncoder DRF, как раньше.
+
+Формат совпадает с DRF: datetime в ISO 8601 с "Z" для UTC.
+Без установленного orjson работает обычный JSONRenderer.
+"""
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+_default = JSONEncoder().default
+
+
+class OrjsonRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None:
+            return super().render(data, accepted_media_type, renderer_context)
+        if data is None:
+            return b""
+        option = orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS
+        if self.get_indent(accepted_media_type, renderer_context or {}):
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(data, default=_default, option=option)
@@ -1,4 +1,6 @@
+from django.conf import settings
 from django.contrib import admin
+from django.contrib.staticfiles.urls import staticfiles_urlpatterns
 from django.urls import path, include
 
 urlpatterns = [
@@ -7,3 +9,7 @@ urlpatterns = [
     path('api/accounts/', include('accounts.urls')),
     path('api/forwarding/', include('forwarding.urls')),
 ]
+
+if settings.DEBUG:
+    # uvicorn, в отличие от runserver, статику админки сам не отдаёт
+    urlpatterns += staticfiles_urlpatterns()
@@ -0,0 +1,55 @@
+"""
+Архив обработанных строк TelegramUser.
+
+TelegramUser только растёт: каждый собранный и обработанный пользователь
+остаётся в одной таблице навсегда, и очереди с аналитикой читают всю историю.
+archive_processed() переносит в TelegramUserArchive строки, которые ни одна
+очередь больше не возьмёт (ни инвайт, ни рассылка не pending/processing) и
+которые не менялись TELEGRAM_USER_ARCHIVE_DAYS дней. Пачками по
+TELEGRAM_USER_ARCHIVE_BATCH: INSERT в архив и DELETE из горячей таблицы в одной
+транзакции, строки — с SKIP LOCKED, чтобы не ждать задачи.
+
+Сводки (users/views.py, api/queries.py) считают по обеим таблицам; повторно
+собрать архивного пользователя обучение не даст (UserWriter.unknown смотрит и архив).
+
+    archive_processed_users_task  # beat, раз в час
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from users.models import TelegramUser, TelegramUserArchive
+
+# поля TelegramUser, которые переезжают в архив (archived_at проставит сам архив)
+ARCHIVE_FIELDS = [f.attname for f in TelegramUserArchive._meta.concrete_fields if f.name != "archived_at"]
+
+# ни одна очередь строку больше не возьмёт
+DONE_Q = ~Q(invite_status__in=["pending", "processing"]) & ~Q(message_status__in=["pending", "processing"])
+
+
+def archivable(cutoff):
+    return TelegramUser.objects.filter(DONE_Q).filter(
+        Q(updated_at__lt=cutoff) | Q(updated_at__isnull=True, created_at__lt=cutoff)
+    )
+
+
+def archive_processed(days: int | None = None, batch: int | None = None) -> int:
+    """Переносит старые обработанные строки в архив; возвращает, сколько перенесено."""
+    cutoff = timezone.now() - timedelta(days=int(days or settings.TELEGRAM_USER_ARCHIVE_DAYS))
+    batch = int(batch or settings.TELEGRAM_USER_ARCHIVE_BATCH)
+    moved = 0
+    while True:
+        with transaction.atomic():
+            rows = list(
+                archivable(cutoff).order_by("id")
+                .select_for_update(skip_locked=True).values(*ARCHIVE_FIELDS)[:batch]
+            )
+            if not rows:
+                return moved
+            # ignore_conflicts: тот же (owner, peer) мог уже лежать в архиве — горячую копию всё равно убираем
+            TelegramUserArchive.objects.bulk_create([TelegramUserArchive(**r) for r in rows], ignore_conflicts=True)
+            TelegramUser.objects.filter(pk__in=[r["id"] for r in rows]).delete()
+        moved += len(rows)
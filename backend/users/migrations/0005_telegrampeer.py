@@ -0,0 +1,125 @@
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, F, OuterRef, Subquery
+
+BATCH = 5000
+
+
+def fill_peers(apps, schema_editor):
+    TelegramUser = apps.get_model('users', 'TelegramUser')
+    TelegramPeer = apps.get_model('users', 'TelegramPeer')
+    rows = TelegramUser.objects.values_list('user_id', 'username', 'name', 'phone').order_by('id')
+    batch = []
+    for user_id, username, name, phone in rows.iterator(chunk_size=BATCH):
+        batch.append(TelegramPeer(id=user_id, username=username, name=name, phone=phone))
+        if len(batch) >= BATCH:
+            TelegramPeer.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    if batch:
+        TelegramPeer.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def link_peers(apps, schema_editor):
+    TelegramUser = apps.get_model('users', 'TelegramUser')
+    TelegramUser.objects.update(peer_id=F('user_id'))
+
+
+def unlink_peers(apps, schema_editor):
+    """
+    Обратно: user_id/username/name/phone из справочника — одним UPDATE по всей таблице.
+    Вызывается, когда user_id уже вернулся nullable и без unique; ограничения
+    затягивает следующий (обратный) AlterField.
+    """
+    TelegramUser = apps.get_model('users', 'TelegramUser')
+    TelegramPeer = apps.get_model('users', 'TelegramPeer')
+    shared = (
+        TelegramUser.objects.values('peer_id').annotate(n=Count('id')).filter(n__gt=1).values_list('peer_id', flat=True)[:5]
+    )
+    if shared:
+        # до разделения user_id был уникален глобально — одного пользователя у двух владельцев старая схема не держит
+        raise RuntimeError(f"Откат невозможен: пользователи {list(shared)} есть у нескольких владельцев")
+    peer = TelegramPeer.objects.filter(id=OuterRef('peer_id'))
+    TelegramUser.objects.update(
+        user_id=F('peer_id'),
+        username=Subquery(peer.values('username')[:1]),
+        name=Subquery(peer.values('name')[:1]),
+        phone=Subquery(peer.values('phone')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_alter_telegramuser_options_telegramuser_created_at_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TelegramPeer',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('username', models.CharField(blank=True, max_length=150, null=True)),
+                ('name', models.CharField(blank=True, max_length=255, null=True)),
+                ('phone', models.CharField(blank=True, max_length=50, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(fill_peers, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name='telegramuser',
+            name='peer',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='memberships', to='users.telegrampeer'),
+        ),
+        migrations.RunPython(link_peers, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='telegramuser',
+            name='peer',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='memberships', to='users.telegrampeer'),
+        ),
+        # перед удалением user_id снимаем NOT NULL и unique: при откате поле вернётся
+        # таким, unlink_peers заполнит его, и только потом ограничения вернутся обратно
+        migrations.AlterField(
+            model_name='telegramuser',
+            name='user_id',
+            field=models.BigIntegerField(null=True),
+        ),
+        migrations.RunPython(migrations.RunPython.noop, unlink_peers),
+        migrations.RemoveField(
+            model_name='telegramuser',
+            name='user_id',
+        ),
+        migrations.RemoveField(
+            model_name='telegramuser',
+            name='username',
+        ),
+        migrations.RemoveField(
+            model_name='telegramuser',
+            name='name',
+        ),
+        migrations.RemoveField(
+            model_name='telegramuser',
+            name='phone',
+        ),
+        migrations.AlterUniqueTogether(
+            name='telegramuser',
+            unique_together={('owner', 'peer')},
+        ),
+        migrations.RemoveIndex(
+            model_name='telegramuser',
+            name='users_teleg_owner_i_3432e6_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='telegramuser',
+            name='users_teleg_owner_i_804f64_idx',
+        ),
+        migrations.AddIndex(
+            model_name='telegramuser',
+            index=models.Index(fields=['owner', 'invite_status', 'id'], name='users_teleg_owner_i_c94926_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='telegramuser',
+            index=models.Index(fields=['owner', 'message_status', 'id'], name='users_teleg_owner_i_041c3a_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.7 on 2026-10-19 14:18
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0006_trainingcheckpoint'),
+        ('users', '0005_telegrampeer'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='telegramuser',
+            name='users_teleg_owner_i_c94926_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='telegramuser',
+            name='users_teleg_owner_i_041c3a_idx',
+        ),
+        migrations.AddIndex(
+            model_name='telegramuser',
+            index=models.Index(condition=models.Q(('invite_status', 'pending')), fields=['owner', 'id'], name='tguser_invite_pending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='telegramuser',
+            index=models.Index(condition=models.Q(('message_status', 'pending')), fields=['owner', 'id'], name='tguser_message_pending_idx'),
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.7 on 2026-10-19 14:21
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def lease_stuck_rows(apps, schema_editor):
+    # строки, застрявшие в processing до аренд: даём им обычный срок — если их
+    # никто не доделает, сборщик вернёт их в pending
+    TelegramUser = apps.get_model('users', 'TelegramUser')
+    expires = timezone.now() + timedelta(seconds=settings.CLAIM_LEASE_SECONDS)
+    TelegramUser.objects.filter(invite_status='processing').update(invite_lease_expires_at=expires)
+    TelegramUser.objects.filter(message_status='processing').update(message_lease_expires_at=expires)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0006_trainingcheckpoint'),
+        ('users', '0006_pending_queue_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='telegramuser',
+            name='invite_claimed_by',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='telegramuser',
+            name='invite_lease_expires_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='telegramuser',
+            name='message_claimed_by',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='telegramuser',
+            name='message_lease_expires_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='telegramuser',
+            index=models.Index(condition=models.Q(('invite_status', 'processing')), fields=['invite_lease_expires_at'], name='tguser_invite_lease_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='telegramuser',
+            index=models.Index(condition=models.Q(('message_status', 'processing')), fields=['message_lease_expires_at'], name='tguser_message_lease_idx'),
+        ),
+        migrations.RunPython(lease_stuck_rows, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.7 on 2026-10-19 14:56
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0008_proxy_health'),
+        ('users', '0007_row_claims'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TelegramUserArchive',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('source_channel', models.CharField(blank=True, max_length=255, null=True)),
+                ('invite_status', models.CharField(max_length=20)),
+                ('message_status', models.CharField(max_length=20)),
+                ('invite_error_code', models.CharField(blank=True, max_length=64, null=True)),
+                ('message_error_code', models.CharField(blank=True, max_length=64, null=True)),
+                ('created_at', models.DateTimeField(blank=True, null=True)),
+                ('invite_changed_at', models.DateTimeField(blank=True, null=True)),
+                ('message_changed_at', models.DateTimeField(blank=True, null=True)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('owner', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='archived_telegram_users', to=settings.AUTH_USER_MODEL)),
+                ('peer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_memberships', to='users.telegrampeer')),
+                ('processed_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_users', to='accounts.telegramaccount')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['owner', 'processed_at'], name='users_teleg_owner_i_e04858_idx')],
+                'unique_together': {('owner', 'peer')},
+            },
+        ),
+    ]
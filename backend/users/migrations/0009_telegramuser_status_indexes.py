@@ -0,0 +1,24 @@
+# Generated by Django 5.2.7 on 2026-10-19 15:13
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0008_proxy_health'),
+        ('users', '0008_telegramuser_archive'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='telegramuser',
+            index=models.Index(fields=['owner', 'invite_status'], name='tguser_owner_invite_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='telegramuser',
+            index=models.Index(fields=['owner', 'message_status'], name='tguser_owner_message_idx'),
+        ),
+    ]
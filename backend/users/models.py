@@ -2,11 +2,24 @@ from django.db import models
 from django.contrib.auth.models import User
 from django.utils import timezone
 
-class TelegramUser(models.Model):
-    user_id = models.BigIntegerField(unique=True)
+class TelegramPeer(models.Model):
+    """
+    Общий справочник пользователей Telegram: одна строка на Telegram id,
+    сколько бы владельцев его ни собрали. Статусы — в TelegramUser.
+    """
+    id = models.BigIntegerField(primary_key=True)  # Telegram user id
     username = models.CharField(max_length=150, blank=True, null=True)
     name = models.CharField(max_length=255, blank=True, null=True)
     phone = models.CharField(max_length=50, blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.username or str(self.id)
+
+
+class TelegramUser(models.Model):
+    """Пользователь в базе конкретного владельца: откуда собран и статусы инвайта/рассылки."""
+    peer = models.ForeignKey(TelegramPeer, on_delete=models.CASCADE, related_name='memberships')
     source_channel = models.CharField(max_length=255, blank=True, null=True)
 
     invite_status = models.CharField(
@@ -31,6 +44,13 @@ class TelegramUser(models.Model):
     invite_error_code = models.CharField(max_length=64, blank=True, null=True)
     message_error_code = models.CharField(max_length=64, blank=True, null=True)
 
+    # аренда строки задачей (accounts/claims.py): id задачи и срок; истёкшие
+    # "processing" возвращает в pending reap_expired_claims_task
+    invite_claimed_by = models.CharField(max_length=64, blank=True, null=True)
+    invite_lease_expires_at = models.DateTimeField(null=True, blank=True)
+    message_claimed_by = models.CharField(max_length=64, blank=True, null=True)
+    message_lease_expires_at = models.DateTimeField(null=True, blank=True)
+
     # NEW: кто обрабатывал (по желанию; закомментируй если ещё нет модели)
     processed_by = models.ForeignKey(
         'accounts.TelegramAccount',
@@ -42,7 +62,7 @@ class TelegramUser(models.Model):
                               related_name="telegram_users", null=True, blank=True)
 
     def __str__(self):
-        return self.username or str(self.user_id)
+        return f"{self.owner_id}:{self.peer_id}"
 
     @property
     def processed(self) -> bool:
@@ -77,19 +97,78 @@ class TelegramUser(models.Model):
         if self.processed and not self.processed_at:
             self.processed_at = now
 
+        # строка ушла из processing — аренда задачи на неё больше не нужна
+        update_fields = kwargs.get('update_fields')
+        for queue in ('invite', 'message'):
+            if getattr(self, f'{queue}_status') == 'processing' or not getattr(self, f'{queue}_claimed_by'):
+                continue
+            setattr(self, f'{queue}_claimed_by', None)
+            setattr(self, f'{queue}_lease_expires_at', None)
+            if update_fields is not None and f'{queue}_status' in update_fields:
+                update_fields = [*update_fields, f'{queue}_claimed_by', f'{queue}_lease_expires_at']
+        if update_fields is not None:
+            kwargs['update_fields'] = update_fields
+
         super().save(*args, **kwargs)
 
     class Meta:
         ordering = ['-id']
+        # один Telegram-пользователь — по строке на каждого владельца, собравшего его
+        unique_together = ('owner', 'peer')
         indexes = [
-            models.Index(fields=['owner','invite_status']),
-            models.Index(fields=['owner','message_status']),
+            # очереди задач (WHERE owner=? AND status='pending' ORDER BY id): частичные
+            # индексы держат только ждущие строки и не растут вместе с историей
+            models.Index(fields=['owner','id'], condition=models.Q(invite_status='pending'),
+                         name='tguser_invite_pending_idx'),
+            models.Index(fields=['owner','id'], condition=models.Q(message_status='pending'),
+                         name='tguser_message_pending_idx'),
+            # сводки и список фильтруют и по остальным статусам (success/sent/failed)
+            models.Index(fields=['owner','invite_status'], name='tguser_owner_invite_idx'),
+            models.Index(fields=['owner','message_status'], name='tguser_owner_message_idx'),
+            # сборщик истёкших аренд: только строки в processing
+            models.Index(fields=['invite_lease_expires_at'], condition=models.Q(invite_status='processing'),
+                         name='tguser_invite_lease_idx'),
+            models.Index(fields=['message_lease_expires_at'], condition=models.Q(message_status='processing'),
+                         name='tguser_message_lease_idx'),
             models.Index(fields=['owner','source_channel']),
             models.Index(fields=['owner','processed_at']),
             models.Index(fields=['created_at']),
         ]
 
 
+class TelegramUserArchive(models.Model):
+    """
+    Обработанные строки TelegramUser старше TELEGRAM_USER_ARCHIVE_DAYS (users/archive.py).
+    Горячая таблица остаётся размером с текущую работу; статистика читает обе.
+    Только поля, нужные сводкам и выгрузке: без аренды и updated_at, id — прежний.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    peer = models.ForeignKey(TelegramPeer, on_delete=models.CASCADE, related_name='archived_memberships')
+    owner = models.ForeignKey(User, on_delete=models.CASCADE,
+                              related_name="archived_telegram_users", null=True, blank=True)
+    source_channel = models.CharField(max_length=255, blank=True, null=True)
+    invite_status = models.CharField(max_length=20)
+    message_status = models.CharField(max_length=20)
+    invite_error_code = models.CharField(max_length=64, blank=True, null=True)
+    message_error_code = models.CharField(max_length=64, blank=True, null=True)
+    processed_by = models.ForeignKey(
+        'accounts.TelegramAccount', on_delete=models.SET_NULL,
+        null=True, blank=True, related_name='archived_users',
+    )
+    created_at = models.DateTimeField(null=True, blank=True)
+    invite_changed_at = models.DateTimeField(null=True, blank=True)
+    message_changed_at = models.DateTimeField(null=True, blank=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        # тот же ключ, что у TelegramUser: обучение не соберёт архивного пользователя заново
+        unique_together = ('owner', 'peer')
+        indexes = [
+            models.Index(fields=['owner', 'processed_at']),
+        ]
+
+
 class TrainingChannel(models.Model):
     CHANNEL_TYPE_CHOICES = [
         ('group', 'Group'),
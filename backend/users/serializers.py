@@ -1,5 +1,5 @@
 from django.contrib.auth.models import User
-from .models import TelegramUser, TrainingChannel
+from .models import TelegramPeer, TelegramUser, TelegramUserArchive, TrainingChannel
 from rest_framework import serializers
 
 
@@ -20,9 +20,32 @@ class RegisterSerializer(serializers.ModelSerializer):
 
 
 class TelegramUserSerializer(serializers.ModelSerializer):
+    # поля справочника TelegramPeer — API остаётся плоским, как до его выделения
+    user_id = serializers.IntegerField(source="peer_id")
+    username = serializers.CharField(source="peer.username", max_length=150, required=False, allow_null=True, allow_blank=True)
+    name = serializers.CharField(source="peer.name", max_length=255, required=False, allow_null=True, allow_blank=True)
+    phone = serializers.CharField(source="peer.phone", max_length=50, required=False, allow_null=True, allow_blank=True)
+
     class Meta:
         model = TelegramUser
-        fields = "__all__"
+        exclude = ["peer"]
+
+    def create(self, validated_data):
+        peer_id = validated_data.pop("peer_id")
+        peer_fields = validated_data.pop("peer", {})
+        owner = validated_data.get("owner")
+        # и в архиве (users/archive.py) — одним запросом
+        taken = TelegramUser.objects.filter(owner=owner, peer_id=peer_id).order_by().values("peer_id").union(
+            TelegramUserArchive.objects.filter(owner=owner, peer_id=peer_id).values("peer_id"), all=True,
+        )
+        if taken.exists():
+            raise serializers.ValidationError({"user_id": "Этот пользователь уже есть в базе."})
+        # запись справочника может быть чужой — обновляем только присланные поля
+        peer = TelegramPeer(id=peer_id, **peer_fields)
+        TelegramPeer.objects.bulk_create(
+            [peer], update_conflicts=True, unique_fields=["id"], update_fields=[*peer_fields, "updated_at"],
+        )
+        return TelegramUser.objects.create(peer=peer, **validated_data)
 
 
 class TrainingChannelSerializer(serializers.ModelSerializer):
@@ -32,7 +55,11 @@ class TrainingChannelSerializer(serializers.ModelSerializer):
 
 
 class ProcessedUserSerializer(serializers.ModelSerializer):
-    processed = serializers.SerializerMethodField()
+    user_id = serializers.IntegerField(source="peer_id", read_only=True)
+    username = serializers.CharField(source="peer.username", read_only=True)
+    name = serializers.CharField(source="peer.name", read_only=True)
+    phone = serializers.CharField(source="peer.phone", read_only=True)
+    processed = serializers.BooleanField(read_only=True)
 
     class Meta:
         model = TelegramUser
@@ -40,9 +67,3 @@ class ProcessedUserSerializer(serializers.ModelSerializer):
             "id", "user_id", "username", "name", "phone",
             "source_channel", "invite_status", "message_status", "processed"
         ]
-
-    def get_processed(self, obj):
-        return (
-            obj.invite_status in ("success", "failed")
-            or obj.message_status in ("sent", "failed")
-        )
@@ -1,3 +1,196 @@
-from django.test import TestCase
+import json
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TransactionTestCase
+from django.utils import timezone
+
+from accounts.tests import EndpointPerfTestCase, PERF_REPEAT
+from accounts.train_account import UserWriter
+from users.archive import archive_processed
+from users.models import TelegramUser, TelegramUserArchive, TrainingChannel
+from users.serializers import ProcessedUserSerializer
+from users.views import ProcessedUsersListView
+
+
+class UsersEndpointPerfTests(EndpointPerfTestCase):
+    def test_register_and_tokens(self):
+        self.assertEndpoint(
+            "post", "/api/register/", max_queries=3, status=201,
+            data=lambda i: {"username": f"perf_new{i}", "password": "perf-pass"},
+        )
+        self.assertEndpoint("post", "/api/token/", max_queries=1, data={"username": "perf", "password": "perf-pass"})
+        refresh = self.client.post("/api/token/", {"username": "perf", "password": "perf-pass"}, format="json").data["refresh"]
+        self.assertEndpoint("post", "/api/token/refresh/", max_queries=0, data={"refresh": refresh})
+
+    def test_me(self):
+        self.assertEndpoint("get", "/api/me/", max_queries=1)
+
+    def test_add_user(self):
+        self.assertEndpoint(
+            "post", "/api/add-user/", max_queries=4, status=201,
+            data=lambda i: {"user_id": 9 * 10 ** 11 + i, "username": f"perf_add{i}"},
+        )
+
+    def test_training_channels(self):
+        self.assertEndpoint("get", "/api/channels/list/", max_queries=2)
+        self.assertEndpoint(
+            "post", "/api/add-channel/", max_queries=3, status=201,
+            data=lambda i: {"username": f"@perf_add{i}", "type": "group"},
+        )
+        channel = TrainingChannel.objects.first()
+        self.assertEndpoint("post", f"/api/channels/{channel.id}/toggle/", max_queries=3)
+
+    def test_training_channel_delete(self):
+        ids = list(TrainingChannel.objects.values_list("id", flat=True)[:PERF_REPEAT])
+        self.assertEndpoint("delete", lambda i: f"/api/channels/{ids[i]}/delete/", max_queries=4, status=204)
+
+    def test_processed_users(self):
+        self.assertEndpoint("get", "/api/processed-users/", max_queries=2, heavy=True)
+        self.assertEndpoint("get", "/api/processed-users/?q=perf_u1&invite_status=success", max_queries=2, heavy=True)
+        self.assertEndpoint("get", "/api/processed-users/?only_processed=false&invite_status=failed&ordering=-created_at", max_queries=2, heavy=True)
+
+    def test_processed_users_values_match_serializer(self):
+        # список идёт строками .values() с processed из SQL — ответ тот же, что дал бы сериализатор
+        params = {"only_processed": "false", "q": "perf_u1", "ordering": "id"}
+        response = self.client.get("/api/processed-users/", params)
+        rows = json.loads(response.content)
+        self.assertTrue(rows)
+        self.assertTrue(any(r["processed"] for r in rows) and not all(r["processed"] for r in rows))
+
+        view = ProcessedUsersListView()
+        view.request = SimpleNamespace(user=self.owner, GET=params)
+        expected = ProcessedUserSerializer(view.get_queryset(), many=True).data
+        self.assertEqual(rows, json.loads(json.dumps(expected)))
+
+    def test_processed_users_stats(self):
+        self.assertEndpoint("get", "/api/processed-users/stats/", max_queries=6, heavy=True)
+        self.assertEndpoint("get", "/api/processed-users/stats/?source=@perf_tc1", max_queries=6, heavy=True)
+
+    def test_processed_users_timeseries(self):
+        self.assertEndpoint("get", "/api/processed-users/stats/timeseries/", max_queries=6, heavy=True)
+        self.assertEndpoint("get", "/api/processed-users/stats/timeseries/?group_by=hour", max_queries=6, heavy=True)
+
+    def test_processed_users_top(self):
+        self.assertEndpoint("get", "/api/processed-users/stats/top-sources/?order=-cr", max_queries=2, heavy=True)
+        self.assertEndpoint("get", "/api/processed-users/stats/top-accounts/", max_queries=2, heavy=True)
+
+
+class ArchiveTests(EndpointPerfTestCase):
+    """Обработанные строки уходят в архив, а сводки считают по обеим таблицам."""
+
+    STATS = [
+        "/api/processed-users/stats/",
+        "/api/processed-users/stats/?only_processed=false",
+        "/api/processed-users/stats/timeseries/",
+        "/api/processed-users/stats/top-sources/?order=-sent",
+        "/api/processed-users/stats/top-accounts/",
+    ]
+
+    def finish_rows(self):
+        # в засеве у обработанных строк вторая очередь ещё ждёт — часть строк доводим до конца
+        TelegramUser.objects.filter(invite_status="success").update(message_status="sent")
+        TelegramUser.objects.filter(invite_status="pending", message_status="failed").update(invite_status="skipped")
+
+    def age_rows(self):
+        TelegramUser.objects.update(updated_at=timezone.now() - timedelta(days=60))
+
+    def test_archive_keeps_stats_and_queues(self):
+        self.finish_rows()
+        before = {url: self.client.get(url).json() for url in self.STATS}
+        pending = TelegramUser.objects.filter(invite_status="pending").count()
+
+        self.age_rows()
+        moved = archive_processed(days=30, batch=1000)
+        self.assertGreater(moved, 0)
+        self.assertEqual(TelegramUserArchive.objects.count(), moved)
+        self.assertEqual(archive_processed(days=30), 0)
+        # в горячей таблице — только то, что ещё возьмёт какая-нибудь очередь
+        self.assertFalse(TelegramUser.objects.exclude(invite_status="pending").exclude(message_status="pending").exists())
+        self.assertEqual(TelegramUser.objects.filter(invite_status="pending").count(), pending)
+
+        for url in self.STATS:
+            self.assertEqual(self.client.get(url).json(), before[url], url)
+
+        # архивного пользователя заново не добавить
+        archived = TelegramUserArchive.objects.filter(owner__isnull=True).first() or TelegramUserArchive.objects.first()
+        response = self.client.post("/api/add-user/", {"user_id": archived.peer_id, "owner": archived.owner_id}, format="json")
+        self.assertEqual(response.status_code, 400)
+
+    def test_training_skips_archived_users(self):
+        self.finish_rows()
+        self.age_rows()
+        archive_processed(days=30)
+        archived = set(TelegramUserArchive.objects.filter(owner=self.owner).values_list("peer_id", flat=True)[:5])
+        writer = UserWriter(self.owner, run=mock.Mock())
+        self.assertEqual(async_to_sync(writer.unknown)([*archived, 1]), {1})
+
+    def test_recent_rows_stay_hot(self):
+        TelegramUser.objects.update(updated_at=timezone.now())
+        self.assertEqual(archive_processed(days=30), 0)
+
+
+class PendingQueueIndexTests(EndpointPerfTestCase):
+    """Выбор пачки задачами инвайта и рассылки идёт по частичным индексам очередей, фильтры сводок — по обычным."""
+
+    def assertUsesIndex(self, qs, *indexes):
+        # без ANALYZE: в засеве ~85% строк ждут, и по свежей статистике планировщик
+        # честно выбрал бы полный проход — в живой базе ждущих меньшинство
+        plan = qs.explain()
+        self.assertTrue(any(index in plan for index in indexes), plan)
+        # пачка по id берётся из индекса по порядку, без сортировки всей очереди
+        self.assertNotIn("TEMP B-TREE", plan)
+
+    def test_invite_claim(self):
+        # sqlite берёт и (owner, invite_status): внутри ключа строки там тоже по rowid;
+        # Postgres для ORDER BY id LIMIT идёт по частичному (owner, id)
+        qs = TelegramUser.objects.filter(owner=self.owner, invite_status="pending").order_by("id")[:500]
+        self.assertUsesIndex(qs, "tguser_invite_pending_idx", "tguser_owner_invite_idx")
+
+    def test_message_claim(self):
+        qs = TelegramUser.objects.filter(
+            owner=self.owner, message_status="pending",
+            invite_status__in=["pending", "failed", "skipped", "invited", "success"],
+        ).order_by("id")[:100]
+        self.assertUsesIndex(qs, "tguser_message_pending_idx", "tguser_owner_message_idx")
+
+    def test_status_filters(self):
+        # фильтры сводок и списка по завершённым статусам — частичные индексы их не покрывают
+        qs = TelegramUser.objects.filter(owner=self.owner, invite_status="success")
+        self.assertUsesIndex(qs, "tguser_owner_invite_idx")
+        qs = TelegramUser.objects.filter(owner=self.owner, message_status="failed")
+        self.assertUsesIndex(qs, "tguser_owner_message_idx")
+
+
+class PeerMigrationTests(TransactionTestCase):
+    """0005 (TelegramPeer) откатывается на заполненной таблице и возвращает данные."""
+    BEFORE = [("users", "0004_alter_telegramuser_options_telegramuser_created_at_and_more")]
+    AFTER = [("users", "0005_telegrampeer")]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        self.migrate(MigrationExecutor(connection).loader.graph.leaf_nodes())
+
+    def test_round_trip(self):
+        apps = self.migrate(self.AFTER)
+        owner = apps.get_model("auth", "User").objects.create(username="peer-owner")
+        for i in (1, 2):
+            apps.get_model("users", "TelegramPeer").objects.create(id=i, username=f"u{i}", name=f"N{i}", phone=str(i))
+            apps.get_model("users", "TelegramUser").objects.create(peer_id=i, owner_id=owner.id)
+
+        apps = self.migrate(self.BEFORE)
+        rows = apps.get_model("users", "TelegramUser").objects.order_by("user_id").values_list("user_id", "username", "name", "phone")
+        self.assertEqual(list(rows), [(1, "u1", "N1", "1"), (2, "u2", "N2", "2")])
+
+        apps = self.migrate(self.AFTER)
+        rows = apps.get_model("users", "TelegramUser").objects.order_by("peer_id").values_list("peer_id", "peer__username")
+        self.assertEqual(list(rows), [(1, "u1"), (2, "u2")])
@@ -1,12 +1,12 @@
 from rest_framework import generics
 from .serializers import RegisterSerializer, TelegramUserSerializer, TrainingChannelSerializer
-from .models import TelegramUser, TrainingChannel
+from .models import TelegramUser, TelegramUserArchive, TrainingChannel
 from django.contrib.auth.models import User
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from .serializers import ProcessedUserSerializer
-from django.db.models import Q, Count, Sum, Case, When, IntegerField
+from django.db.models import Q, F, Count, Sum, Case, When, IntegerField, BooleanField, ExpressionWrapper
 from django.db.models.functions import TruncDay, TruncHour
 from django.utils import timezone
 
@@ -54,6 +54,29 @@ class TrainingChannelToggleActiveView(APIView):
             return Response({"error": "Channel not found"}, status=404)
         
 
+# поля, переехавшие в справочник TelegramPeer: ?ordering=username по-прежнему работает
+PEER_ORDERING = {
+    "user_id": "peer_id",
+    "username": "peer__username",
+    "name": "peer__name",
+    "phone": "peer__phone",
+}
+
+
+# "обработан" — есть итог инвайта или рассылки; считается в SQL, а не по строке в Python
+PROCESSED_Q = Q(invite_status__in=["success", "failed"]) | Q(message_status__in=["sent", "failed"])
+
+# поля ProcessedUserSerializer для .values(): те же ключи, без объекта модели на строку
+PROCESSED_USER_VALUES = {
+    "user_id": F("peer_id"),
+    "username": F("peer__username"),
+    "name": F("peer__name"),
+    "phone": F("peer__phone"),
+    # то же, что свойство TelegramUser.processed, но в SQL
+    "processed": ExpressionWrapper(PROCESSED_Q, output_field=BooleanField()),
+}
+
+
 class ProcessedUsersListView(generics.ListAPIView):
     """
     GET /api/processed-users/
@@ -68,14 +91,11 @@ class ProcessedUsersListView(generics.ListAPIView):
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        qs = TelegramUser.objects.filter(owner=self.request.user)
+        qs = TelegramUser.objects.filter(owner=self.request.user).select_related("peer")
 
         only_processed = (self.request.GET.get("only_processed", "true").lower() != "false")
         if only_processed:
-            qs = qs.filter(
-                Q(invite_status__in=["success", "failed"]) |
-                Q(message_status__in=["sent", "failed"])
-            )
+            qs = qs.filter(PROCESSED_Q)
 
         inv = self.request.GET.get("invite_status")
         msg = self.request.GET.get("message_status")
@@ -87,15 +107,26 @@ class ProcessedUsersListView(generics.ListAPIView):
         q = self.request.GET.get("q")
         if q:
             qs = qs.filter(
-                Q(username__icontains=q) |
-                Q(name__icontains=q) |
-                Q(phone__icontains=q) |
+                Q(peer__username__icontains=q) |
+                Q(peer__name__icontains=q) |
+                Q(peer__phone__icontains=q) |
                 Q(source_channel__icontains=q)
             )
 
         ordering = self.request.GET.get("ordering", "-id")
-        return qs.order_by(ordering)
-    
+        desc, field = ordering.startswith("-"), ordering.lstrip("-")
+        field = PEER_ORDERING.get(field, field)
+        return qs.order_by(f"-{field}" if desc else field)
+
+    def list(self, request, *args, **kwargs):
+        rows = self.get_queryset().values(
+            "id", "source_channel", "invite_status", "message_status", **PROCESSED_USER_VALUES,
+        )
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(page)
+        return Response(list(rows))
+
 
 def _parse_dt(s):
     if not s: return None
@@ -135,13 +166,54 @@ def _apply_common_filters(qs, request):
         qs = qs.filter(**{f"{date_field}__lte": dt_to})
 
     if only_processed:
-        qs = qs.filter(
-            Q(invite_status__in=["success", "failed"]) |
-            Q(message_status__in=["sent", "failed"])
-        )
+        qs = qs.filter(PROCESSED_Q)
     return qs
 
 
+# счётчики по статусам для группировок по источнику / аккаунту
+STATUS_TOTALS = dict(
+    total=Count("id"),
+    success=Sum(Case(When(invite_status="success", then=1), default=0, output_field=IntegerField())),
+    sent=Sum(Case(When(message_status="sent", then=1), default=0, output_field=IntegerField())),
+    failed=Sum(Case(
+        When(invite_status="failed", then=1),
+        When(message_status="failed", then=1),
+        default=0, output_field=IntegerField()
+    )),
+)
+
+
+def _bases(request):
+    """Горячая таблица и архив (users/archive.py) с одними фильтрами: сводки видят всю историю."""
+    return (
+        _apply_common_filters(TelegramUser.objects.all(), request),
+        _apply_common_filters(TelegramUserArchive.objects.all(), request),
+    )
+
+
+def _union(bases, *keys, **aggregates):
+    """values(*keys).annotate(**aggregates) по обеим таблицам одним UNION ALL."""
+    hot, archive = (b.values(*keys).annotate(**aggregates).order_by() for b in bases)
+    return hot.union(archive, all=True)
+
+
+def _merged_totals(bases, key):
+    """STATUS_TOTALS по key, сложенные из горячей таблицы и архива."""
+    merged = {}
+    for r in _union(bases, key, **STATUS_TOTALS):
+        m = merged.setdefault(r[key], {key: r[key], "total": 0, "success": 0, "sent": 0, "failed": 0})
+        for f in ("total", "success", "sent", "failed"):
+            m[f] += r[f] or 0
+    # по ключу: при равных счётчиках (сортировка устойчивая) топ не зависит от порядка строк из БД
+    return sorted(merged.values(), key=lambda r: (r[key] is None, r[key]))
+
+
+def _with_cr(rows):
+    for r in rows:
+        r["cr"] = round(r["sent"] / r["total"], 4) if r["total"] else 0
+    return rows
+
+
 class ProcessedUsersStatsView(APIView):
     """
     GET /api/processed-users/stats/
@@ -154,46 +226,25 @@ class ProcessedUsersStatsView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        base = _apply_common_filters(TelegramUser.objects.all(), request)
-
-        # Totals по статусам
-        invite_counts = dict(base.values("invite_status").annotate(c=Count("id")).values_list("invite_status", "c"))
-        message_counts = dict(base.values("message_status").annotate(c=Count("id")).values_list("message_status", "c"))
-        failed_total = (invite_counts.get("failed", 0) + message_counts.get("failed", 0))
+        bases = _bases(request)
 
-        # Матрица invite×message
-        matrix_rows = base.values("invite_status", "message_status").annotate(c=Count("id"))
+        # Матрица invite×message; totals по статусам и total — её суммы
+        total, invite_counts, message_counts = 0, {}, {}
         matrix = {"pending":{}, "success":{}, "failed":{}}
-        for row in matrix_rows:
+        for row in _union(bases, "invite_status", "message_status", c=Count("id")):
             i, m, c = row["invite_status"], row["message_status"], row["c"]
-            matrix.setdefault(i, {})[m] = c
+            total += c
+            invite_counts[i] = invite_counts.get(i, 0) + c
+            message_counts[m] = message_counts.get(m, 0) + c
+            cell = matrix.setdefault(i, {})
+            cell[m] = cell.get(m, 0) + c
+        failed_total = (invite_counts.get("failed", 0) + message_counts.get("failed", 0))
 
         # Топ источников
-        by_source_rows = base.values("source_channel").annotate(
-            total=Count("id"),
-            success=Sum(Case(When(invite_status="success", then=1), default=0, output_field=IntegerField())),
-            sent=Sum(Case(When(message_status="sent", then=1), default=0, output_field=IntegerField())),
-            failed=Sum(Case(
-                When(invite_status="failed", then=1),
-                When(message_status="failed", then=1),
-                default=0, output_field=IntegerField()
-            )),
-        ).order_by("-total")[:20]
-        by_source = []
-        for r in by_source_rows:
-            total = r["total"] or 0
-            cr = ( (r["sent"] or 0) / total ) if total else 0
-            by_source.append({
-                "source_channel": r["source_channel"],
-                "total": total,
-                "sent": r["sent"] or 0,
-                "success": r["success"] or 0,
-                "failed": r["failed"] or 0,
-                "cr": round(cr, 4),
-            })
+        by_source = sorted(_merged_totals(bases, "source_channel"), key=lambda r: r["total"], reverse=True)[:20]
 
         return Response({
-            "total": base.count(),
+            "total": total,
             "invite": {
                 "pending": invite_counts.get("pending", 0),
                 "success": invite_counts.get("success", 0),
@@ -206,9 +257,19 @@ class ProcessedUsersStatsView(APIView):
             },
             "failed": failed_total,
             "matrix": matrix,
-            "by_source": by_source,
+            "by_source": _with_cr(by_source),
         })
-    
+
+
+# серия -> (поле времени, доп. фильтр)
+SERIES = {
+    "invite_success": ("invite_changed_at", {"invite_status": "success"}),
+    "invite_failed": ("invite_changed_at", {"invite_status": "failed"}),
+    "message_sent": ("message_changed_at", {"message_status": "sent"}),
+    "message_failed": ("message_changed_at", {"message_status": "failed"}),
+    "processed": ("processed_at", None),
+}
+
 
 class ProcessedUsersTimeSeriesView(APIView):
     """
@@ -222,36 +283,19 @@ class ProcessedUsersTimeSeriesView(APIView):
         group_by = request.GET.get("group_by", "day")
         trunc = TruncHour if group_by == "hour" else TruncDay
 
-        base = _apply_common_filters(TelegramUser.objects.all(), request)
-
-        # Готовим 5 серий по своим временным полям
-        def agg(qs, field, extra_filter=None):
-            qs2 = qs
-            if extra_filter:
-                qs2 = qs2.filter(**extra_filter)
-            return qs2.exclude(**{f"{field}__isnull": True}).annotate(ts=trunc(field)).values("ts").annotate(
-                c=Count("id")
-            ).values("ts", "c")
+        bases = _bases(request)
 
-        s_inv_succ = agg(base, "invite_changed_at",  {"invite_status":"success"})
-        s_inv_fail = agg(base, "invite_changed_at",  {"invite_status":"failed"})
-        s_msg_sent = agg(base, "message_changed_at", {"message_status":"sent"})
-        s_msg_fail = agg(base, "message_changed_at", {"message_status":"failed"})
-        s_processed = agg(base, "processed_at")
-
-        # Сводим в одну шкалу
+        # Сводим 5 серий (каждая — по своему полю времени) в одну шкалу
         bucket = {}
-        for q in (s_inv_succ, s_inv_fail, s_msg_sent, s_msg_fail, s_processed):
-            for row in q:
-                ts = row["ts"]
-                key = ts.isoformat()
-                d = bucket.setdefault(key, {"ts": key, "invite_success":0,"invite_failed":0,"message_sent":0,"message_failed":0,"processed":0})
-                # определяем по ссылке набора
-        for row in s_inv_succ:   bucket[row["ts"].isoformat()]["invite_success"] += row["c"]
-        for row in s_inv_fail:    bucket[row["ts"].isoformat()]["invite_failed"]  += row["c"]
-        for row in s_msg_sent:    bucket[row["ts"].isoformat()]["message_sent"]   += row["c"]
-        for row in s_msg_fail:    bucket[row["ts"].isoformat()]["message_failed"] += row["c"]
-        for row in s_processed:   bucket[row["ts"].isoformat()]["processed"]      += row["c"]
+        for name, (field, extra_filter) in SERIES.items():
+            series = [
+                b.filter(**(extra_filter or {})).exclude(**{f"{field}__isnull": True}).annotate(ts=trunc(field))
+                for b in bases
+            ]
+            for row in _union(series, "ts", c=Count("id")):
+                key = row["ts"].isoformat()
+                point = bucket.setdefault(key, {"ts": key, **{s: 0 for s in SERIES}})
+                point[name] += row["c"]
 
         points = sorted(bucket.values(), key=lambda x: x["ts"])
         return Response({ "group_by": group_by, "points": points })
@@ -266,41 +310,16 @@ class ProcessedUsersTopSourcesView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        base = _apply_common_filters(TelegramUser.objects.all(), request)
-
-        rows = base.values("source_channel").annotate(
-            total=Count("id"),
-            success=Sum(Case(When(invite_status="success", then=1), default=0, output_field=IntegerField())),
-            sent=Sum(Case(When(message_status="sent", then=1), default=0, output_field=IntegerField())),
-            failed=Sum(Case(
-                When(invite_status="failed", then=1),
-                When(message_status="failed", then=1),
-                default=0, output_field=IntegerField()
-            )),
-        )
+        rows = _merged_totals(_bases(request), "source_channel")
 
         order = request.GET.get("order", "-total")
-        if order.lstrip("-") in {"total","success","sent","failed"}:
-            rows = rows.order_by(order)
-        else:
-            rows = rows.order_by("-total")
+        field = order.lstrip("-")
+        if field not in {"total","success","sent","failed"}:
+            order, field = "-total", "total"
+        rows.sort(key=lambda r: r[field], reverse=order.startswith("-"))
 
         limit = int(request.GET.get("limit", 20))
-        rows = rows[:max(1, min(limit, 200))]
-
-        results = []
-        for r in rows:
-            total = r["total"] or 0
-            cr = ((r["sent"] or 0) / total) if total else 0
-            results.append({
-                "source_channel": r["source_channel"],
-                "total": total,
-                "sent": r["sent"] or 0,
-                "success": r["success"] or 0,
-                "failed": r["failed"] or 0,
-                "cr": round(cr, 4),
-            })
-        return Response({"results": results})
+        return Response({"results": _with_cr(rows[:max(1, min(limit, 200))])})
 
 
 class ProcessedUsersTopAccountsView(APIView):
@@ -311,25 +330,15 @@ class ProcessedUsersTopAccountsView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        base = _apply_common_filters(TelegramUser.objects.exclude(processed_by__isnull=True), request)
-
-        rows = base.values("processed_by_id").annotate(
-            total=Count("id"),
-            sent=Sum(Case(When(message_status="sent", then=1), default=0, output_field=IntegerField())),
-            success=Sum(Case(When(invite_status="success", then=1), default=0, output_field=IntegerField())),
-            failed=Sum(Case(
-                When(invite_status="failed", then=1),
-                When(message_status="failed", then=1),
-                default=0, output_field=IntegerField()
-            )),
-        ).order_by("-total")[:50]
+        bases = [b.exclude(processed_by__isnull=True) for b in _bases(request)]
+        rows = sorted(_merged_totals(bases, "processed_by_id"), key=lambda r: r["total"], reverse=True)[:50]
 
         results = [{
             "account_id": r["processed_by_id"],
-            "total": r["total"] or 0,
-            "sent": r["sent"] or 0,
-            "success": r["success"] or 0,
-            "failed": r["failed"] or 0,
+            "total": r["total"],
+            "sent": r["sent"],
+            "success": r["success"],
+            "failed": r["failed"],
         } for r in rows]
 
         return Response({"results": results})
@@ -17,6 +17,8 @@ export default function Dashboard() {
   const [channels, setChannels] = useState([]);
   const [editingId, setEditingId] = useState(null);
   const [error, setError] = useState("");
+  // живой прогресс задач по аккаунтам (SSE /api/accounts/progress/stream/)
+  const [progress, setProgress] = useState({});
 
   // UI state
   const [q, setQ] = useState("");
@@ -93,6 +95,51 @@ export default function Dashboard() {
     // eslint-disable-next-line react-hooks/exhaustive-deps
   }, []);
 
+  useEffect(() => {
+    if (!token) return;
+    // access-токен в URL не кладём: на каждое открытие потока — свой короткий токен
+    let es = null;
+    let retry = null;
+    let closed = false;
+    const open = async () => {
+      try {
+        const res = await fetch("http://127.0.0.1:8000/api/accounts/progress/stream/token/", {
+          method: "POST",
+          headers: { Authorization: `Bearer ${token}` },
+        });
+        if (!res.ok) return;
+        const { token: streamToken } = await res.json();
+        if (closed) return;
+        es = new EventSource(
+          `http://127.0.0.1:8000/api/accounts/progress/stream/?token=${encodeURIComponent(streamToken)}`
+        );
+      } catch {
+        retry = setTimeout(open, 5000);
+        return;
+      }
+      es.onmessage = (e) => {
+        try {
+          const p = JSON.parse(e.data);
+          setProgress((prev) => ({ ...prev, [p.account_id]: p }));
+          if (p.status !== "running") fetchAccounts();
+        } catch {
+          /* noop */
+        }
+      };
+      es.onerror = () => {
+        // сам EventSource переподключается со старым (уже истёкшим) токеном и закрывается на 401
+        if (es.readyState === EventSource.CLOSED && !closed) retry = setTimeout(open, 5000);
+      };
+    };
+    open();
+    return () => {
+      closed = true;
+      clearTimeout(retry);
+      if (es) es.close();
+    };
+    // eslint-disable-next-line react-hooks/exhaustive-deps
+  }, [token]);
+
   // ------- Actions -------
   const checkAllAccounts = async () => {
     if (!window.confirm("Запустить проверку всех аккаунтов?")) return;
@@ -206,6 +253,17 @@ export default function Dashboard() {
     return <span className="badge bg-light text-dark">—</span>;
   };
 
+  const leaseLabel = (kind) =>
+    ({ invite: "инвайт", dm: "рассылка", forward: "пересылка", train: "обучение", profile: "профиль", join: "вступление", check: "проверка" }[kind] || kind);
+
+  const progressLabel = (p) => {
+    const parts = [`${leaseLabel(p.kind)}: ${p.processed}${p.total ? `/${p.total}` : ""}`];
+    parts.push(`ok ${p.ok}`, `ошибок ${p.failed}`);
+    if (p.channel) parts.push(`@${p.channel}`);
+    if (p.eta) parts.push(`≈${Math.ceil(p.eta / 60)} мин`);
+    return parts.join(" · ");
+  };
+
   // ------- Derived data (search / filter / sort) -------
   const filtered = useMemo(() => {
     const query = normalize(q);
@@ -359,7 +417,20 @@ export default function Dashboard() {
                   <tr key={acc.id}>
                     <td className="fw-semibold">{acc.phone}</td>
                     <td>{acc.geo || "-"}</td>
-                    <td>{badge(acc.status)}</td>
+                    <td>
+                      {badge(acc.status)}
+                      {acc.lease ? (
+                        <span
+                          className="badge bg-info text-dark ms-1"
+                          title={acc.lease.task_id ? `task ${acc.lease.task_id}` : acc.lease.host}
+                        >
+                          Занят: {leaseLabel(acc.lease.kind)}
+                        </span>
+                      ) : null}
+                      {progress[acc.id]?.status === "running" ? (
+                        <div className="small text-muted mt-1">{progressLabel(progress[acc.id])}</div>
+                      ) : null}
+                    </td>
                     <td>{acc.role || "-"}</td>
                     <td>{acc.name || "-"}</td>
                     <td className="text-muted">